@@ -0,0 +1,278 @@
+"""Pluggable audio input for the mic waveform.
+
+An `AudioSource` captures mono float32 PCM off the Tk thread and pushes it in
+chunks into a `RingBuffer`. The UI side only ever reads the most recent window
+from the ring and turns it into per-bar RMS/peak levels in one NumPy step
+(`bar_levels`), so capture rate and frame rate are fully decoupled.
+
+Sources:
+  DeviceSource     live microphone through the optional `sounddevice` package
+  WavFileSource    a WAV file replayed at real time (for tests and demos)
+  SyntheticSource  speech-like noise, used when the device cannot be opened
+"""
+
+import abc
+import threading
+import time
+import wave
+
+import numpy as np
+
+
+class RingBuffer:
+  """Single-producer / single-consumer ring of float32 samples.
+
+  The producer (capture thread) only advances `write_pos` and the consumer only
+  reads, so no lock is needed: a reader sees either the old or the new position,
+  and the producer never waits. When the reader falls behind, old samples are
+  overwritten, which is what a level meter wants.
+  """
+
+  def __init__(self, capacity):
+    self.capacity = int(capacity)
+    self._buf = np.zeros(self.capacity, dtype=np.float32)
+    self.write_pos = 0  # total samples ever written
+
+  def write(self, samples):
+    samples = np.asarray(samples, dtype=np.float32).ravel()
+    total = len(samples)
+    if total > self.capacity:
+      samples = samples[-self.capacity:]
+    n = len(samples)
+    skipped = total - n
+    start = (self.write_pos + skipped) % self.capacity
+    first = min(n, self.capacity - start)
+    self._buf[start : start + first] = samples[:first]
+    if first < n:
+      self._buf[: n - first] = samples[first:]
+    self.write_pos += skipped + n
+
+  def latest(self, n):
+    """Return a copy of the most recent `n` samples (zero-padded before any audio)."""
+    n = min(int(n), self.capacity)
+    end = self.write_pos
+    out = np.zeros(n, dtype=np.float32)
+    avail = min(n, end)
+    if avail:
+      start = (end - avail) % self.capacity
+      first = min(avail, self.capacity - start)
+      out[n - avail : n - avail + first] = self._buf[start : start + first]
+      if first < avail:
+        out[n - avail + first :] = self._buf[: avail - first]
+    return out
+
+
+def bar_levels(samples, bars, mode="rms", floor_db=-60.0):
+  """Split `samples` into `bars` equal slices and return 0..1 levels per slice.
+
+  Levels are RMS (or absolute peak with mode="peak") mapped from dBFS
+  [`floor_db`, 0] onto [0, 1], all computed in bulk.
+  """
+  samples = np.asarray(samples, dtype=np.float32)
+  per_bar = max(1, len(samples) // bars)
+  block = samples[: per_bar * bars]
+  if len(block) < per_bar * bars:
+    block = np.pad(block, (0, per_bar * bars - len(block)))
+  block = block.reshape(bars, per_bar)
+  if mode == "peak":
+    level = np.abs(block).max(axis=1)
+  else:
+    level = np.sqrt(np.mean(np.square(block, dtype=np.float64), axis=1))
+  db = 20.0 * np.log10(np.maximum(level, 1e-9))
+  return np.clip((db - floor_db) / -floor_db, 0.0, 1.0)
+
+
+class AudioSource(abc.ABC):
+  """Base class: capture audio on a background thread into `self.ring`."""
+
+  sample_rate = 16000
+  # why this source is running instead of the one asked for (see DeviceSource.start)
+  error = None
+
+  def __init__(self, ring_seconds=2.0):
+    self.ring_seconds = ring_seconds
+    self.ring = None
+    self._stop = threading.Event()
+    self._thread = None
+
+  def _make_ring(self):
+    if self.ring is None:
+      self.ring = RingBuffer(int(self.sample_rate * self.ring_seconds))
+
+  def start(self):
+    """Start capturing; returns the source that is actually running (normally `self`)."""
+    self._make_ring()
+    self._stop.clear()
+    self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+    self._thread.start()
+    return self
+
+  def stop(self):
+    self._stop.set()
+    if self._thread is not None and self._thread is not threading.current_thread():
+      self._thread.join(timeout=1.0)
+    self._thread = None
+
+  @property
+  def running(self):
+    return self._thread is not None and self._thread.is_alive()
+
+  @abc.abstractmethod
+  def _run(self):
+    """Capture into `self.ring` until `self._stop` is set (runs on the source's thread)."""
+
+
+def _pcm_to_float(raw, sampwidth, channels):
+  """Convert little-endian PCM bytes to mono float32 in [-1, 1]."""
+  if sampwidth == 1:
+    data = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+  elif sampwidth == 2:
+    data = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+  elif sampwidth == 3:
+    b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+    ints = (b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8 >> 8
+    data = ints.astype(np.float32) / 8388608.0
+  elif sampwidth == 4:
+    data = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+  else:
+    raise ValueError(f"unsupported sample width: {sampwidth}")
+  if channels > 1:
+    data = data.reshape(-1, channels).mean(axis=1)
+  return data
+
+
+class WavFileSource(AudioSource):
+  """Replay a WAV file into the ring at real-time speed (or as fast as possible)."""
+
+  def __init__(self, path, chunk_frames=512, realtime=True, loop=False, ring_seconds=2.0):
+    super().__init__(ring_seconds)
+    self.path = path
+    self.chunk_frames = chunk_frames
+    self.realtime = realtime
+    self.loop = loop
+    with wave.open(path, "rb") as wf:
+      self.sample_rate = wf.getframerate()
+
+  def _run(self):
+    with wave.open(self.path, "rb") as wf:
+      width, channels = wf.getsampwidth(), wf.getnchannels()
+      started = time.perf_counter()
+      played = 0
+      while not self._stop.is_set():
+        raw = wf.readframes(self.chunk_frames)
+        if not raw:
+          if not self.loop:
+            break
+          wf.rewind()
+          continue
+        chunk = _pcm_to_float(raw, width, channels)
+        self.ring.write(chunk)
+        played += len(chunk)
+        if self.realtime:
+          # sleep until the wall clock catches up with the audio written so far
+          ahead = played / self.sample_rate - (time.perf_counter() - started)
+          if ahead > 0:
+            self._stop.wait(ahead)
+
+
+class SyntheticSource(AudioSource):
+  """Speech-like noise (syllable-rate bursts) written into the ring at real time."""
+
+  def __init__(self, sample_rate=16000, chunk_frames=256, ring_seconds=2.0, seed=None):
+    super().__init__(ring_seconds)
+    self.sample_rate = sample_rate
+    self.chunk_frames = chunk_frames
+    self._rng = np.random.default_rng(seed)
+
+  def _run(self):
+    started = time.perf_counter()
+    played = 0
+    while not self._stop.is_set():
+      t = (played + np.arange(self.chunk_frames)) / self.sample_rate
+      # ~4 syllables a second, with a slower phrase-level swell
+      envelope = np.abs(np.sin(2 * np.pi * 2.0 * t)) * (0.35 + 0.25 * np.sin(2 * np.pi * 0.3 * t))
+      self.ring.write(self._rng.standard_normal(self.chunk_frames).astype(np.float32) * envelope)
+      played += self.chunk_frames
+      ahead = played / self.sample_rate - (time.perf_counter() - started)
+      if ahead > 0:
+        self._stop.wait(ahead)
+
+
+class DeviceSource(AudioSource):
+  """Live input device through `sounddevice` (PortAudio calls back on its own thread)."""
+
+  def __init__(self, sample_rate=16000, device=None, blocksize=256, ring_seconds=2.0):
+    super().__init__(ring_seconds)
+    self.sample_rate = sample_rate
+    self.device = device
+    self.blocksize = blocksize
+    self._stream = None
+
+  def start(self):
+    """Open the input stream here, so a missing package or device is seen by the caller.
+
+    If it cannot be opened, a started SyntheticSource is returned instead, with
+    the reason in its `error`.
+    """
+    self._make_ring()
+    try:
+      import sounddevice as sd
+
+      self._stream = sd.InputStream(
+        samplerate=self.sample_rate, channels=1, dtype="float32",
+        blocksize=self.blocksize, device=self.device, callback=self._callback,
+      )
+      self._stream.start()
+    except Exception as e:
+      if self._stream is not None:
+        self._stream.close()
+        self._stream = None
+      fallback = SyntheticSource(self.sample_rate, self.blocksize, self.ring_seconds)
+      fallback.error = e
+      return fallback.start()
+    return super().start()
+
+  def _callback(self, indata, frames, time_info, status):
+    self.ring.write(indata[:, 0] if indata.ndim > 1 else indata)
+
+  def _run(self):
+    # the audio arrives through the callback; this thread only owns the stream's lifetime
+    try:
+      self._stop.wait()
+    finally:
+      self._stream.close()
+      self._stream = None
+
+
+class LevelMeter:
+  """Per-frame 0..1 bar levels from the newest `window_ms` of `source`.
+
+  Has the same `next()` interface as `waveform.SyntheticLevels`.
+  """
+
+  def __init__(self, source, bars, window_ms=50, mode="rms"):
+    self.source = source
+    self.bars = bars
+    self.window = max(bars, int(source.sample_rate * window_ms / 1000.0))
+    self.mode = mode
+
+  def next(self):
+    ring = self.source.ring
+    if ring is None:
+      return np.zeros(self.bars)
+    return bar_levels(ring.latest(self.window), self.bars, self.mode)
+
+
+def open_source(spec):
+  """Create a source from a command-line spec: "device[:N]", "wav:PATH" or "synthetic".
+
+  Returns None for "synthetic" (the caller keeps the placeholder animation).
+  """
+  if not spec or spec == "synthetic":
+    return None
+  kind, _, arg = spec.partition(":")
+  if kind == "wav":
+    return WavFileSource(arg, loop=True)
+  if kind == "device":
+    return DeviceSource(device=int(arg) if arg.isdigit() else (arg or None))
+  raise ValueError(f"unknown audio source: {spec!r}")
@@ -0,0 +1,138 @@
+"""Headless batch prescription generator.
+
+Turns a directory of FHIR Bundles into TXT/PDF prescriptions without importing
+tkinter. Bundles are spread across a process pool; each worker streams its
+Bundle, builds one prescription per Patient and writes the requested formats.
+
+  python batch.py BUNDLE_DIR OUT_DIR [--formats txt,pdf] [--workers N] [--combined-pdf FILE]
+
+With --combined-pdf, every prescription is also collected into one multi-page
+PDF, rendered in a single pass once all workers have finished.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import prescription
+from fhir_model import BundleIndex
+from fhir_stream import iter_bundle_resources
+
+FORMATS = ("txt", "pdf")
+
+
+def find_bundles(src_dir):
+  """Return the sorted Bundle .json files directly inside `src_dir`."""
+  return sorted(
+    os.path.join(src_dir, name)
+    for name in os.listdir(src_dir)
+    if name.lower().endswith(".json") and os.path.isfile(os.path.join(src_dir, name))
+  )
+
+
+def _file_part(value):
+  """`value` with characters that are unsafe in file names %-escaped (as draft_journal.journal_path does)."""
+  return "".join(c if c.isalnum() or c in "-_." else f"%{ord(c):02X}" for c in str(value))
+
+
+def process_bundle(path, out_dir, formats=FORMATS, doctor_name=prescription.DOCTOR_NAME, reg_no=prescription.DOCTOR_REG_NO, keep_texts=False):
+  """Write prescriptions for every Patient in the Bundle at `path`.
+
+  Returns (path, written_paths, seconds, error, texts); `texts` holds the
+  prescription texts only when `keep_texts` is set. Errors are reported rather
+  than raised so one bad Bundle does not abort the batch.
+  """
+  start = time.perf_counter()
+  written = []
+  texts = []
+  try:
+    bundle = BundleIndex.from_resources(iter_bundle_resources(path, full_urls=True))
+    stem = os.path.splitext(os.path.basename(path))[0]
+    patients = bundle.patients()
+    if not patients:
+      raise ValueError("the Bundle has no Patient")
+    for i, pt in enumerate(patients):
+      text = prescription.build_prescription_text(bundle, pt, doctor_name=doctor_name, reg_no=reg_no)
+      if keep_texts:
+        texts.append(text)
+      # the Patient id comes from the Bundle: escaped so it cannot leave out_dir
+      base = stem if len(patients) == 1 else f"{stem}_{_file_part(pt.id or i)}"
+      for fmt in formats:
+        out_path = os.path.join(out_dir, f"{base}.{fmt}")
+        if fmt == "txt":
+          prescription.write_txt(text, out_path)
+        else:
+          prescription.write_pdf(text, out_path)
+        written.append(out_path)
+  except Exception as e:
+    return path, written, time.perf_counter() - start, f"{type(e).__name__}: {e}", texts
+  return path, written, time.perf_counter() - start, None, texts
+
+
+def run_batch(paths, out_dir, formats=FORMATS, workers=None, combined_pdf=None, report=print):
+  """Process `paths` on a pool of `workers` processes; return a summary dict."""
+  os.makedirs(out_dir, exist_ok=True)
+  start = time.perf_counter()
+  files = errors = 0
+  collected = {}
+  keep = combined_pdf is not None
+  with ProcessPoolExecutor(max_workers=workers) as pool:
+    futures = [pool.submit(process_bundle, p, out_dir, formats, keep_texts=keep) for p in paths]
+    for fut in as_completed(futures):
+      path, written, secs, err, texts = fut.result()
+      files += len(written)
+      collected[path] = texts
+      if err:
+        errors += 1
+        report(f"FAIL {path}  {secs * 1000:8.1f} ms  {err}")
+      else:
+        report(f"ok   {path}  {secs * 1000:8.1f} ms  {len(written)} file(s)")
+  if keep:
+    from pdf_render import default_renderer
+
+    t0 = time.perf_counter()
+    pages = default_renderer().render_many((t for p in paths for t in collected.get(p, ())), combined_pdf)
+    files += 1
+    secs = time.perf_counter() - t0
+    report(f"ok   {combined_pdf}  {secs * 1000:8.1f} ms  {pages} page(s), {pages / secs if secs else 0.0:.0f} pages/s")
+  elapsed = time.perf_counter() - start
+  summary = {
+    "bundles": len(paths),
+    "errors": errors,
+    "files": files,
+    "seconds": elapsed,
+    "bundles_per_sec": len(paths) / elapsed if elapsed else 0.0,
+    "files_per_sec": files / elapsed if elapsed else 0.0,
+  }
+  report(
+    f"{summary['bundles']} bundle(s), {files} file(s), {errors} error(s) in {elapsed:.2f} s "
+    f"({summary['bundles_per_sec']:.1f} bundles/s, {summary['files_per_sec']:.1f} files/s)"
+  )
+  return summary
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Generate prescriptions from a directory of FHIR Bundles.")
+  parser.add_argument("src_dir", help="directory containing Bundle .json files")
+  parser.add_argument("out_dir", help="directory to write prescriptions to")
+  parser.add_argument("--formats", default="txt,pdf", help="comma-separated output formats (txt, pdf)")
+  parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+  parser.add_argument("--combined-pdf", default=None, help="also write all prescriptions into this one PDF")
+  args = parser.parse_args(argv)
+
+  formats = tuple(f.strip().lower() for f in args.formats.split(",") if f.strip())
+  unknown = [f for f in formats if f not in FORMATS]
+  if unknown:
+    parser.error(f"unknown format(s): {', '.join(unknown)}")
+  paths = find_bundles(args.src_dir)
+  if not paths:
+    print(f"No Bundle .json files in {args.src_dir}", file=sys.stderr)
+    return 1
+  summary = run_batch(paths, args.out_dir, formats, args.workers, args.combined_pdf)
+  return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,515 @@
+"""Benchmarks for the prescription and doctor-analysis hot paths.
+
+Each benchmark runs at several input sizes and reports the median and best
+time per call (plus per-item cost), so scaling problems show up as well as
+constant-factor ones:
+
+  bundle.parse         streaming a Bundle of N entries into a BundleIndex
+  prescription.text    build_prescription_text for a patient with N resources
+  pdf.wrap             wrap_lines over N lines (reportlab font metrics)
+  pdf.render           rendering an N-page prescription PDF
+  waveform.compute     one animate_mic frame without Tk (numpy + coords calls)
+  waveform.tk          one animate_mic frame on a real Tk canvas
+  waveform.clock       CLOCK_FRAMES waveform frames ticked by the shared FrameClock (reports FPS and dropped frames)
+  efficiency.lookup    doctor_rows from an EfficiencyEngine over N records
+  stats.lookup         doctor_rows from a memory-mapped stats store
+  fhir.ndjson          bulk NDJSON export of N saved prescriptions (both resource types)
+  export.batch         N TXT + JSON exports through the background ExportWorker (durable)
+
+Some benchmarks also report counters of the component they drive (the export
+worker's metrics(), for example); they are printed after the timings and kept
+under "metrics" in the JSON results.
+
+Benchmarks whose optional dependency is missing (reportlab, a display) are
+skipped and listed in the output. On Linux without $DISPLAY, Tk benchmarks run
+under Xvfb when it is installed.
+
+  python bench.py [--quick] [--only PREFIX] [--out results.json]
+  python bench.py --compare BASE.json [NEW.json] [--threshold 1.25]
+
+--compare runs the suite (unless NEW.json is given) and exits with status 1
+when any benchmark got slower than `threshold` times its baseline.
+"""
+
+import argparse
+import atexit
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SIZES = {
+    "bundle.parse": (10, 1_000, 100_000),
+    "prescription.text": (3, 100, 1_000),
+    "pdf.wrap": (100, 10_000, 100_000),
+    "pdf.render": (1, 10, 100),
+    "waveform.compute": (22, 64, 256),
+    "waveform.tk": (22, 64, 256),
+    "waveform.clock": (22, 64, 256),
+    "efficiency.lookup": (100_000, 1_000_000, 10_000_000),
+    "stats.lookup": (100_000, 1_000_000, 10_000_000),
+    "fhir.ndjson": (100, 10_000, 100_000),
+    "export.batch": (1, 8, 64),
+}
+QUICK_SIZES = {name: sizes[:2] for name, sizes in SIZES.items()}
+TK_BENCHMARKS = ("waveform.tk", "waveform.clock")
+CLOCK_FRAMES = 60
+
+
+_scratch = None
+
+
+def _scratch_dir():
+    global _scratch
+    if _scratch is None:
+        _scratch = tempfile.mkdtemp(prefix="bench-")
+        atexit.register(shutil.rmtree, _scratch, True)
+    return _scratch
+
+
+class Skip(Exception):
+    """A benchmark cannot run here (missing optional dependency or display)."""
+
+
+def _round(value):
+    return round(value, 2) if isinstance(value, float) else value
+
+
+def _time(fn, min_time=0.2, max_repeat=50):
+    """Call `fn` until `min_time` has passed (at least 3 times); return per-call seconds."""
+    fn()  # warm-up: first-call imports, caches and page faults are not what we measure
+    times = []
+    start = time.perf_counter()
+    while len(times) < 3 or (time.perf_counter() - start < min_time and len(times) < max_repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+# ----------------- Inputs -----------------
+def synthetic_bundle(n_entries):
+    """A Bundle dict with one Patient and `n_entries - 1` clinical resources."""
+    entries = [{"resource": {"resourceType": "Patient", "id": "p1", "name": [{"text": "Bench Patient"}], "gender": "female", "age": 65}}]
+    for i in range(n_entries - 1):
+        coding = {"coding": [{"system": "http://snomed.info/sct", "code": str(100000 + i), "display": f"Finding {i}"}]}
+        kind = i % 3
+        if kind == 0:
+            res = {"resourceType": "Condition", "code": coding, "clinicalStatus": "active"}
+        elif kind == 1:
+            res = {"resourceType": "Observation", "code": coding, "valueQuantity": {"value": i, "unit": "mmHg"}}
+        else:
+            res = {"resourceType": "MedicationRequest", "status": "active", "intent": "order",
+                   "medicationCodeableConcept": coding, "dosageInstruction": [{"text": "1 tablet daily"}]}
+        res["id"] = f"r{i}"
+        res["subject"] = {"reference": "Patient/p1"}
+        entries.append({"resource": res})
+    return {"resourceType": "Bundle", "type": "collection", "entry": entries}
+
+
+def _index(n_entries):
+    from fhir_model import BundleIndex
+
+    bundle = BundleIndex()
+    bundle.extend(e["resource"] for e in synthetic_bundle(n_entries)["entry"])
+    return bundle
+
+
+def _prescription_text(n_lines):
+    import prescription
+
+    bundle = _index(max(n_lines // 2, 3))
+    text = prescription.build_prescription_text(bundle, bundle.patient())
+    lines = text.splitlines()
+    return "\n".join((lines * (n_lines // len(lines) + 1))[:n_lines])
+
+
+# ----------------- Benchmarks -----------------
+def bench_bundle_parse(n):
+    from fhir_model import BundleIndex
+    from fhir_stream import iter_entries
+
+    data = json.dumps(synthetic_bundle(n))
+    return lambda: BundleIndex.from_resources(iter_entries(io.StringIO(data)))
+
+
+def bench_prescription_text(n):
+    import prescription
+
+    bundle = _index(n)
+    patient = bundle.patient()
+    return lambda: prescription.build_prescription_text(bundle, patient)
+
+
+def _renderer():
+    try:
+        from pdf_render import PrescriptionRenderer
+
+        return PrescriptionRenderer()
+    except ImportError:
+        raise Skip("reportlab not installed")
+
+
+def bench_pdf_wrap(n):
+    renderer = _renderer()
+    text = _prescription_text(n) + " " + "word " * 200  # one long paragraph to wrap
+    return lambda: renderer.wrap(text)
+
+
+def bench_pdf_render(n_pages):
+    renderer = _renderer()
+    lines_per_page = len(renderer.paginate("x\n" * 1000)[0])
+    text = _prescription_text(n_pages * lines_per_page)
+    state = {"i": 0}
+
+    def render():
+        # a fresh file each call: truncating the previous output can cost more than the render
+        state["i"] += 1
+        renderer.render(text, os.path.join(_scratch_dir(), f"bench-{n_pages}-{state['i']}.pdf"))
+
+    return render
+
+
+class _NullCanvas:
+    """Canvas stand-in that accepts the calls WaveformView makes."""
+
+    def __init__(self):
+        self._n = 0
+
+    def _create(self, *args, **kw):
+        self._n += 1
+        return self._n
+
+    create_rectangle = create_oval = _create
+
+    def coords(self, *args):
+        pass
+
+    def itemconfigure(self, *args, **kw):
+        pass
+
+    def winfo_width(self):
+        return 360
+
+    def winfo_height(self):
+        return 72
+
+
+def _waveform_frame(canvas, bars):
+    import numpy as np
+
+    from waveform import WaveformView
+
+    view = WaveformView(canvas, bars=bars)
+    levels = np.random.default_rng(0).random((64, bars))
+    state = {"i": 0}
+
+    def frame():
+        view.frame(levels[state["i"] % 64])
+        state["i"] += 1
+
+    return frame
+
+
+def bench_waveform_compute(bars):
+    return _waveform_frame(_NullCanvas(), bars)
+
+
+_tk_root = None
+
+
+def _tk():
+    global _tk_root
+    if _tk_root is None:
+        try:
+            import tkinter as tk
+
+            _tk_root = tk.Tk()
+        except Exception as e:
+            raise Skip(f"no Tk display ({e})")
+        _tk_root.geometry("400x100")
+    return _tk_root
+
+
+def bench_waveform_tk(bars):
+    import tkinter as tk
+
+    root = _tk()
+    canvas = tk.Canvas(root, width=360, height=72, highlightthickness=0)
+    canvas.pack()
+    root.update()
+    frame = _waveform_frame(canvas, bars)
+
+    def tick():
+        frame()
+        root.update_idletasks()  # include the redraw the frame causes
+
+    return tick
+
+
+def bench_waveform_clock(bars):
+    import tkinter as tk
+
+    import numpy as np
+
+    from frame_clock import FrameClock
+    from waveform import WaveformView
+
+    root = _tk()
+    canvas = tk.Canvas(root, width=360, height=72, highlightthickness=0)
+    canvas.pack()
+    root.update()
+    clock = FrameClock(root)
+    view = WaveformView(canvas, bars=bars)
+    levels = np.random.default_rng(0).random((64, bars))
+    done = tk.BooleanVar(root)
+    state = {"i": 0, "stats": {}}
+
+    def animate():
+        delay_ms = view.frame(levels[state["i"] % 64])
+        state["i"] += 1
+        if state["i"] % CLOCK_FRAMES == 0:
+            done.set(True)
+        return delay_ms
+
+    def run():
+        clock.add("waveform", animate, view.target_delay_ms)
+        root.wait_variable(done)
+        # the clock's counters (achieved FPS, dropped frames) plus the waveform's own draw times
+        draw = {"draw_" + k: v for k, v in view.stats.as_dict().items() if k != "frames"}
+        state["stats"] = dict(clock.stats()["waveform"], **draw)
+        clock.remove("waveform")
+
+    run.metrics = lambda: state["stats"]
+    return run
+
+
+_engines = {}
+
+
+def _engine(n):
+    if n not in _engines:
+        from efficiency import EfficiencyEngine, synthetic_records
+
+        _engines[n] = EfficiencyEngine.from_columns(synthetic_records(n, n_doctors=max(n // 100, 10)))
+    return _engines[n]
+
+
+def _lookups(source, n_doctors):
+    import numpy as np
+
+    reg_nos = (100000 + np.random.default_rng(1).integers(0, n_doctors, 1000)).tolist()
+    state = {"i": 0}
+
+    def lookup():
+        source.doctor_rows(reg_nos[state["i"] % len(reg_nos)])
+        state["i"] += 1
+
+    return lookup
+
+
+def bench_efficiency_lookup(n):
+    engine = _engine(n)
+    return _lookups(engine, len(engine.doctors))
+
+
+def bench_stats_lookup(n):
+    from stats_store import StatsStore, build_stats_store
+
+    engine = _engine(n)
+    path = os.path.join(_scratch_dir(), f"bench-{n}.stats")
+    build_stats_store(engine, path)
+    return _lookups(StatsStore(path), len(engine.doctors))
+
+
+def bench_fhir_ndjson(n):
+    from bulk_export import TYPES, NdjsonWriter, write_resources
+    from prescription_store import PrescriptionRecord
+
+    import prescription
+
+    text = _prescription_text(20)
+    bundle = _index(10)
+    medications = prescription.coded_medications(bundle, bundle.patient())
+    records = [PrescriptionRecord(i, f"P{i}", 1, "123456", 1.7e9 + i, f"Patient {i}", text, medications) for i in range(n)]
+    state = {"i": 0}
+
+    def export():
+        # a fresh directory each call, as for pdf.render (the previous one is dropped, it can be large)
+        shutil.rmtree(os.path.join(_scratch_dir(), f"ndjson-{n}-{state['i']}"), ignore_errors=True)
+        state["i"] += 1
+        directory = os.path.join(_scratch_dir(), f"ndjson-{n}-{state['i']}")
+        os.mkdir(directory)
+        writers = {t: NdjsonWriter(directory, t) for t in TYPES}
+        write_resources(records, writers)
+        for w in writers.values():
+            w.close()
+
+    return export
+
+
+def bench_export_batch(n):
+    import threading
+
+    from export_worker import ExportJob, ExportWorker
+
+    text = _prescription_text(40)
+    fhir = {"resourceType": "Bundle", "type": "document", "entry": [{"resource": {"resourceType": "Patient", "id": "p1"}}]}
+    worker = ExportWorker()
+    state = {"i": 0}
+
+    def export():
+        state["i"] += 1
+        directory = os.path.join(_scratch_dir(), f"export-{n}-{state['i']}")
+        os.mkdir(directory)
+        finished = threading.Semaphore(0)
+        for j in range(n):
+            targets = {ext: os.path.join(directory, f"rx-{j}.{ext}") for ext in ("txt", "json")}
+            worker.submit(ExportJob(text, targets, fhir=fhir), on_done=lambda paths: finished.release(), on_error=lambda e: finished.release())
+        for _ in range(n):
+            finished.acquire()
+
+    export.metrics = worker.metrics
+    return export
+
+
+BENCHMARKS = {
+    "bundle.parse": bench_bundle_parse,
+    "prescription.text": bench_prescription_text,
+    "pdf.wrap": bench_pdf_wrap,
+    "pdf.render": bench_pdf_render,
+    "waveform.compute": bench_waveform_compute,
+    "waveform.tk": bench_waveform_tk,
+    "waveform.clock": bench_waveform_clock,
+    "efficiency.lookup": bench_efficiency_lookup,
+    "stats.lookup": bench_stats_lookup,
+    "fhir.ndjson": bench_fhir_ndjson,
+    "export.batch": bench_export_batch,
+}
+
+
+# ----------------- Running -----------------
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(only=None, quick=False, report=print):
+    sizes = QUICK_SIZES if quick else SIZES
+    results, skipped = [], []
+    for name, make in BENCHMARKS.items():
+        if only and not any(name.startswith(p) for p in only):
+            continue
+        for n in sizes[name]:
+            try:
+                fn = make(n)
+                times = _time(fn)
+            except Skip as e:
+                skipped.append({"name": name, "size": n, "reason": str(e)})
+                report(f"{name:<20} {n:>10}  skipped: {e}")
+                break
+            median = statistics.median(times)
+            results.append({
+                "name": name,
+                "size": n,
+                "calls": len(times),
+                "median_s": median,
+                "min_s": min(times),
+                "per_item_us": median / n * 1e6,
+            })
+            report(f"{name:<20} {n:>10}  median {median * 1000:10.3f} ms  min {min(times) * 1000:10.3f} ms  {median / n * 1e6:9.3f} us/item")
+            metrics = getattr(fn, "metrics", None)
+            if metrics is not None:
+                results[-1]["metrics"] = metrics()
+                report(f"{'':<20} {'':>10}  " + "  ".join(f"{k} {_round(v)}" for k, v in results[-1]["metrics"].items()))
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "commit": _git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "quick": quick,
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def compare(base, new, threshold=1.25, report=print):
+    """Print new/base median ratios; return the (name, size, ratio) pairs over `threshold`."""
+    baseline = {(r["name"], r["size"]): r for r in base["results"]}
+    regressions = []
+    for r in new["results"]:
+        b = baseline.get((r["name"], r["size"]))
+        if b is None:
+            continue
+        ratio = r["median_s"] / b["median_s"] if b["median_s"] else float("inf")
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions.append((r["name"], r["size"], ratio))
+        elif ratio < 1 / threshold:
+            flag = "  faster"
+        report(f"{r['name']:<20} {r['size']:>10}  {b['median_s'] * 1000:10.3f} -> {r['median_s'] * 1000:10.3f} ms  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def _with_display(argv):
+    """Re-run under Xvfb when there is no display on Linux and Xvfb is available."""
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY") and not os.environ.get("BENCH_NO_XVFB"):
+        xvfb_run = shutil.which("xvfb-run")
+        if xvfb_run:
+            env = dict(os.environ, BENCH_NO_XVFB="1")
+            return subprocess.call([xvfb_run, "-a", sys.executable, os.path.abspath(__file__), *argv], env=env)
+    return None
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(description="Benchmark the prescription and analysis hot paths.")
+    parser.add_argument("--quick", action="store_true", help="only the two smallest sizes")
+    parser.add_argument("--only", action="append", help="run benchmarks whose name starts with this (repeatable)")
+    parser.add_argument("--out", help="write results as JSON to this file (default: stdout)")
+    parser.add_argument("--compare", nargs="+", metavar="JSON", help="BASE.json [NEW.json]")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    opts = parser.parse_args(argv)
+
+    needs_tk = not opts.only or any(name.startswith(p) or p.startswith(name) for name in TK_BENCHMARKS for p in opts.only)
+    if needs_tk and not (opts.compare and len(opts.compare) == 2):
+        code = _with_display(argv)
+        if code is not None:
+            return code
+
+    if opts.compare and len(opts.compare) == 2:
+        with open(opts.compare[1], "r", encoding="utf-8") as f:
+            new = json.load(f)
+    else:
+        # progress goes to stderr so stdout stays valid JSON
+        new = run(opts.only, opts.quick, report=lambda s: print(s, file=sys.stderr))
+        if opts.out:
+            with open(opts.out, "w", encoding="utf-8") as f:
+                json.dump(new, f, indent=2)
+        elif not opts.compare:
+            print(json.dumps(new, indent=2))
+
+    if opts.compare:
+        with open(opts.compare[0], "r", encoding="utf-8") as f:
+            base = json.load(f)
+        regressions = compare(base, new, opts.threshold)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
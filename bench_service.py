@@ -0,0 +1,134 @@
+"""Localhost load test for the HTTP service (service.py).
+
+Starts the service in its own process on a free port, with a synthetic
+outcome store, then drives it from keep-alive asyncio clients:
+
+  efficiency     GET /doctors/{reg_no}/efficiency over 1000 doctors (cache warms up)
+  prescription   POST /prescriptions?format=txt with the sample Bundle
+  mixed          nine efficiency lookups for every prescription
+
+and reports requests/s and p50/p99 latency for each.
+
+  python bench_service.py [--connections 32] [--requests 20000] [--records 1000000] [--json] [--min-rps 1000]
+
+Exits with status 1 when a scenario stays under --min-rps.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MIN_RPS = 1000.0
+
+
+def _start_service(stats_path):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "service.py"), "--stats", stats_path, "--port", "0"],
+        stdout=subprocess.PIPE, text=True, cwd=HERE,
+    )
+    line = proc.stdout.readline()
+    if not line.startswith("listening on "):
+        proc.kill()
+        raise RuntimeError(f"service did not start: {line!r}")
+    return proc, int(line.rsplit(":", 1)[1])
+
+
+async def _request(reader, writer, method, path, body=b""):
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+async def _client(port, requests, latencies, failures):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for method, path, body in requests:
+            t0 = time.perf_counter()
+            status = await _request(reader, writer, method, path, body)
+            latencies.append(time.perf_counter() - t0)
+            if status >= 400:
+                failures.append(status)
+    finally:
+        writer.close()
+
+
+async def _scenario(port, requests, connections):
+    latencies, failures = [], []
+    per_client = [requests[i::connections] for i in range(connections)]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_client(port, chunk, latencies, failures) for chunk in per_client))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "failures": len(failures),
+        "seconds": elapsed,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test service.py on localhost.")
+    parser.add_argument("--connections", type=int, default=32, help="concurrent keep-alive connections")
+    parser.add_argument("--requests", type=int, default=20000, help="requests per scenario")
+    parser.add_argument("--records", type=int, default=1_000_000, help="synthetic outcome records behind the lookups")
+    parser.add_argument("--min-rps", type=float, default=MIN_RPS, help="fail when a scenario is slower than this")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    from efficiency import EfficiencyEngine, synthetic_records
+    from stats_store import build_stats_store
+
+    with open(os.path.join(HERE, "sample_bundle.json"), "rb") as f:
+        bundle = f.read()
+    rng = random.Random(1)
+    doctors = [100000 + i for i in range(1000)]
+    lookup = lambda: ("GET", f"/doctors/{rng.choice(doctors)}/efficiency", b"")
+    generate = ("POST", "/prescriptions?format=txt", bundle)
+    scenarios = {
+        "efficiency": [lookup() for _ in range(args.requests)],
+        "prescription": [generate] * args.requests,
+        "mixed": [generate if i % 10 == 9 else lookup() for i in range(args.requests)],
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stats_path = os.path.join(tmp, "bench.stats")
+        build_stats_store(EfficiencyEngine.from_columns(synthetic_records(args.records, n_doctors=len(doctors))), stats_path)
+        proc, port = _start_service(stats_path)
+        try:
+            results = {name: asyncio.run(_scenario(port, reqs, args.connections)) for name, reqs in scenarios.items()}
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    slow = [name for name, r in results.items() if r["rps"] < args.min_rps or r["failures"]]
+    if args.json:
+        print(json.dumps({"connections": args.connections, "results": results}, indent=2))
+    else:
+        for name, r in results.items():
+            flag = "  OVER BUDGET" if name in slow else ""
+            print(
+                f"{name:<14} {r['requests']:>7} req  {r['rps']:9.0f} req/s  p50 {r['p50_ms']:7.2f} ms  "
+                f"p99 {r['p99_ms']:7.2f} ms  {r['failures']} failed{flag}"
+            )
+    return 1 if slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
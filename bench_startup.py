@@ -0,0 +1,152 @@
+"""Cold-start benchmark: core import time and time to first window.
+
+Every measurement runs in a fresh interpreter, so nothing is cached in
+sys.modules between runs:
+
+  * import     importing the GUI-free core (Bundle parsing, prescription
+               building, efficiency); also checks that tkinter, ctypes and
+               reportlab were not pulled in along the way
+  * window     from process start until the first window of hack.py / doc.py
+               has been drawn (needs a display; skipped without one)
+
+  python bench_startup.py [--repeat N] [--json] [--import-budget MS] [--window-budget MS]
+
+Exits with status 1 when the median of a measurement is over its budget.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# the core must import without any GUI or PDF machinery
+CORE_GROUPS = {
+    "bundle": ["fhir_stream", "fhir_model"],
+    "prescription": ["prescription", "batch"],
+    "efficiency": ["efficiency", "stats_store", "online_stats"],
+}
+FORBIDDEN = ("tkinter", "_tkinter", "reportlab")
+# numpy loads ctypes itself, so ctypes is only checked for the numpy-free groups
+NUMPY_FREE = ("bundle", "prescription")
+
+IMPORT_BUDGET_MS = 250.0
+WINDOW_BUDGET_MS = 2500.0
+
+_IMPORT_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = (time.perf_counter() - t0) * 1000.0
+print(json.dumps({{"ms": elapsed, "loaded": [m for m in {watch!r} if m in sys.modules]}}))
+"""
+
+_WINDOW_PROBE = """
+import sys
+import {app} as app
+
+def ready(root):
+    root.update()
+    print("READY", flush=True)
+    root.destroy()
+
+app.main({argv!r}, on_ready=ready)
+"""
+
+
+def _run(code, timeout=60):
+    return subprocess.run(
+        [sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True, timeout=timeout
+    )
+
+
+def measure_import(group, repeat):
+    modules = CORE_GROUPS[group]
+    watch = FORBIDDEN + (("ctypes",) if group in NUMPY_FREE else ())
+    times, loaded = [], set()
+    for _ in range(repeat):
+        proc = _run(_IMPORT_PROBE.format(modules=modules, watch=watch))
+        if proc.returncode != 0:
+            raise RuntimeError(f"importing {modules} failed:\n{proc.stderr}")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        times.append(result["ms"])
+        loaded.update(result["loaded"])
+    return {"name": f"import:{group}", "ms": times, "unexpected_modules": sorted(loaded)}
+
+
+def has_display():
+    return sys.platform in ("win32", "darwin") or bool(os.environ.get("DISPLAY"))
+
+
+def measure_window(app, argv, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-c", _WINDOW_PROBE.format(app=app, argv=argv)],
+            cwd=HERE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+        line = proc.stdout.readline()
+        elapsed = (time.perf_counter() - t0) * 1000.0
+        proc.wait(timeout=60)
+        if line.strip() != "READY":
+            raise RuntimeError(f"{app} did not open a window:\n{proc.stderr.read()}")
+        times.append(elapsed)
+    return {"name": f"window:{app}", "ms": times}
+
+
+def _summary(result):
+    ms = result["ms"]
+    result["median_ms"] = statistics.median(ms)
+    result["min_ms"] = min(ms)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import time of the core and time to first window.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_MS, help="ms per core group")
+    parser.add_argument("--window-budget", type=float, default=WINDOW_BUDGET_MS, help="ms to first window")
+    opts = parser.parse_args(argv)
+
+    results, failures = [], []
+    for group in CORE_GROUPS:
+        r = _summary(measure_import(group, opts.repeat))
+        r["budget_ms"] = opts.import_budget
+        results.append(r)
+        if r["unexpected_modules"]:
+            failures.append(f"{r['name']} imported {', '.join(r['unexpected_modules'])}")
+
+    if has_display():
+        with tempfile.TemporaryDirectory() as tmp:
+            store = os.path.join(tmp, "prescriptions.db")
+            for app, app_argv in (("hack", ["--audio", "synthetic", "--store", store]), ("doc", [])):
+                r = _summary(measure_window(app, app_argv, opts.repeat))
+                r["budget_ms"] = opts.window_budget
+                results.append(r)
+    else:
+        print("no display: skipping time-to-first-window", file=sys.stderr)
+
+    for r in results:
+        if r["median_ms"] > r["budget_ms"]:
+            failures.append(f"{r['name']} median {r['median_ms']:.1f} ms > budget {r['budget_ms']:.0f} ms")
+
+    if opts.json:
+        print(json.dumps({"results": results, "failures": failures}, indent=2))
+    else:
+        for r in results:
+            print(f"{r['name']:<24} median {r['median_ms']:8.1f} ms   min {r['min_ms']:8.1f} ms   budget {r['budget_ms']:.0f} ms")
+        for f in failures:
+            print(f"FAIL: {f}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""Bulk NDJSON export of saved prescriptions, in the style of FHIR bulk data $export.
+
+Every prescription in a PrescriptionStore is written out as FHIR for the
+pharmacy system: one file per resource type, one resource per line.
+
+  MedicationRequest.ndjson   one per prescribed medication, coded in
+                             medicationCodeableConcept, grouped per prescription
+  Bundle.ndjson              a collection Bundle per prescription: Patient, its
+                             MedicationRequests and a DocumentReference with the text
+  OperationOutcome.ndjson    listed under "error": prescriptions saved without
+                             coded medications (before they were stored), which
+                             get no MedicationRequest
+  manifest.json              the $export-style output manifest (files and counts)
+
+Records are streamed from the store in batches and each line is written as soon
+as it is serialized, so memory use does not grow with the size of the export.
+Files are written under a temporary name and renamed once complete.
+
+  python bulk_export.py STORE.db OUT_DIR [--since 2024-01-01] [--all-versions]
+                        [--types MedicationRequest,Bundle] [--gzip]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import prescription
+from prescription_store import PrescriptionStore
+
+TYPES = ("MedicationRequest", "Bundle")
+IDENTIFIER_SYSTEM = "urn:prescription-store"
+
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+def _iso(ts):
+  return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def medication_requests(rec):
+  """One MedicationRequest per coded medication of a PrescriptionRecord (none if it has no codes).
+
+  The requests of one prescription share its groupIdentifier; the reviewed text
+  itself travels in the DocumentReference of the prescription Bundle.
+  """
+  subject = {"reference": f"Patient/{rec.patient_id}"}
+  if rec.patient_name:
+    subject["display"] = rec.patient_name
+  group = {"system": IDENTIFIER_SYSTEM, "value": f"{rec.patient_id}/{rec.version}"}
+  requests = []
+  for i, med in enumerate(rec.medications or (), 1):
+    request = {
+      "resourceType": "MedicationRequest",
+      "id": f"rx-{rec.id}-{i}",
+      "identifier": [{"system": IDENTIFIER_SYSTEM, "value": f"{rec.patient_id}/{rec.version}/{i}"}],
+      "groupIdentifier": group,
+      "status": med.get("status") or "active",
+      "intent": med.get("intent") or "order",
+      "medicationCodeableConcept": med["medicationCodeableConcept"],
+      "subject": subject,
+      "authoredOn": _iso(rec.created_at),
+      "requester": {"identifier": {"value": rec.doctor_reg_no}},
+    }
+    if med.get("dosageInstruction"):
+      request["dosageInstruction"] = med["dosageInstruction"]
+    requests.append(request)
+  return requests
+
+
+def prescription_bundle(rec, requests=None):
+  """Collection Bundle with the patient, the MedicationRequests and the prescription document."""
+  requests = medication_requests(rec) if requests is None else requests
+  subject = {"reference": f"Patient/{rec.patient_id}"}
+  if rec.patient_name:
+    subject["display"] = rec.patient_name
+  patient = {"resourceType": "Patient", "id": rec.patient_id}
+  if rec.patient_name:
+    patient["name"] = [{"text": rec.patient_name}]
+  # the doctor's name is only known for this installation's own registration number
+  doctor_name = prescription.DOCTOR_NAME if rec.doctor_reg_no == prescription.DOCTOR_REG_NO else None
+  authored = _iso(rec.created_at)
+  document = prescription.document_reference(rec.text, subject, authored, doctor_name, rec.doctor_reg_no)
+  return {
+    "resourceType": "Bundle",
+    "id": f"rx-{rec.id}",
+    "type": "collection",
+    "timestamp": authored,
+    "entry": [{"resource": patient}, *({"resource": r} for r in requests), {"resource": document}],
+  }
+
+
+def missing_medications(rec):
+  """OperationOutcome for a prescription saved without coded medications."""
+  return {
+    "resourceType": "OperationOutcome",
+    "id": f"rx-{rec.id}",
+    "issue": [{
+      "severity": "warning",
+      "code": "incomplete",
+      "diagnostics": f"prescription {rec.patient_id}/{rec.version} was saved without coded medications;"
+                     " no MedicationRequest was exported for it",
+    }],
+  }
+
+
+class NdjsonWriter:
+  """Writes one resource type to `<directory>/<type>.ndjson[.gz]`, a line at a time."""
+
+  def __init__(self, directory, resource_type, compress=False, compresslevel=6):
+    self.resource_type = resource_type
+    self.path = os.path.join(directory, f"{resource_type}.ndjson" + (".gz" if compress else ""))
+    self._tmp = self.path + ".part"
+    if compress:
+      self._file = gzip.open(self._tmp, "wt", encoding="utf-8", compresslevel=compresslevel, newline="\n")
+    else:
+      self._file = open(self._tmp, "w", encoding="utf-8", newline="\n", buffering=1 << 20)
+    self.count = 0
+
+  def write(self, resource):
+    self._file.write(_dumps(resource) + "\n")
+    self.count += 1
+
+  def close(self):
+    """Finish the file and move it into place."""
+    self._file.close()
+    os.replace(self._tmp, self.path)
+
+  def abort(self):
+    self._file.close()
+    os.remove(self._tmp)
+
+
+def write_resources(records, writers, errors=None):
+  """Write every record to the NdjsonWriters in `writers` ({resource type: writer}).
+
+  Records without coded medications are reported to `errors`, an
+  OperationOutcome writer, if given.
+  """
+  requests_out = writers.get("MedicationRequest")
+  bundles = writers.get("Bundle")
+  for rec in records:
+    requests = medication_requests(rec)
+    if rec.medications is None and errors is not None:
+      errors.write(missing_medications(rec))
+    if requests_out is not None:
+      for request in requests:
+        requests_out.write(request)
+    if bundles is not None:
+      bundles.write(prescription_bundle(rec, requests))
+
+
+def bulk_export(store, out_dir, since=None, latest_only=True, types=TYPES, compress=False, request="bulk_export.py"):
+  """Export the prescriptions in `store` (a PrescriptionStore) to `out_dir`; return the manifest.
+
+  `since` (epoch seconds) limits the export to prescriptions saved at or after
+  it, like $export's _since. With `latest_only`, only each patient's newest
+  version is exported. `types` must be a subset of TYPES. A leftover
+  OperationOutcome file from an earlier export is removed when this one has
+  no errors.
+  """
+  unknown = [t for t in types if t not in TYPES]
+  if unknown:
+    raise ValueError(f"unknown resource type(s): {', '.join(unknown)}")
+  os.makedirs(out_dir, exist_ok=True)
+  transaction_time = _iso(time.time())
+  writers, errors = {}, None
+  try:
+    for t in types:
+      writers[t] = NdjsonWriter(out_dir, t, compress)
+    errors = NdjsonWriter(out_dir, "OperationOutcome", compress)
+    write_resources(store.iter_records(since=since, latest_only=latest_only), writers, errors)
+  except BaseException:
+    for w in [*writers.values(), errors]:
+      if w is not None:
+        w.abort()
+    raise
+  for w in writers.values():
+    w.close()
+  if errors.count:
+    errors.close()
+  else:
+    errors.abort()
+    for stale in (os.path.join(out_dir, "OperationOutcome.ndjson"), os.path.join(out_dir, "OperationOutcome.ndjson.gz")):
+      if os.path.exists(stale):
+        os.remove(stale)
+  manifest = {
+    "transactionTime": transaction_time,
+    "request": request,
+    "requiresAccessToken": False,
+    "output": [{"type": t, "url": os.path.basename(w.path), "count": w.count} for t, w in writers.items()],
+    "error": [{"type": "OperationOutcome", "url": os.path.basename(errors.path), "count": errors.count}] if errors.count else [],
+  }
+  with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+    json.dump(manifest, f, indent=2)
+  return manifest
+
+
+def _parse_since(value):
+  try:
+    return float(value)
+  except ValueError:
+    since = datetime.fromisoformat(value)
+    return (since if since.tzinfo else since.astimezone()).timestamp()
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Export saved prescriptions as FHIR NDJSON.")
+  parser.add_argument("store", help="prescription store (SQLite) written by hack.py")
+  parser.add_argument("out_dir", help="directory to write the NDJSON files and manifest.json to")
+  parser.add_argument("--since", type=_parse_since, default=None, help="only prescriptions saved at or after this ISO date or epoch time")
+  parser.add_argument("--all-versions", action="store_true", help="export every saved version, not only each patient's latest")
+  parser.add_argument("--types", default=",".join(TYPES), help="comma-separated resource types (MedicationRequest, Bundle)")
+  parser.add_argument("--gzip", action="store_true", help="gzip the NDJSON files (.ndjson.gz)")
+  args = parser.parse_args(argv)
+
+  types = tuple(t.strip() for t in args.types.split(",") if t.strip())
+  unknown = [t for t in types if t not in TYPES]
+  if unknown:
+    parser.error(f"unknown resource type(s): {', '.join(unknown)}")
+  if not os.path.exists(args.store):
+    print(f"No prescription store at {args.store}", file=sys.stderr)
+    return 1
+  request = " ".join(["bulk_export.py", *(sys.argv[1:] if argv is None else argv)])
+  store = PrescriptionStore(args.store)
+  start = time.perf_counter()
+  try:
+    manifest = bulk_export(store, args.out_dir, args.since, not args.all_versions, types, args.gzip, request)
+  finally:
+    store.close()
+  elapsed = time.perf_counter() - start
+  total = sum(o["count"] for o in manifest["output"])
+  for o in manifest["output"] + manifest["error"]:
+    print(f"{o['type']:<18} {o['count']:>10}  {os.path.join(args.out_dir, o['url'])}")
+  print(f"{total} resource(s) in {elapsed:.2f} s ({total / elapsed * 60 if elapsed else 0.0:,.0f} resources/min)")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
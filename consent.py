@@ -0,0 +1,83 @@
+"""Consent language packs and the consent audit log (no GUI dependency).
+
+Language packs live in lang/: `index.json` maps language codes to the names
+shown in the language menu, and `<code>.json` holds that language's strings
+(title, consent, accept, decline). A pack is only read the first time its
+language is shown, so adding languages does not slow startup.
+
+Consent decisions are appended to a JSON-lines audit log by a background
+thread; `record` only enqueues, so the dialog never waits on the disk.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+LANG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lang")
+DEFAULT_LANGUAGE = "en"
+
+
+class LanguagePacks:
+  def __init__(self, directory=LANG_DIR):
+    self.directory = directory
+    self._index = None
+    self._packs = {}
+    self._lock = threading.Lock()
+
+  def languages(self):
+    """Return [(code, display name)] in index order."""
+    if self._index is None:
+      with open(os.path.join(self.directory, "index.json"), "r", encoding="utf-8") as f:
+        self._index = json.load(f)
+    return list(self._index.items())
+
+  def get(self, code):
+    """Return the strings of language `code`, reading its pack on first use."""
+    with self._lock:
+      pack = self._packs.get(code)
+      if pack is None:
+        with open(os.path.join(self.directory, f"{code}.json"), "r", encoding="utf-8") as f:
+          pack = self._packs[code] = json.load(f)
+    return pack
+
+
+_STOP = object()
+
+
+class AuditLog:
+  """Append-only JSON-lines log of consent decisions, written off the calling thread."""
+
+  def __init__(self, path):
+    self.path = path
+    # opened here, so a log that cannot be written fails the caller instead of the writer thread
+    self._file = open(path, "a", encoding="utf-8")
+    self._queue = queue.SimpleQueue()
+    self._thread = threading.Thread(target=self._write_loop, name="consent-audit", daemon=True)
+    self._thread.start()
+
+  def record(self, decision, patient_id, language, **extra):
+    entry = {"ts": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "decision": decision, "patient_id": patient_id, "language": language}
+    entry.update(extra)
+    self._queue.put(entry)
+
+  def _write_loop(self):
+    with self._file as f:
+      while True:
+        entry = self._queue.get()
+        # write everything that is queued, then make it durable once
+        while entry is not _STOP:
+          f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+          try:
+            entry = self._queue.get_nowait()
+          except queue.Empty:
+            break
+        f.flush()
+        os.fsync(f.fileno())
+        if entry is _STOP:
+          return
+
+  def close(self):
+    self._queue.put(_STOP)
+    self._thread.join(timeout=5)
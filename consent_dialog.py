@@ -0,0 +1,112 @@
+"""Consent & rights dialog, built once and shown/hidden for every recording.
+
+The Toplevel and its widgets are created a single time and withdrawn between
+uses. Each language gets its own read-only Text widget, filled the first time
+that language is selected; switching languages afterwards only swaps which
+widget is packed. Every showing starts in the default language.
+"""
+
+import tkinter as tk
+
+from consent import DEFAULT_LANGUAGE
+from tk_trace import traced
+
+
+class ConsentDialog:
+  def __init__(self, root, packs, on_accept, on_decline=None, audit=None, geometry="1920x1080"):
+    self.root = root
+    self.packs = packs
+    self.on_accept = on_accept
+    self.on_decline = on_decline
+    self.audit = audit
+    self.patient_id = None
+    self.language = DEFAULT_LANGUAGE
+    self._texts = {}
+    self._shown_text = None
+
+    self.window = tk.Toplevel(root)
+    self.window.withdraw()
+    self.window.title("AI Consent & Rights")
+    self.window.geometry(geometry)
+    # closing the window counts as declining, and keeps the dialog for next time
+    self.window.protocol("WM_DELETE_WINDOW", self.decline)
+
+    self.title_label = tk.Label(self.window, text="", font=("Segoe UI", 16, "bold"), pady=10)
+    self.title_label.pack()
+
+    # Bottom bar is packed before the text area so the controls are always visible
+    bottom_bar = tk.Frame(self.window)
+    bottom_bar.pack(side="bottom", fill="x", padx=16, pady=8)
+    self._text_frame = tk.Frame(self.window)
+    self._text_frame.pack(fill="both", expand=True, padx=16, pady=8)
+
+    # Language dropdown (left side of bottom bar); packs are read on first selection
+    languages = packs.languages()
+    self._codes = {name: code for code, name in languages}
+    self._names = dict(languages)
+    names = [name for _, name in languages]
+    self.lang_var = tk.StringVar(value=self._names.get(self.language, names[0]))
+    lang_dropdown = tk.OptionMenu(bottom_bar, self.lang_var, *names, command=lambda name: self.set_language(self._codes[name]))
+    lang_dropdown.config(font=("Segoe UI", 11), bg="#F7CA18", fg="black", width=14)
+    lang_dropdown.pack(side="left", padx=(0, 12))
+
+    # Buttons (right side of bottom bar)
+    btn_frame = tk.Frame(bottom_bar)
+    btn_frame.pack(side="right")
+    self.accept_btn = tk.Button(btn_frame, text="", command=traced(self.accept), font=("Segoe UI", 12), bg="#28A745", fg="white", width=18)
+    self.decline_btn = tk.Button(btn_frame, text="", command=traced(self.decline), font=("Segoe UI", 12), bg="#DC3545", fg="white", width=10)
+    self.accept_btn.pack(side="left", padx=8)
+    self.decline_btn.pack(side="right", padx=8)
+
+    self.set_language(self.language)
+
+  def _text_for(self, code):
+    text = self._texts.get(code)
+    if text is None:
+      text = tk.Text(self._text_frame, wrap="word", font=("Segoe UI", 12), height=20, width=70)
+      text.insert("1.0", self.packs.get(code)["consent"])
+      text.config(state="disabled")
+      self._texts[code] = text
+    return text
+
+  def set_language(self, code):
+    pack = self.packs.get(code)
+    self.language = code
+    if code in self._names:
+      self.lang_var.set(self._names[code])
+    self.title_label.config(text=pack["title"])
+    self.accept_btn.config(text=pack["accept"])
+    self.decline_btn.config(text=pack["decline"])
+    text = self._text_for(code)
+    if text is not self._shown_text:
+      if self._shown_text is not None:
+        self._shown_text.pack_forget()
+      text.pack(fill="both", expand=True)
+      self._shown_text = text
+
+  def show(self, patient_id=None):
+    """Show the dialog (modal) for `patient_id`, in the default language."""
+    self.patient_id = patient_id
+    # the previous patient's language choice must not carry over to the next one
+    self.set_language(DEFAULT_LANGUAGE)
+    self.window.deiconify()
+    self.window.lift()
+    self.window.grab_set()
+    self.accept_btn.focus_set()
+
+  def hide(self):
+    self.window.grab_release()
+    self.window.withdraw()
+
+  def _decide(self, decision, callback):
+    self.hide()
+    if self.audit is not None:
+      self.audit.record(decision, self.patient_id, self.language)
+    if callback is not None:
+      callback()
+
+  def accept(self):
+    self._decide("accepted", self.on_accept)
+
+  def decline(self):
+    self._decide("declined", self.on_decline)
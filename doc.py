@@ -1,109 +1,297 @@
 import tkinter as tk
-import ctypes
-import time
+import sys
 import threading
 
-# Make UI sharp on Windows
-ctypes.windll.shcore.SetProcessDpiAwareness(1)
+from frame_clock import FrameClock
+from lookup_service import LookupService
+from results_table import Column, ResultsTable
+import tk_trace
+from tk_trace import traced
 
-# Efficiency Data
+# Efficiency Data (shown when no outcome dataset is given on the command line)
+# as (disease, national rate, doctor rate, cases) like EfficiencyEngine.doctor_rows
 efficiency_data = [
-    ("Tuberculosis", "86%", "74%"),
-    ("Pneumonia", "89%", "94%"),
-    ("Cardiovascular diseases", "54%", "23%"),
-    ("Diabetes", "42%", "45%"),
-    ("COPD", "54%", "60%")
+    ("Tuberculosis", 0.86, 0.74, None),
+    ("Pneumonia", 0.89, 0.94, None),
+    ("Cardiovascular diseases", 0.54, 0.23, None),
+    ("Diabetes", 0.42, 0.45, None),
+    ("COPD", 0.54, 0.60, None)
 ]
 
-# Spinner state and helpers for analysing animation
+# Outcome data given as the first argument is opened in the background at startup;
+# lookups wait for it instead of sleeping. A prebuilt .stats store (see stats_store.py)
+# opens almost instantly; raw CSV / Parquet / .npz records are aggregated on load.
+# New outcome events are folded in incrementally on top of it (see record_outcome);
+# an optional second argument is their journal, replayed at startup and compacted
+# into a snapshot next to it (JOURNAL.stats) that later starts open instead.
+# Given the URL of a clinic service (service.py) instead, lookups and new outcomes
+# go to the service and share its statistics and cache (see service_client.py).
+engine = None
+engine_error = None
+engine_ready = threading.Event()
+
+def _load_engine(dataset_path, events_path):
+    global engine, engine_error
+    try:
+        if dataset_path.startswith(("http://", "https://")):
+            from service_client import ServiceClient
+
+            engine = ServiceClient(dataset_path)
+        else:
+            # numpy and the statistics modules are imported here, off the UI thread
+            from online_stats import open_online
+
+            engine = open_online(dataset_path, events_path)
+    except Exception as e:
+        engine_error = e
+    finally:
+        engine_ready.set()
+
+def start_loading(dataset_path, events_path=None):
+    """Open the outcome data in the background (or use the built-in table without one)."""
+    if dataset_path:
+        threading.Thread(target=_load_engine, args=(dataset_path, events_path), daemon=True).start()
+    else:
+        engine_ready.set()
+
+# Spinner state and helpers for analysing animation (ticked by the shared frame clock)
 spinner_chars = ["|", "/", "-", "\\"]
 spinner_index = 0
-spinner_job = None
+SPINNER_MS = 150
 
 def _spin_once():
-    """Internal: advance spinner and schedule next tick."""
-    global spinner_index, spinner_job
+    """Internal: advance the spinner by one frame."""
+    global spinner_index
     # Update the result label with spinner char
     result_label.config(text=f"Analysing... {spinner_chars[spinner_index]}", fg="#0078D4")
     spinner_index = (spinner_index + 1) % len(spinner_chars)
-    spinner_job = root.after(150, _spin_once)
 
 def start_spinner():
     """Start the spinner if not already running."""
-    global spinner_job
-    if spinner_job is None:
-        _spin_once()
+    if "spinner" not in frame_clock:
+        frame_clock.add("spinner", _spin_once, SPINNER_MS)
 
 def stop_spinner():
     """Stop the spinner if running."""
-    global spinner_job
-    if spinner_job is not None:
+    frame_clock.remove("spinner")
+
+def build_output(reg_no):
+    """Compute the result rows for `reg_no` (runs on a lookup worker thread)."""
+    engine_ready.wait()
+    if engine_error is not None:
+        raise RuntimeError(f"Failed to load outcome data:\n{engine_error}")
+    if engine is not None:
+        return engine.doctor_rows(reg_no)
+    return efficiency_data
+
+# Lookups run on a small fixed pool; duplicate clicks share one request and
+# results are cached per registration number.
+lookups = LookupService(build_output, max_workers=2)
+current_reg_no = None
+
+def record_outcome(reg_no, disease, outcome):
+    """Fold a new outcome event into the statistics; the next lookup for `reg_no` sees it."""
+    engine_ready.wait()
+    if engine is None:
+        raise RuntimeError("No outcome data is loaded; start doc.py with a dataset to record outcomes.")
+    engine.append(reg_no, disease, outcome)
+    # national rates moved too, so every cached result is stale
+    lookups.invalidate()
+
+def record_clicked(outcome):
+    """Record an outcome for the doctor on screen, then refresh their figures."""
+    reg_no = current_reg_no
+    if reg_no is None:
+        result_label.config(text="Analyse a doctor before recording an outcome.", fg="red")
+        return
+    disease = outcome_disease.get()
+
+    def work():
         try:
-            root.after_cancel(spinner_job)
-        except Exception:
-            pass
-        spinner_job = None
+            record_outcome(reg_no, disease, outcome)
+        except Exception as e:
+            root.after(0, _record_failed, e)
+        else:
+            root.after(0, _recorded, reg_no)
+
+    # waits for the outcome data to finish loading, so not on the UI thread
+    threading.Thread(target=work, daemon=True).start()
+
+def record_success():
+    record_clicked(1)
+
+def record_failure():
+    record_clicked(0)
+
+def _load_diseases():
+    """Offer every disease in the loaded outcome data in the outcome menu (runs off the UI thread)."""
+    engine_ready.wait()
+    if engine is None:
+        return
+    try:
+        diseases = sorted(engine.national_counts())
+    except Exception:
+        return  # the lookup reports the problem; the menu keeps the built-in diseases
+    if diseases:
+        root.after(0, _set_diseases, diseases)
+
+def _set_diseases(diseases):
+    menu = outcome_menu["menu"]
+    menu.delete(0, "end")
+    for disease in diseases:
+        menu.add_command(label=disease, command=tk._setit(outcome_disease, disease))
+    if outcome_disease.get() not in diseases:
+        outcome_disease.set(diseases[0])
+
+def _record_failed(error):
+    result_label.config(text=f"Could not record the outcome:\n{error}", fg="red")
+
+def _recorded(reg_no):
+    if reg_no == current_reg_no and entry.get().strip() == reg_no:
+        analyse_doctor()
 
 def analyse_doctor():
+    global current_reg_no
     reg_no = entry.get().strip()
 
     if reg_no == "":
+        current_reg_no = None
         stop_spinner()
         result_label.config(text="Please enter a registration number.", fg="red")
+        results.set_rows([])
         doctor_info_label.config(text="")
         return
 
     # Show doctor name and the entered registration number
     doctor_info_label.config(text=f"Doctor: Dr. Aditya Garg    Reg No: {reg_no}", fg="black")
+    current_reg_no = reg_no
+
+    future = lookups.submit(reg_no)
+    if future.done() and not future.cancelled():
+        # cached result: show it without starting the spinner
+        _show_result(reg_no, future)
+        return
 
-    # Start spinner animation and run analysis in background
+    # Start spinner animation; the result arrives from the lookup pool
     start_spinner()
+    future.add_done_callback(lambda f: root.after(0, _show_result, reg_no, f))
+
+
+def _show_result(reg_no, future):
+    """Display a finished lookup on the main thread, unless a newer number was entered since."""
+    if reg_no != current_reg_no or future.cancelled():
+        return
+    stop_spinner()
+    try:
+        rows = future.result()
+    except Exception as e:
+        result_label.config(text=f"Analysis failed:\n{e}", fg="red")
+        results.set_rows([])
+        return
+    if rows:
+        result_label.config(text="")
+    else:
+        result_label.config(text=f"No outcome records for registration number {reg_no}.", fg="black")
+    results.set_rows(rows)
 
-    # Run the wait in a thread so GUI doesn't freeze
-    def wait_and_display():
-        time.sleep(5)  # 5 seconds analysing
 
-        output = "Disease                         National %       Doctor %\n"
-        output += "-"*60 + "\n"
-        for d, n, doc in efficiency_data:
-            output += f"{d:<30} {n:<15} {doc}\n"
+# ----------------- GUI Setup -----------------
+def _enable_dpi_awareness():
+    """Make the UI sharp on Windows (a no-op on other platforms)."""
+    if sys.platform != "win32":
+        return
+    try:
+        import ctypes
 
-        # Schedule GUI update on main thread: stop spinner and display output
-        def display_output():
-            stop_spinner()
-            result_label.config(text=output, fg="black", justify="left", font=("Consolas", 12))
+        ctypes.windll.shcore.SetProcessDpiAwareness(1)
+    except (AttributeError, OSError):
+        pass
 
-        root.after(0, display_output)
+def _percent(rate):
+    return f"{round(rate * 100)}%"
 
-    threading.Thread(target=wait_and_display).start()
+root = frame_clock = entry = doctor_info_label = result_label = filter_entry = results = outcome_disease = outcome_menu = None
 
+def build_gui():
+    global root, frame_clock, entry, doctor_info_label, result_label, filter_entry, results, outcome_disease, outcome_menu
+    root = tk.Tk()
+    # one timer drives every animation; it stops when nothing animates or the window is minimized
+    frame_clock = FrameClock(root)
+    root.title("Doctor Efficiency Analysis")
+    root.geometry("1920x1080")
+    root.resizable(False, False)
 
-# ----------------- GUI Setup -----------------
-root = tk.Tk()
-root.title("Doctor Efficiency Analysis")
-root.geometry("1920x1080")
-root.resizable(False, False)
+    title = tk.Label(root, text="Doctor Efficiency Checker", font=("Segoe UI", 20))
+    title.pack(pady=10)
+
+    frame = tk.Frame(root)
+    frame.pack(pady=10)
+
+    # Doctor info label (updated when analysing)
+    doctor_info_label = tk.Label(root, text="", font=("Segoe UI", 14))
+    doctor_info_label.pack(pady=6)
+
+    label = tk.Label(frame, text="Please enter the Doctor's Registration Number:", font=("Segoe UI", 14))
+    label.grid(row=0, column=0, padx=5)
+
+    entry = tk.Entry(frame, font=("Segoe UI", 14), width=20)
+    entry.grid(row=0, column=1, padx=5)
 
-title = tk.Label(root, text="Doctor Efficiency Checker", font=("Segoe UI", 20))
-title.pack(pady=10)
+    analyse_btn = tk.Button(root, text="Analyse", font=("Segoe UI", 16), command=traced(analyse_doctor))
+    analyse_btn.pack(pady=10)
 
-frame = tk.Frame(root)
-frame.pack(pady=10)
+    result_label = tk.Label(root, text="", font=("Segoe UI", 16))
+    result_label.pack(pady=20)
 
-# Doctor info label (updated when analysing)
-doctor_info_label = tk.Label(root, text="", font=("Segoe UI", 14))
-doctor_info_label.pack(pady=6)
+    # Results table: only visible rows are drawn; click a heading to sort
+    filter_frame = tk.Frame(root)
+    filter_frame.pack(pady=(0, 6))
+    tk.Label(filter_frame, text="Filter diseases:", font=("Segoe UI", 12)).pack(side="left", padx=5)
+    filter_entry = tk.Entry(filter_frame, font=("Segoe UI", 12), width=30)
+    filter_entry.pack(side="left")
+    filter_entry.bind("<KeyRelease>", lambda e: results.set_filter(filter_entry.get(), col=0))
 
-label = tk.Label(frame, text="Please enter the Doctor's Registration Number:", font=("Segoe UI", 14))
-label.grid(row=0, column=0, padx=5)
+    results = ResultsTable(root, [
+        Column("Disease", 420),
+        Column("National %", 160, _percent, anchor="e"),
+        Column("Doctor %", 160, _percent, anchor="e"),
+        Column("Cases", 140, anchor="e"),
+    ], height=560)
+    results.pack(pady=10)
 
-entry = tk.Entry(frame, font=("Segoe UI", 14), width=20)
-entry.grid(row=0, column=1, padx=5)
+    # New outcomes for the doctor on screen are folded into the statistics at once;
+    # the menu lists the built-in diseases until the outcome data has loaded
+    outcome_frame = tk.Frame(root)
+    outcome_frame.pack(pady=(0, 10))
+    tk.Label(outcome_frame, text="Record an outcome:", font=("Segoe UI", 12)).pack(side="left", padx=5)
+    diseases = [d for d, *_ in efficiency_data]
+    outcome_disease = tk.StringVar(root, value=diseases[0])
+    outcome_menu = tk.OptionMenu(outcome_frame, outcome_disease, *diseases)
+    outcome_menu.pack(side="left", padx=5)
+    tk.Button(outcome_frame, text="Successful", font=("Segoe UI", 12), command=traced(record_success)).pack(side="left", padx=5)
+    tk.Button(outcome_frame, text="Unsuccessful", font=("Segoe UI", 12), command=traced(record_failure)).pack(side="left", padx=5)
 
-analyse_btn = tk.Button(root, text="Analyse", font=("Segoe UI", 16), command=analyse_doctor)
-analyse_btn.pack(pady=10)
+def main(argv=None, on_ready=None):
+    """Run the app; `on_ready(root)` is called once the first window is up (see bench_startup.py)."""
+    argv = sys.argv[1:] if argv is None else argv
+    start_loading(argv[0] if argv else None, argv[1] if len(argv) > 1 else None)
+    _enable_dpi_awareness()
+    # opt-in callback tracing and stall detection (TK_TRACE=trace.json, see tk_trace.py)
+    tracer = tk_trace.from_env()
+    build_gui()
+    threading.Thread(target=_load_diseases, daemon=True).start()
+    if tracer is not None:
+        tracer.watch(root)
+    if on_ready is not None:
+        root.after_idle(on_ready, root)
+    try:
+        root.mainloop()
+    finally:
+        tk_trace.stop()
 
-result_label = tk.Label(root, text="", font=("Segoe UI", 16))
-result_label.pack(pady=20)
+    lookups.shutdown()
+    if engine is not None:
+        engine.close()
 
-root.mainloop()
+if __name__ == "__main__":
+    main()
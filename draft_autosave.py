@@ -0,0 +1,135 @@
+"""Debounced autosave of a Tk Text widget into a DraftJournal.
+
+The widget's Tcl command is wrapped so every insert, delete and replace is
+seen with its exact range, whoever makes it (typing, paste, cut, code). Only
+those ranges are journaled; the buffer is never read back. Consecutive typing
+and backspacing are merged into one edit, and edits are handed to the journal
+once typing pauses for DEBOUNCE_MS (or at most every MAX_WAIT_MS while it
+goes on).
+
+The Text widget's own undo stack bypasses the widget command, so it must stay
+disabled (the Tk default) for the journal to see every change.
+"""
+
+import time
+
+DEBOUNCE_MS = 700
+MAX_WAIT_MS = 5000
+
+
+def _position(index):
+  line, col = index.split(".")
+  return int(line), int(col)
+
+
+def _advance(pos, text):
+  """Position just after `text` inserted at `pos`."""
+  line, col = pos
+  newlines = text.count("\n")
+  if not newlines:
+    return line, col + len(text)
+  return line + newlines, len(text) - text.rfind("\n") - 1
+
+
+class TextAutosave:
+  def __init__(self, text_widget, journal, debounce_ms=DEBOUNCE_MS, max_wait_ms=MAX_WAIT_MS):
+    self.widget = text_widget
+    self.journal = journal
+    self.debounce_ms = debounce_ms
+    self.max_wait_ms = max_wait_ms
+    # [start, end, text] edits not yet handed to the journal, oldest first
+    self._pending = []
+    self._first_pending = 0.0
+    self._after_id = None
+
+    tk_app = text_widget.tk
+    self._name = text_widget._w
+    self._orig = self._name + "_autosave_orig"
+    tk_app.call("rename", self._name, self._orig)
+    tk_app.createcommand(self._name, self._dispatch)
+    self._call = lambda *args: tk_app.call((self._orig,) + args)
+    text_widget.bind("<Destroy>", self._on_destroy, add="+")
+
+  # -------- Widget command --------
+  def _index(self, index):
+    return _position(self._call("index", index))
+
+  def _dispatch(self, cmd, *args):
+    if cmd == "insert" and args:
+      pos = self._index(args[0])
+      result = self._call(cmd, *args)
+      # insert index chars ?tagList chars tagList ...?
+      self._add(pos, pos, "".join(args[1::2]))
+      return result
+    if cmd == "delete" and args:
+      ranges = [(self._index(args[i]), self._index(args[i + 1] if i + 1 < len(args) else f"{args[i]} +1c")) for i in range(0, len(args), 2)]
+      result = self._call(cmd, *args)
+      # later ranges first, so the earlier positions stay valid
+      for start, end in sorted(ranges, reverse=True):
+        if start < end:
+          self._add(start, end, "")
+      return result
+    if cmd == "replace" and len(args) >= 2:
+      start, end = self._index(args[0]), self._index(args[1])
+      result = self._call(cmd, *args)
+      self._add(start, max(start, end), "".join(args[2::2]))
+      return result
+    return self._call(cmd, *args)
+
+  def _add(self, start, end, text):
+    if start == end and not text:
+      return
+    last = self._pending[-1] if self._pending else None
+    if last is not None and start == end and last[0] == last[1] and start == _advance(last[0], last[2]):
+      # typing on: extend the previous insert
+      last[2] += text
+    elif last is not None and not text and not last[2] and end == last[0]:
+      # backspacing on: widen the previous delete backwards
+      last[0] = start
+    else:
+      self._pending.append([start, end, text])
+    self._schedule()
+
+  # -------- Debounce --------
+  def _schedule(self):
+    now = time.perf_counter()
+    if self._after_id is None:
+      self._first_pending = now
+    else:
+      self.widget.after_cancel(self._after_id)
+    # wait for a pause in typing, but never longer than max_wait_ms after the first unsaved edit
+    waited = (now - self._first_pending) * 1000.0
+    self._after_id = self.widget.after(int(min(self.debounce_ms, max(self.max_wait_ms - waited, 0))), self.flush)
+
+  def flush(self):
+    """Hand the pending edits to the journal (it writes them on its own thread)."""
+    if self._after_id is not None:
+      try:
+        self.widget.after_cancel(self._after_id)
+      except Exception:
+        pass
+      self._after_id = None
+    for (l1, c1), (l2, c2), text in self._pending:
+      self.journal.edit(l1, c1, l2, c2, text)
+    self._pending = []
+
+  # -------- Teardown --------
+  def _on_destroy(self, event):
+    if event.widget is self.widget:
+      self.close()
+
+  def close(self, discard=False):
+    """Stop tracking; write out (or, with `discard`, delete) the journal."""
+    if self.journal is None:
+      return
+    self.flush()
+    try:
+      self.widget.tk.deletecommand(self._name)
+      self.widget.tk.call("rename", self._orig, self._name)
+    except Exception:
+      pass  # the widget is already gone
+    journal, self.journal = self.journal, None
+    if discard:
+      journal.discard()
+    else:
+      journal.close()
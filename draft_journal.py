@@ -0,0 +1,154 @@
+"""Append-only journal of unsaved edits to a prescription, one file per patient (no GUI dependency).
+
+The first line of a journal is a snapshot of the text; every further line is
+one edit, `[line1, col1, line2, col2, "text"]`: replace the range between the
+two Tk-style positions (1-based lines, 0-based columns) with the text. Edits
+are appended by a background thread and made durable with one fsync per
+batch, so the editor never waits on the disk.
+
+Once the edits outweigh the text, the writer compacts the journal into a
+fresh snapshot (written to a temp file and renamed over the journal). After a
+crash, `recover` replays the snapshot and every complete edit line; a line
+torn by the crash is ignored.
+
+  python draft_journal.py DRAFTS_DIR PATIENT_ID     print the recovered text
+"""
+
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+COMPACT_EDITS = 2000
+COMPACT_MIN_BYTES = 64 * 1024
+
+_STOP = object()
+_DISCARD = object()
+
+
+def journal_path(directory, patient_id):
+  """Journal file for `patient_id`; characters that are unsafe in file names are %-escaped."""
+  name = "".join(c if c.isalnum() or c in "-_." else f"%{ord(c):02X}" for c in str(patient_id)) or "%"
+  return os.path.join(directory, f"{name}.journal")
+
+
+def apply_edit(lines, edit):
+  """Apply one `[line1, col1, line2, col2, text]` edit to `lines` (the text split on newlines)."""
+  l1, c1, l2, c2, text = edit
+  # positions past the end (Tk's "end") mean the end of the text
+  last = len(lines)
+  if l1 > last:
+    l1, c1 = last, len(lines[-1])
+  if l2 > last:
+    l2, c2 = last, len(lines[-1])
+  lines[l1 - 1:l2] = (lines[l1 - 1][:c1] + text + lines[l2 - 1][c2:]).split("\n")
+
+
+def _read(path):
+  """Return (text, edits applied, snapshot time) from the journal at `path`."""
+  with open(path, "r", encoding="utf-8") as f:
+    header = json.loads(f.readline())
+    lines = header["text"].split("\n")
+    edits = 0
+    for line in f:
+      try:
+        edit = json.loads(line)
+      except ValueError:
+        break  # torn by a crash mid-write; nothing valid follows it
+      apply_edit(lines, edit)
+      edits += 1
+  return "\n".join(lines), edits, header.get("ts")
+
+
+def recover(directory, patient_id):
+  """Return the text left in `patient_id`'s journal, or None if there is none."""
+  path = journal_path(directory, patient_id)
+  try:
+    return _read(path)[0]
+  except (OSError, ValueError, KeyError):
+    return None
+
+
+class DraftJournal:
+  def __init__(self, directory, patient_id, text):
+    """Start a journal for `patient_id` whose current text is `text` (replaces any old journal)."""
+    os.makedirs(directory, exist_ok=True)
+    self.path = journal_path(directory, patient_id)
+    self.patient_id = str(patient_id)
+    self._lines = text.split("\n")
+    self._queue = queue.SimpleQueue()
+    self._thread = threading.Thread(target=self._write_loop, name="draft-journal", daemon=True)
+    self._thread.start()
+
+  def edit(self, line1, col1, line2, col2, text=""):
+    """Record that the range (line1.col1, line2.col2) was replaced by `text`."""
+    self._queue.put([line1, col1, line2, col2, text])
+
+  # -------- Writer thread --------
+  def _snapshot(self):
+    """Rewrite the journal as a single snapshot of the current text; returns the open file."""
+    tmp = self.path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+      json.dump({"patient_id": self.patient_id, "ts": time.time(), "text": "\n".join(self._lines)}, f, ensure_ascii=False)
+      f.write("\n")
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(tmp, self.path)
+    return open(self.path, "a", encoding="utf-8")
+
+  def _write_loop(self):
+    f = self._snapshot()
+    edits = size = 0
+    try:
+      while True:
+        item = self._queue.get()
+        # append everything that is queued, then make it durable once
+        while not (item is _STOP or item is _DISCARD):
+          apply_edit(self._lines, item)
+          line = json.dumps(item, ensure_ascii=False) + "\n"
+          f.write(line)
+          edits += 1
+          size += len(line)
+          try:
+            item = self._queue.get_nowait()
+          except queue.Empty:
+            break
+        if item is _DISCARD:
+          f.close()
+          os.remove(self.path)
+          return
+        f.flush()
+        os.fsync(f.fileno())
+        if item is _STOP:
+          return
+        if edits >= COMPACT_EDITS or size >= max(COMPACT_MIN_BYTES, 2 * sum(map(len, self._lines))):
+          f.close()
+          f = self._snapshot()
+          edits = size = 0
+    finally:
+      f.close()
+
+  def close(self):
+    """Write the remaining edits and stop; the journal stays for recovery."""
+    self._queue.put(_STOP)
+    self._thread.join(timeout=5)
+
+  def discard(self):
+    """Stop and delete the journal (its text was saved)."""
+    self._queue.put(_DISCARD)
+    self._thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+  if len(sys.argv) != 3:
+    print("usage: python draft_journal.py DRAFTS_DIR PATIENT_ID", file=sys.stderr)
+    sys.exit(2)
+  path = journal_path(sys.argv[1], sys.argv[2])
+  if not os.path.exists(path):
+    print(f"No journal for {sys.argv[2]}", file=sys.stderr)
+    sys.exit(1)
+  text, edits, ts = _read(path)
+  print(f"--- snapshot {time.strftime('%d-%m-%Y %H:%M:%S', time.localtime(ts))} + {edits} edit(s)")
+  print(text)
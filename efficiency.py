@@ -0,0 +1,251 @@
+"""Doctor efficiency computation over prescription/outcome records.
+
+Records have one row per treated case:
+
+    reg_no, disease, outcome[, year]
+
+where `outcome` is 1 for a successful outcome and 0 otherwise (`year` is kept by
+the loaders but not used by the statistics). Columns are held
+as NumPy arrays and every statistic is a vectorized group-by: national rates per
+disease come from `np.bincount`, per-doctor rates from one sort of a combined
+(doctor, disease) key, so a lookup is a binary search rather than a scan of the
+raw records.
+
+String columns are best passed dictionary-encoded, as integer codes in `<name>`
+plus the distinct values in `<name>_labels` (what Parquet and Arrow store);
+sorting millions of raw strings costs far more than the statistics themselves.
+
+Supported inputs: CSV (pyarrow's reader when installed, else the csv module),
+Parquet (requires pyarrow) and .npz files written by `save_npz`. Synthetic
+datasets for tests: `python efficiency.py OUT.(npz|csv) N_RECORDS [N_DOCTORS]`.
+"""
+
+import csv
+import os
+
+import numpy as np
+
+DISEASES = (
+    "Tuberculosis",
+    "Pneumonia",
+    "Cardiovascular diseases",
+    "Diabetes",
+    "COPD",
+)
+
+
+def _factorize(values, labels=None):
+    """Return (sorted uniques, codes) for a column, optionally already dictionary-encoded."""
+    if labels is None:
+        uniques, codes = np.unique(np.asarray(values), return_inverse=True)
+        return uniques, codes.astype(np.int64)
+    labels = np.asarray(labels)
+    order = np.argsort(labels, kind="stable")
+    rank = np.empty(len(labels), dtype=np.int64)
+    rank[order] = np.arange(len(labels))
+    return labels[order], rank[np.asarray(values, dtype=np.int64)]
+
+
+class EfficiencyEngine:
+    """Per-doctor and national outcome rates per disease.
+
+    Each row is one case with a 0/1 `outcomes` value, or, when `cases` is given,
+    an already aggregated group of `cases` cases with `outcomes` successes.
+    """
+
+    def __init__(self, reg_nos, diseases, outcomes, reg_no_labels=None, disease_labels=None, cases=None):
+        self.doctors, doc_idx = _factorize(reg_nos, reg_no_labels)
+        self.diseases, dis_idx = _factorize(diseases, disease_labels)
+        outcomes = np.asarray(outcomes, dtype=np.int64)
+        weights = None if cases is None else np.asarray(cases, dtype=np.int64)
+        n_dis = len(self.diseases)
+        self.n_records = len(outcomes) if weights is None else int(weights.sum())
+
+        # national baseline: successes / cases per disease
+        self.national_cases = np.bincount(dis_idx, weights=weights, minlength=n_dis).astype(np.int64)
+        self.national_success = np.bincount(dis_idx, weights=outcomes, minlength=n_dis).astype(np.int64)
+
+        # per-doctor: group by the combined key doctor * n_diseases + disease
+        keys = doc_idx * n_dis + dis_idx
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.cases = np.bincount(inverse, weights=weights).astype(np.int64)
+        self.success = np.bincount(inverse, weights=outcomes).astype(np.int64)
+
+    @classmethod
+    def from_columns(cls, cols):
+        return cls(
+            cols["reg_no"], cols["disease"], cols["outcome"],
+            cols.get("reg_no_labels"), cols.get("disease_labels"),
+        )
+
+    @classmethod
+    def from_file(cls, path):
+        return cls.from_columns(load_columns(path))
+
+    def national_rates(self):
+        """Return {disease: national success rate (0..1)}."""
+        rates = self.national_success / np.maximum(self.national_cases, 1)
+        return dict(zip(self.diseases.tolist(), rates.tolist()))
+
+    def national_counts(self):
+        """Return {disease: (cases, successes)}."""
+        return dict(zip(self.diseases.tolist(), zip(self.national_cases.tolist(), self.national_success.tolist())))
+
+    def aggregate_rows(self):
+        """Return (reg_no, disease, cases, successes) columns, one row per doctor and disease."""
+        n_dis = len(self.diseases)
+        return (
+            self.doctors[self.keys // n_dis].astype(str),
+            self.diseases[self.keys % n_dis].astype(str),
+            self.cases,
+            self.success,
+        )
+
+    def doctor_index(self, reg_no):
+        """Position of `reg_no` in `self.doctors`, or None if it has no records."""
+        try:
+            key = self.doctors.dtype.type(reg_no)
+        except (TypeError, ValueError):
+            return None
+        i = int(np.searchsorted(self.doctors, key))
+        if i >= len(self.doctors) or self.doctors[i] != key:
+            return None
+        return i
+
+    def doctor_counts(self, reg_no):
+        """Return [(disease, cases, successes)] for every disease `reg_no` treated."""
+        i = self.doctor_index(reg_no)
+        if i is None:
+            return []
+        n_dis = len(self.diseases)
+        lo, hi = np.searchsorted(self.keys, [i * n_dis, (i + 1) * n_dis])
+        dis = self.keys[lo:hi] - i * n_dis
+        return list(zip(self.diseases[dis].tolist(), self.cases[lo:hi].tolist(), self.success[lo:hi].tolist()))
+
+    def doctor_rows(self, reg_no):
+        """Return [(disease, national_rate, doctor_rate, cases)] for every disease `reg_no` treated."""
+        i = self.doctor_index(reg_no)
+        if i is None:
+            return []
+        n_dis = len(self.diseases)
+        lo, hi = np.searchsorted(self.keys, [i * n_dis, (i + 1) * n_dis])
+        dis = self.keys[lo:hi] - i * n_dis
+        doc_rate = self.success[lo:hi] / self.cases[lo:hi]
+        nat_rate = self.national_success[dis] / np.maximum(self.national_cases[dis], 1)
+        return list(zip(self.diseases[dis].tolist(), nat_rate.tolist(), doc_rate.tolist(), self.cases[lo:hi].tolist()))
+
+
+def format_rows(rows):
+    """Rows for the results display: (disease, "NN%" national, "NN%" doctor)."""
+    return [(d, f"{round(n * 100)}%", f"{round(doc * 100)}%") for d, n, doc, _ in rows]
+
+
+# ----------------- Loading -----------------
+def load_columns(path):
+    """Load reg_no/disease/outcome(/year) columns from a .csv, .parquet or .npz file."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npz":
+        with np.load(path, allow_pickle=False) as z:
+            return {k: z[k] for k in z.files}
+    if ext == ".parquet":
+        import pyarrow.parquet as pq
+
+        return _arrow_columns(pq.read_table(path))
+    try:
+        import pyarrow.csv as pacsv
+    except ImportError:
+        return _csv_columns(path)
+    return _arrow_columns(pacsv.read_csv(path))
+
+
+def _arrow_columns(table):
+    import pyarrow as pa
+
+    cols = {}
+    for name in ("reg_no", "disease", "outcome", "year"):
+        if name not in table.column_names:
+            continue
+        col = table.column(name).combine_chunks()
+        if pa.types.is_string(col.type) or pa.types.is_large_string(col.type):
+            col = col.dictionary_encode()
+        if pa.types.is_dictionary(col.type):
+            cols[name] = col.indices.to_numpy(zero_copy_only=False)
+            cols[name + "_labels"] = col.dictionary.to_numpy(zero_copy_only=False).astype(str)
+        else:
+            cols[name] = col.to_numpy(zero_copy_only=False)
+    return cols
+
+
+def _csv_columns(path):
+    # dictionary-encode the string columns while reading
+    reg_ids, dis_ids = {}, {}
+    reg, dis, out, year = [], [], [], []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        ri, di, oi = header.index("reg_no"), header.index("disease"), header.index("outcome")
+        yi = header.index("year") if "year" in header else None
+        for row in reader:
+            reg.append(reg_ids.setdefault(row[ri], len(reg_ids)))
+            dis.append(dis_ids.setdefault(row[di], len(dis_ids)))
+            out.append(row[oi])
+            if yi is not None:
+                year.append(row[yi])
+    cols = {
+        "reg_no": np.array(reg, dtype=np.int64),
+        "reg_no_labels": np.array(list(reg_ids)),
+        "disease": np.array(dis, dtype=np.int64),
+        "disease_labels": np.array(list(dis_ids)),
+        "outcome": np.array(out, dtype=np.int64),
+    }
+    if yi is not None:
+        cols["year"] = np.array(year, dtype=np.int64)
+    return cols
+
+
+def save_npz(path, cols):
+    np.savez(path, **cols)
+
+
+def save_csv(path, cols):
+    names = [k for k in ("reg_no", "disease", "outcome", "year") if k in cols]
+    data = []
+    for k in names:
+        labels = cols.get(k + "_labels")
+        data.append((cols[k] if labels is None else np.asarray(labels)[cols[k]]).tolist())
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        writer.writerows(zip(*data))
+
+
+# ----------------- Synthetic data -----------------
+def synthetic_records(n_records, n_doctors=1000, diseases=DISEASES, years=(2021, 2025), seed=0):
+    """Generate reproducible random records with a per-doctor skill offset.
+
+    Registration numbers are integers from 100000 up; diseases are dictionary-encoded.
+    """
+    rng = np.random.default_rng(seed)
+    base = rng.uniform(0.3, 0.9, len(diseases))
+    skill = rng.normal(0.0, 0.1, n_doctors)
+    doc = rng.integers(0, n_doctors, n_records)
+    dis = rng.integers(0, len(diseases), n_records)
+    p = np.clip(base[dis] + skill[doc], 0.01, 0.99)
+    return {
+        "reg_no": 100000 + doc,
+        "disease": dis.astype(np.int16),
+        "disease_labels": np.asarray(diseases),
+        "outcome": (rng.random(n_records) < p).astype(np.int8),
+        "year": rng.integers(years[0], years[1] + 1, n_records).astype(np.int16),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3:
+        print("usage: python efficiency.py OUT.(npz|csv) N_RECORDS [N_DOCTORS]", file=sys.stderr)
+        sys.exit(2)
+    out, n = sys.argv[1], int(sys.argv[2])
+    cols = synthetic_records(n, int(sys.argv[3]) if len(sys.argv) > 3 else 1000)
+    (save_csv if out.lower().endswith(".csv") else save_npz)(out, cols)
@@ -0,0 +1,276 @@
+"""Background export pipeline for finished prescriptions.
+
+One `ExportJob` carries a prescription's final text (plus, optionally, its FHIR
+JSON copy) and the paths to write it to as TXT, PDF and/or JSON. Jobs go through
+a bounded queue to a single worker thread, so exports stay in submission order
+and a burst of exports cannot pile up unbounded work.
+
+Every file is written to a temporary file in its target directory and only
+renamed over the target once it is complete and on disk, so a crash never
+leaves a truncated prescription behind. The worker drains whatever jobs are
+queued and handles them as one batch: each job's temp files are synced and
+renamed, then each touched directory is synced once. A job fails on its own;
+the others in the batch still complete.
+
+Progress and completion callbacks are delivered to the Tk main loop with
+`root.after`, so widgets are only ever touched from the UI thread.
+"""
+
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+
+FORMATS = ("txt", "pdf", "json")
+MAX_PENDING = 16
+MAX_BATCH = 8
+
+_STOP = object()
+
+
+class ExportJob:
+  """Write `text` (and `fhir`, a dict, for "json") to `targets`, a {format: path} dict.
+
+  `record`, if given, is called on the worker before any file is written (the
+  mic app appends the text to the prescription store there).
+  """
+
+  __slots__ = ("text", "targets", "fhir", "record", "on_done", "on_error", "on_progress", "queued_at")
+
+  def __init__(self, text, targets, fhir=None, record=None):
+    unknown = set(targets) - set(FORMATS)
+    if unknown:
+      raise ValueError(f"unknown export formats: {', '.join(sorted(unknown))}")
+    if "json" in targets and fhir is None:
+      raise ValueError("a JSON export needs the FHIR document")
+    self.text = text
+    self.targets = dict(targets)
+    self.fhir = fhir
+    self.record = record
+    self.on_done = self.on_error = self.on_progress = None
+    self.queued_at = 0.0
+
+
+_temp_ids = itertools.count()
+
+
+def _temp_path(path):
+  """A temp file next to `path`, unique per call (two jobs may target the same path)."""
+  return os.path.join(os.path.dirname(os.path.abspath(path)), f".{os.path.basename(path)}.{os.getpid()}.{next(_temp_ids)}.tmp")
+
+
+def _remove(paths):
+  for path in paths:
+    try:
+      os.remove(path)
+    except OSError:
+      pass
+
+
+def _write_txt(job, tmp, progress):
+  import prescription
+
+  prescription.write_txt(job.text, tmp)
+
+
+def _write_pdf(job, tmp, progress):
+  from pdf_render import default_renderer
+
+  default_renderer().render(job.text, tmp, progress=progress)
+
+
+def _write_json(job, tmp, progress):
+  with open(tmp, "w", encoding="utf-8") as f:
+    json.dump(job.fhir, f, ensure_ascii=False, indent=2)
+
+
+_WRITERS = {"txt": _write_txt, "pdf": _write_pdf, "json": _write_json}
+
+
+def _fsync_path(path, directory=False):
+  fd = os.open(path, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) if directory else os.O_RDWR)
+  try:
+    os.fsync(fd)
+  finally:
+    os.close(fd)
+
+
+class ExportWorker:
+  def __init__(self, root=None, max_pending=MAX_PENDING, max_batch=MAX_BATCH, durable=True):
+    self.root = root
+    self.max_batch = max_batch
+    # fsync temp files and directories (turn off only for throwaway output)
+    self.durable = durable
+    self._queue = queue.Queue(maxsize=max_pending)
+    self._thread = threading.Thread(target=self._run, name="export", daemon=True)
+    self._warmed = None
+    self._lock = threading.Lock()
+    self._started = time.perf_counter()
+    self.jobs_done = self.jobs_failed = self.files_written = self.bytes_written = 0
+    self.batches = self.fsyncs = 0
+    self.busy_seconds = self.wait_seconds = 0.0
+    self._thread.start()
+
+  def _post(self, fn, *args):
+    if fn is None:
+      return
+    if self.root is None:
+      fn(*args)
+      return
+    try:
+      self.root.after(0, fn, *args)
+    except Exception:
+      # the window was closed while the export was running
+      pass
+
+  def submit(self, job, on_done=None, on_error=None, on_progress=None, block=True, timeout=None):
+    """Queue `job`; raises queue.Full if the queue stays full (only when block=False or timed out).
+
+    The Tk thread must pass block=False and report the queue as busy on queue.Full.
+
+    `on_progress(done, total)` is forwarded from PDF rendering; `on_done(paths)`
+    gets the {format: path} dict, `on_error(exc)` the first error.
+    """
+    job.on_done, job.on_error, job.on_progress = on_done, on_error, on_progress
+    job.queued_at = time.perf_counter()
+    self._queue.put(job, block=block, timeout=timeout)
+    return job
+
+  def warm_up(self):
+    """Import reportlab and build the shared PDF renderer in the background (once)."""
+    with self._lock:
+      if self._warmed is None:
+        self._warmed = threading.Thread(target=_warm_pdf, name="pdf-warm-up", daemon=True)
+        self._warmed.start()
+    return self._warmed
+
+  # -------- Worker --------
+  def _run(self):
+    while True:
+      batch = [self._queue.get()]
+      # take whatever else is already waiting so it shares one round of fsyncs
+      while len(batch) < self.max_batch and batch[-1] is not _STOP:
+        try:
+          batch.append(self._queue.get_nowait())
+        except queue.Empty:
+          break
+      stop = batch[-1] is _STOP
+      jobs = [job for job in batch if job is not _STOP]
+      if jobs:
+        self._export_batch(jobs)
+      if stop:
+        return
+
+  def _write_job(self, job):
+    """Write every target of `job` to its temp file; returns [(tmp, path)]."""
+    written = []
+
+    def progress(done, total):
+      self._post(job.on_progress, done, total)
+
+    try:
+      if job.record is not None:
+        job.record()
+      for fmt, path in job.targets.items():
+        tmp = _temp_path(path)
+        written.append((tmp, path))
+        _WRITERS[fmt](job, tmp, progress)
+    except BaseException:
+      _remove(tmp for tmp, _ in written)
+      raise
+    return written
+
+  def _export_batch(self, jobs):
+    started = time.perf_counter()
+    done = []
+    for job in jobs:
+      self.wait_seconds += started - job.queued_at
+      try:
+        done.append((job, self._write_job(job)))
+      except Exception as e:
+        self.jobs_failed += 1
+        self._post(job.on_error, e)
+
+    # sync and rename job by job, so one failure only fails its own job
+    renamed = []
+    fsyncs = 0
+    for job, pairs in done:
+      try:
+        if self.durable:
+          for tmp, _ in pairs:
+            _fsync_path(tmp)
+            fsyncs += 1
+        for tmp, path in pairs:
+          size = os.path.getsize(tmp)
+          os.replace(tmp, path)
+          self.bytes_written += size
+      except Exception as e:
+        _remove(tmp for tmp, _ in pairs)
+        self.jobs_failed += 1
+        self._post(job.on_error, e)
+      else:
+        renamed.append((job, pairs))
+
+    # the renames themselves are durable once each directory is synced (not possible on Windows)
+    failed_dirs = {}
+    if self.durable and os.name == "posix":
+      for directory in {os.path.dirname(os.path.abspath(path)) for _, pairs in renamed for _, path in pairs}:
+        try:
+          _fsync_path(directory, directory=True)
+          fsyncs += 1
+        except OSError as e:
+          failed_dirs[directory] = e
+    self.batches += 1
+    self.fsyncs += fsyncs
+    self.busy_seconds += time.perf_counter() - started
+
+    for job, pairs in renamed:
+      error = next((failed_dirs[d] for d in (os.path.dirname(os.path.abspath(path)) for _, path in pairs) if d in failed_dirs), None)
+      if error is not None:
+        self.jobs_failed += 1
+        self._post(job.on_error, error)
+        continue
+      self.jobs_done += 1
+      self.files_written += len(pairs)
+      self._post(job.on_done, dict(job.targets))
+
+  # -------- Metrics --------
+  def queue_depth(self):
+    return self._queue.qsize()
+
+  def metrics(self):
+    """Counters and rates for the status bar / benchmarks."""
+    elapsed = max(time.perf_counter() - self._started, 1e-9)
+    finished = max(self.jobs_done + self.jobs_failed, 1)
+    return {
+      "queue_depth": self.queue_depth(),
+      "max_pending": self._queue.maxsize,
+      "jobs_done": self.jobs_done,
+      "jobs_failed": self.jobs_failed,
+      "files_written": self.files_written,
+      "bytes_written": self.bytes_written,
+      "batches": self.batches,
+      "fsyncs": self.fsyncs,
+      "jobs_per_sec": self.jobs_done / elapsed,
+      "mb_per_sec": self.bytes_written / elapsed / 1e6,
+      "busy_jobs_per_sec": self.jobs_done / self.busy_seconds if self.busy_seconds else 0.0,
+      "avg_wait_ms": self.wait_seconds / finished * 1000.0,
+    }
+
+  def shutdown(self, wait=False):
+    """Finish the queued jobs, then stop the worker."""
+    self._queue.put(_STOP)
+    if wait:
+      self._thread.join()
+
+
+def _warm_pdf():
+  try:
+    from pdf_render import default_renderer
+
+    default_renderer()
+  except ImportError:
+    # reported to the user when they actually try to export a PDF
+    pass
@@ -0,0 +1,374 @@
+"""Compact typed model of the FHIR resources used for prescriptions, plus Bundle indexes.
+
+Each resource class uses `__slots__` and keeps only the handful of fields the
+prescription needs, with repeated strings (systems, codes, statuses) interned, so
+many patients can be held in memory at once. `BundleIndex` groups resources by
+resourceType, by (system, code) and by patient reference for O(1) lookups.
+"""
+
+import sys
+
+SNOMED = "http://snomed.info/sct"
+CONDITION_CLINICAL = "http://terminology.hl7.org/CodeSystem/condition-clinical"
+UCUM = "http://unitsofmeasure.org"
+# R4 Patient has no age element; an age without a birth date travels in this extension
+AGE_EXTENSION = "urn:prescription-app:patient-age"
+
+_intern = sys.intern
+
+
+def _s(value):
+  """Intern a string field (None/missing becomes '')."""
+  return _intern(value) if isinstance(value, str) else ("" if value is None else str(value))
+
+
+def _coding(concept):
+  """Return (system, code, display) of the first coding in a CodeableConcept."""
+  try:
+    c = concept["coding"][0]
+  except (KeyError, IndexError, TypeError):
+    return "", "", ""
+  return _s(c.get("system")), _s(c.get("code")), c.get("display", "")
+
+
+def _status(value):
+  """Accept both a plain status string and a CodeableConcept status."""
+  if isinstance(value, dict):
+    return _coding(value)[1] or _s(value.get("text"))
+  return _s(value)
+
+
+def _subject(res):
+  subject = res.get("subject") or res.get("patient") or {}
+  return _s(subject.get("reference")) if isinstance(subject, dict) else ""
+
+
+class Resource:
+  __slots__ = ("id", "patient_ref")
+  resource_type = ""
+
+  def __init__(self, id="", patient_ref=""):
+    self.id = id
+    self.patient_ref = patient_ref
+
+  def __repr__(self):
+    fields = ", ".join(f"{k}={getattr(self, k)!r}" for k in self._fields())
+    return f"{type(self).__name__}({fields})"
+
+  def _base(self):
+    res = {"resourceType": self.resource_type}
+    if self.id:
+      res["id"] = self.id
+    if self.patient_ref and not self.patient_ref.startswith("Patient/#"):
+      res["subject"] = {"reference": self.patient_ref}
+    return res
+
+  @classmethod
+  def _fields(cls):
+    names = []
+    for klass in reversed(cls.__mro__):
+      names.extend(klass.__dict__.get("__slots__", ()))
+    return names
+
+
+class Coded(Resource):
+  """A resource identified by a single coding (system, code, display)."""
+  __slots__ = ("system", "code", "display")
+
+  def __init__(self, id="", patient_ref="", system="", code="", display=""):
+    super().__init__(id, patient_ref)
+    self.system = system
+    self.code = code
+    self.display = display
+
+  def _concept(self):
+    # FHIR does not allow empty strings, so unknown parts are left out
+    coding = {k: v for k, v in (("system", self.system), ("code", self.code), ("display", self.display)) if v}
+    return {"coding": [coding]} if self.code else {"text": self.display or "Unknown"}
+
+
+class Patient(Resource):
+  __slots__ = ("name", "gender", "age")
+  resource_type = "Patient"
+
+  def __init__(self, id="", name="", gender="", age=""):
+    super().__init__(id, "")
+    self.name = name
+    self.gender = gender
+    self.age = age
+
+  @classmethod
+  def from_fhir(cls, res):
+    names = res.get("name") or [{}]
+    name = names[0].get("text") or " ".join(names[0].get("given", []) + [names[0].get("family", "")]).strip()
+    # a plain "age" (as in the sample exports) or the extension written by to_fhir
+    age = res.get("age", "")
+    for ext in res.get("extension") or ():
+      if ext.get("url") == AGE_EXTENSION:
+        age = (ext.get("valueAge") or {}).get("value", age)
+    return cls(_s(res.get("id")), name, _s(res.get("gender")), age)
+
+  def to_fhir(self):
+    res = {"resourceType": "Patient"}
+    if self.id:
+      res["id"] = self.id
+    if self.name:
+      res["name"] = [{"text": self.name}]
+    if self.gender:
+      res["gender"] = self.gender
+    try:
+      years = float(self.age)
+    except (TypeError, ValueError):
+      years = None
+    if years is not None:
+      value = int(years) if years.is_integer() else years
+      res["extension"] = [{"url": AGE_EXTENSION, "valueAge": {"value": value, "unit": "a", "system": UCUM, "code": "a"}}]
+    return res
+
+
+class Condition(Coded):
+  __slots__ = ("clinical_status",)
+  resource_type = "Condition"
+
+  def __init__(self, id="", patient_ref="", system="", code="", display="", clinical_status=""):
+    super().__init__(id, patient_ref, system, code, display)
+    self.clinical_status = clinical_status
+
+  @property
+  def active(self):
+    return self.clinical_status in ("", "active", "recurrence", "relapse")
+
+  @classmethod
+  def from_fhir(cls, res):
+    return cls(_s(res.get("id")), _subject(res), *_coding(res.get("code")), _status(res.get("clinicalStatus")))
+
+  def to_fhir(self):
+    res = self._base()
+    res["code"] = self._concept()
+    if self.clinical_status:
+      res["clinicalStatus"] = {"coding": [{"system": CONDITION_CLINICAL, "code": self.clinical_status}]}
+    return res
+
+
+class Observation(Coded):
+  __slots__ = ("value", "unit", "status")
+  resource_type = "Observation"
+
+  def __init__(self, id="", patient_ref="", system="", code="", display="", value="", unit="", status=""):
+    super().__init__(id, patient_ref, system, code, display)
+    self.value = value
+    self.unit = unit
+    self.status = status
+
+  @classmethod
+  def from_fhir(cls, res):
+    qty = res.get("valueQuantity") or {}
+    return cls(
+      _s(res.get("id")), _subject(res), *_coding(res.get("code")), qty.get("value", ""), _s(qty.get("unit")),
+      _s(res.get("status")),
+    )
+
+  def to_fhir(self):
+    res = self._base()
+    # status is required in R4; measurements without one are taken as final results
+    res["status"] = self.status or "final"
+    res["code"] = self._concept()
+    if self.value != "":
+      res["valueQuantity"] = {"value": self.value, "unit": self.unit} if self.unit else {"value": self.value}
+    return res
+
+
+class MedicationRequest(Coded):
+  __slots__ = ("status", "intent", "instruction", "timing")
+  resource_type = "MedicationRequest"
+
+  def __init__(self, id="", patient_ref="", system="", code="", display="", status="", intent="", instruction="", timing=""):
+    super().__init__(id, patient_ref, system, code, display)
+    self.status = status
+    self.intent = intent
+    self.instruction = instruction
+    self.timing = timing
+
+  @property
+  def active(self):
+    return self.status in ("", "active")
+
+  @classmethod
+  def from_fhir(cls, res):
+    dosage = (res.get("dosageInstruction") or [{}])[0]
+    timing = (dosage.get("timing") or {}).get("code", "")
+    if isinstance(timing, dict):
+      timing = _coding(timing)[1] or timing.get("text", "")
+    return cls(
+      _s(res.get("id")), _subject(res), *_coding(res.get("medicationCodeableConcept")),
+      _s(res.get("status")), _s(res.get("intent")), dosage.get("text", ""), _s(timing),
+    )
+
+  def to_fhir(self):
+    res = self._base()
+    # both are required in R4; an unset status counts as active (see `active`)
+    res["status"] = self.status or "active"
+    res["intent"] = self.intent or "order"
+    res["medicationCodeableConcept"] = self._concept()
+    if self.instruction or self.timing:
+      dosage = {"text": self.instruction} if self.instruction else {}
+      if self.timing:
+        # Timing.code is a CodeableConcept (e.g. OD, BID)
+        dosage["timing"] = {"code": {"text": self.timing}}
+      res["dosageInstruction"] = [dosage]
+    return res
+
+
+RESOURCE_CLASSES = {cls.resource_type: cls for cls in (Patient, Condition, Observation, MedicationRequest)}
+
+
+def from_fhir(res):
+  """Convert a FHIR resource dict to its model object, or None if the type is not modelled."""
+  cls = RESOURCE_CLASSES.get(res.get("resourceType"))
+  return cls.from_fhir(res) if cls is not None else None
+
+
+def to_fhir(obj):
+  """Convert a model object back to a FHIR resource dict (only the modelled fields)."""
+  return obj.to_fhir()
+
+
+class BundleIndex:
+  """Resources from one or more Bundles, indexed by type, (system, code) and patient.
+
+  Subject references written as an entry `fullUrl` (urn:uuid:...) resolve to the
+  Patient carrying that fullUrl, whether it comes before or after them in the
+  Bundle (FHIR does not order entries). Resources without a `subject` are held
+  until the end of their Bundle (one `extend` call): they belong to its Patient
+  if it has exactly one, to the Patient added before it if it has none (e.g.
+  dictated resources added after their Patient), and otherwise to the Patient
+  preceding them in the Bundle.
+  """
+  __slots__ = ("by_type", "by_code", "by_patient", "_aliases", "_last_patient_ref")
+
+  def __init__(self):
+    self.by_type = {}
+    self.by_code = {}
+    self.by_patient = {}
+    self._aliases = {}
+    self._last_patient_ref = ""
+
+  @classmethod
+  def from_resources(cls, resources):
+    index = cls()
+    index.extend(resources)
+    return index
+
+  def extend(self, resources):
+    """Add one Bundle's resources from `fhir_stream.iter_entries` (dicts or (fullUrl, dict) pairs) or model objects."""
+    patient_refs = []
+    # subject-less resources, with the ref of the Patient before them in this Bundle
+    unbound = []
+    for res in resources:
+      full_url = ""
+      if isinstance(res, tuple):
+        full_url, res = res
+      if isinstance(res, dict):
+        res = from_fhir(res)
+        if res is None:
+          continue
+      if isinstance(res, Patient):
+        self.add(res, full_url)
+        patient_refs.append(res.patient_ref)
+      elif not res.patient_ref:
+        unbound.append((res, patient_refs[-1] if patient_refs else ""))
+      else:
+        self.add(res, full_url)
+    if not unbound:
+      return
+    if len(patient_refs) == 1:
+      unbound = [(obj, patient_refs[0]) for obj, _ in unbound]
+    elif not patient_refs:
+      unbound = [(obj, self._last_patient_ref) for obj, _ in unbound]
+    for obj, ref in unbound:
+      obj.patient_ref = ref
+      self._index(obj)
+
+  def add(self, obj, full_url=""):
+    if isinstance(obj, Patient):
+      ref = _intern(f"Patient/{obj.id}") if obj.id else _intern(f"Patient/#{len(self.patients())}")
+      obj.patient_ref = ref
+      self._last_patient_ref = ref
+      if full_url:
+        self._aliases[full_url] = ref
+        self._rebind(full_url, ref)
+    elif not obj.patient_ref:
+      obj.patient_ref = self._last_patient_ref
+    else:
+      obj.patient_ref = self._aliases.get(obj.patient_ref, obj.patient_ref)
+    self._index(obj)
+
+  def _index(self, obj):
+    self.by_type.setdefault(obj.resource_type, []).append(obj)
+    self.by_patient.setdefault(obj.patient_ref, {}).setdefault(obj.resource_type, []).append(obj)
+    if isinstance(obj, Coded) and obj.code:
+      self.by_code.setdefault((obj.system, obj.code), []).append(obj)
+
+  def _rebind(self, alias, ref):
+    """Move resources filed under `alias` before its Patient was seen to `ref`."""
+    early = self.by_patient.pop(alias, None)
+    if not early:
+      return
+    by_type = self.by_patient.setdefault(ref, {})
+    for resource_type, items in early.items():
+      for obj in items:
+        obj.patient_ref = ref
+      by_type.setdefault(resource_type, []).extend(items)
+
+  def of_type(self, resource_type):
+    return self.by_type.get(resource_type, [])
+
+  def with_code(self, code, system=SNOMED):
+    return self.by_code.get((system, code), [])
+
+  def for_patient(self, patient_ref, resource_type=None):
+    by_type = self.by_patient.get(self._aliases.get(patient_ref, patient_ref), {})
+    if resource_type is not None:
+      return by_type.get(resource_type, [])
+    return [r for items in by_type.values() for r in items]
+
+  def patients(self):
+    return self.of_type("Patient")
+
+  def patient(self, patient_ref=None):
+    """Return the Patient for `patient_ref` (default: the first one), or an empty Patient."""
+    if patient_ref is None:
+      pts = self.patients()
+      return pts[0] if pts else Patient()
+    pts = self.for_patient(patient_ref, "Patient")
+    return pts[0] if pts else Patient()
+
+  def active_conditions(self, patient_ref):
+    return [c for c in self.for_patient(patient_ref, "Condition") if c.active]
+
+  def observations(self, patient_ref):
+    return self.for_patient(patient_ref, "Observation")
+
+  def active_medications(self, patient_ref):
+    return [m for m in self.for_patient(patient_ref, "MedicationRequest") if m.active]
+
+  def resolve_displays(self, store):
+    """Fill in empty `display` fields from a terminology store in one bulk lookup.
+
+    `store` is anything with `resolve_many(pairs) -> {(system, code): display}`,
+    e.g. terminology.TerminologyStore. Returns the number of resources updated.
+    """
+    pending = [r for (system, code), items in self.by_code.items() for r in items if not r.display]
+    if not pending:
+      return 0
+    names = store.resolve_many((r.system, r.code) for r in pending)
+    updated = 0
+    for r in pending:
+      display = names.get((r.system, r.code))
+      if display:
+        r.display = display
+        updated += 1
+    return updated
+
+  def __len__(self):
+    return sum(len(v) for v in self.by_type.values())
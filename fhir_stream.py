@@ -0,0 +1,143 @@
+"""Stream FHIR Bundle entries from a file or stdin without loading the whole Bundle.
+
+EHR exports can be transaction Bundles with thousands of entries and tens of MB
+of JSON. Instead of `json.load`-ing the whole document, the reader below walks the
+top-level Bundle object incrementally and hands out one `entry[i].resource` at a
+time, so memory stays bounded by the size of the largest single entry.
+"""
+
+import io
+import json
+import sys
+
+CHUNK_SIZE = 64 * 1024
+# largest single value (one entry) the reader will buffer
+MAX_VALUE_CHARS = 64 * 1024 * 1024
+# longest token that can be cut by a chunk boundary ("-Infinity", "\\uXXXX")
+_MAX_TOKEN = 9
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class BundleFormatError(ValueError):
+  """Raised when the input is not a JSON object shaped like a FHIR Bundle."""
+
+
+class _Reader:
+  """Buffered character reader that refills from `fp` on demand."""
+
+  def __init__(self, fp, chunk_size=CHUNK_SIZE, max_value=MAX_VALUE_CHARS):
+    self.fp = fp
+    self.chunk_size = chunk_size
+    self.max_value = max_value
+    self.buf = ""
+    self.pos = 0
+    self.eof = False
+
+  def _fill(self):
+    if self.eof:
+      return False
+    chunk = self.fp.read(self.chunk_size)
+    if not chunk:
+      self.eof = True
+      return False
+    # drop the consumed prefix so the buffer never grows past one entry
+    self.buf = self.buf[self.pos:] + chunk
+    self.pos = 0
+    return True
+
+  def peek(self):
+    """Return the next non-whitespace character without consuming it ('' at EOF)."""
+    while True:
+      while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+        self.pos += 1
+      if self.pos < len(self.buf):
+        return self.buf[self.pos]
+      if not self._fill():
+        return ""
+
+  def expect(self, chars):
+    ch = self.peek()
+    if not ch or ch not in chars:
+      raise BundleFormatError(f"expected one of {chars!r}, got {ch or 'EOF'!r}")
+    self.pos += 1
+    return ch
+
+  def value(self):
+    """Decode and return the next complete JSON value."""
+    self.peek()
+    while True:
+      try:
+        obj, end = _decoder.raw_decode(self.buf, self.pos)
+      except json.JSONDecodeError as e:
+        # only an error at the end of the buffer can be cured by reading more
+        if not e.msg.startswith("Unterminated string") and len(self.buf) - e.pos > _MAX_TOKEN:
+          raise BundleFormatError(f"invalid JSON: {e}") from None
+        if len(self.buf) - self.pos > self.max_value:
+          raise BundleFormatError(f"JSON value longer than {self.max_value} characters") from None
+        if not self._fill():
+          raise BundleFormatError("invalid or truncated JSON value") from None
+        continue
+      # a number at the very end of the buffer may continue in the next chunk
+      if end == len(self.buf) and not self.eof and self._fill():
+        continue
+      self.pos = end
+      return obj
+
+
+def iter_entries(fp, chunk_size=CHUNK_SIZE, header=None, full_urls=False, max_value=MAX_VALUE_CHARS):
+  """Yield each `resource` dict from the `entry` array of the Bundle read from `fp`.
+
+  Top-level Bundle fields other than `entry` (resourceType, type, id, ...) are
+  collected into `header` if a dict is passed. Entries without a `resource` are
+  skipped. With `full_urls=True`, (fullUrl, resource) pairs are yielded instead.
+  A single value longer than `max_value` characters raises BundleFormatError.
+  """
+  reader = _Reader(fp, chunk_size, max_value)
+  reader.expect("{")
+  if reader.peek() == "}":
+    return
+  while True:
+    key = reader.value()
+    if not isinstance(key, str):
+      raise BundleFormatError("object key must be a string")
+    reader.expect(":")
+    if key == "entry":
+      reader.expect("[")
+      if reader.peek() == "]":
+        reader.pos += 1
+      else:
+        while True:
+          entry = reader.value()
+          resource = entry.get("resource") if isinstance(entry, dict) else None
+          if resource is not None:
+            yield (entry.get("fullUrl", ""), resource) if full_urls else resource
+          if reader.expect(",]") == "]":
+            break
+    else:
+      value = reader.value()
+      if key == "resourceType" and value != "Bundle":
+        raise BundleFormatError(f"expected a Bundle, got {value!r}")
+      if header is not None:
+        header[key] = value
+    if reader.expect(",}") == "}":
+      return
+
+
+def open_bundle(path):
+  """Open `path` for streaming; '-' means stdin."""
+  if path == "-":
+    return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+  return open(path, "r", encoding="utf-8")
+
+
+def iter_bundle_resources(path, chunk_size=CHUNK_SIZE, full_urls=False):
+  """Yield the resources of the Bundle at `path` ('-' for stdin) one at a time."""
+  fp = open_bundle(path)
+  try:
+    yield from iter_entries(fp, chunk_size, full_urls=full_urls)
+  finally:
+    if path != "-":
+      fp.close()
+
@@ -0,0 +1,163 @@
+"""One frame clock per Tk root, shared by every animation in the app.
+
+Animations register a callback and an interval with `FrameClock.add`; the
+clock keeps a single `after` timer and, on each tick, runs every animation
+that is due (within half a frame) together, so the spinner and the waveform
+never wake the event loop separately.
+
+  * A callback may return a new interval in ms (the waveform backs off when
+    its frames get expensive); returning None keeps the current one.
+  * Frames are dropped, not queued: an animation that fell behind runs once
+    and is rescheduled from now, and the missed frames are counted.
+  * With nothing registered, or while the root window is minimized or
+    withdrawn, no timer is pending at all.
+  * `stats()` reports the achieved FPS of each animation; with tk_trace
+    enabled it is also written to the trace once a second.
+"""
+
+import sys
+import time
+
+import tk_trace
+
+FPS = 120
+
+
+class _Animation:
+    __slots__ = ("callback", "interval", "due", "frames", "dropped", "fps", "_last")
+
+    def __init__(self, callback, interval, due):
+        self.callback = callback
+        self.interval = interval
+        self.due = due
+        self.frames = 0
+        self.dropped = 0
+        self.fps = 0.0
+        self._last = None
+
+
+class FrameClock:
+    def __init__(self, root, fps=FPS):
+        self.root = root
+        # shortest gap between two ticks
+        self.frame = 1.0 / fps
+        self.ticks = 0
+        self._last_tick = float("-inf")
+        self._animations = {}
+        self._after_id = None
+        self._next_at = None
+        self._paused = False
+        self._reported = time.perf_counter()
+        # <Map>/<Unmap> on a toplevel also fire for its children; only the root's own count
+        root.bind("<Unmap>", self._on_unmap, add="+")
+        root.bind("<Map>", self._on_map, add="+")
+
+    # ----------------- Animations -----------------
+    def add(self, key, callback, interval_ms):
+        """Call `callback()` every `interval_ms` under `key`, starting with the next tick."""
+        now = time.perf_counter()
+        anim = self._animations.get(key)
+        if anim is None:
+            self._animations[key] = _Animation(callback, interval_ms / 1000.0, now)
+        else:
+            anim.callback, anim.interval = callback, interval_ms / 1000.0
+        self._schedule(now)
+
+    def remove(self, key):
+        """Stop animating `key` (no-op if it is not running)."""
+        self._animations.pop(key, None)
+        if not self._animations:
+            self._cancel()
+
+    def __contains__(self, key):
+        return key in self._animations
+
+    # ----------------- Ticking -----------------
+    def _cancel(self):
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+        self._after_id = self._next_at = None
+
+    def _schedule(self, now):
+        if self._paused or not self._animations:
+            self._cancel()
+            return
+        at = max(min(a.due for a in self._animations.values()), self._last_tick + self.frame, now)
+        if self._next_at is not None and self._next_at <= at:
+            return  # an earlier tick is already pending
+        self._cancel()
+        self._next_at = at
+        self._after_id = self.root.after(max(0, int(round((at - now) * 1000.0))), self._tick)
+
+    def _tick(self):
+        self._after_id = self._next_at = None
+        now = self._last_tick = time.perf_counter()
+        self.ticks += 1
+        # everything due within half a frame runs in this tick
+        horizon = now + self.frame / 2.0
+        try:
+            for key, anim in list(self._animations.items()):
+                if anim.due > horizon or self._animations.get(key) is not anim:
+                    continue
+                try:
+                    interval_ms = anim.callback()
+                except Exception:
+                    self._animations.pop(key, None)
+                    self.root.report_callback_exception(*sys.exc_info())
+                    continue
+                if interval_ms is not None:
+                    anim.interval = interval_ms / 1000.0
+                self._count(anim, now)
+        finally:
+            now = time.perf_counter()
+            self._report(now)
+            self._schedule(now)
+
+    def _count(self, anim, now):
+        anim.frames += 1
+        if anim._last is not None:
+            rate = 1.0 / max(now - anim._last, 1e-6)
+            anim.fps = rate if anim.fps == 0.0 else anim.fps + (rate - anim.fps) * 0.1
+        anim._last = now
+        anim.due += anim.interval
+        if anim.due < now:
+            # fell behind: skip the missed frames rather than running them back to back
+            anim.dropped += int((now - anim.due) / anim.interval) + 1
+            anim.due = now + anim.interval
+
+    def _report(self, now):
+        if now - self._reported < 1.0:
+            return
+        self._reported = now
+        if self._animations:
+            tk_trace.counter("fps", {key: round(a.fps, 1) for key, a in self._animations.items()})
+
+    # ----------------- Window state -----------------
+    def _on_unmap(self, event):
+        if event.widget is self.root:
+            self._paused = True
+            self._cancel()
+
+    def _on_map(self, event):
+        if event.widget is self.root and self._paused:
+            self._paused = False
+            now = time.perf_counter()
+            for anim in self._animations.values():
+                anim.due, anim._last = now, None
+            self._schedule(now)
+
+    # ----------------- Reporting -----------------
+    def stats(self):
+        """{key: {"fps", "frames", "dropped", "interval_ms"}} for the running animations."""
+        return {
+            key: {
+                "fps": round(a.fps, 1),
+                "frames": a.frames,
+                "dropped": a.dropped,
+                "interval_ms": round(a.interval * 1000.0, 1),
+            }
+            for key, a in self._animations.items()
+        }
@@ -1,153 +1,176 @@
 import tkinter as tk
 from tkinter import messagebox
 from tkinter import filedialog
-import ctypes
-from datetime import datetime
-
-# -------- JSON DATA YOU PROVIDED --------
-data = {
-  "resourceType": "Bundle",
-  "type": "transaction",
-  "entry": [
-    {
-      "resource": {
-        "resourceType": "Patient",
-        "id": "",
-        "name": [{"text": "Mrs. Gupta"}],
-        "gender": "female",
-        "age": 65
-      }
-    },
-    {
-      "resource": {
-        "resourceType": "Condition",
-        "code": {
-          "coding": [
-            {
-              "system": "http://snomed.info/sct",
-              "code": "404640003",
-              "display": "Dizziness"
-            }
-          ]
-        },
-        "clinicalStatus": "active"
-      }
-    },
-    {
-      "resource": {
-        "resourceType": "Observation",
-        "code": {
-          "coding": [{
-            "system": "http://snomed.info/sct",
-            "code": "75367002",
-            "display": "Blood Pressure"
-          }]
-        },
-        "valueQuantity": {
-          "value": 160,
-          "unit": "mmHg/systolic"
-        }
-      }
-    },
-    {
-      "resource": {
-        "resourceType": "MedicationRequest",
-        "status": "active",
-        "intent": "order",
-        "medicationCodeableConcept": {
-          "coding": [
-            {
-              "system": "http://snomed.info/sct",
-              "code": "386864001",
-              "display": "Amlodipine 5mg Tablet"
-            }
-          ]
-        },
-        "dosageInstruction": [{
-          "text": "1 tablet daily after food",
-          "timing": {"code": "OD"}
-        }]
-      }
-    }
-  ]
-}
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+import prescription
+from batch import find_bundles
+from consent import AuditLog, LanguagePacks
+from consent_dialog import ConsentDialog
+import draft_journal
+from draft_autosave import TextAutosave
+from export_worker import ExportJob, ExportWorker
+from fhir_model import BundleIndex
+from frame_clock import FrameClock
+from patient_queue import SessionQueue
+from prescription_store import PrescriptionStore
+from snomed_match import TermMatcher, extract_resources
+from terminology import TerminologyStore
+import tk_trace
+from tk_trace import traced
+
+# -------- COMMAND LINE --------
+# Bundles to see, in order (files, directories of .json files, "-" for stdin), or the bundled sample.
+# --audio picks the waveform input: "device[:N]", "wav:PATH" or "synthetic".
+def parse_args(argv=None):
+  here = os.path.dirname(os.path.abspath(__file__))
+  arg_parser = argparse.ArgumentParser(description="Mic Prescription App")
+  arg_parser.add_argument("bundles", nargs="*", default=[os.path.join(here, "sample_bundle.json")], help="patient Bundles, seen in this order")
+  arg_parser.add_argument("--audio", default="device", help='waveform input: "device[:N]", "wav:PATH" or "synthetic"')
+  arg_parser.add_argument("--transcript", default=None, help="plain-text dictation transcript to extract resources from")
+  arg_parser.add_argument("--terminology", default=os.path.join(here, "terminology.db"), help="SQLite terminology store for code-only codings")
+  arg_parser.add_argument("--store", default=os.path.join(here, "prescriptions.db"), help="SQLite history of saved prescriptions")
+  arg_parser.add_argument("--drafts", default=os.path.join(here, "drafts"), help="directory of per-patient journals of unsaved edits")
+  arg_parser.add_argument("--audit", default=os.path.join(here, "consent_audit.jsonl"), help="append-only log of consent decisions")
+  arg_parser.add_argument("--terms", default=os.path.join(here, "snomed_terms.tsv"), help="SNOMED term dictionary (TSV)")
+  return arg_parser.parse_args(argv)
 # ----------------------------------------
 
-
-# Extract relevant fields ----------------
-patient = data["entry"][0]["resource"]
-condition = data["entry"][1]["resource"]
-bp = data["entry"][2]["resource"]
-med = data["entry"][3]["resource"]
-
-patient_name = patient["name"][0]["text"]
-gender = patient["gender"].capitalize()
-age = patient["age"]
-# default patient id from the provided data; will be overriden by user input
-patient_id_default = patient.get("id", "")
-
-diagnosis = condition["code"]["coding"][0]["display"]
-bp_value = bp["valueQuantity"]["value"]
-bp_unit = bp["valueQuantity"]["unit"]
-
-med_name = med["medicationCodeableConcept"]["coding"][0]["display"]
-med_instruction = med["dosageInstruction"][0]["text"]
-# ----------------------------------------------------------
+# Session state, filled in by load_session() and build_gui() when the app starts;
+# importing this module does no work.
+args = None
+bundle = terminology = store = patient = None
+patients = current_session = None
+language_packs = consent_audit = None
+patient_name = gender = age = patient_id_default = None
+root = frame_clock = exporter = patient_id_var = None
+id_center_frame = id_entry = confirm_btn = queue_label = mic_frame = mic_button = status_label = None
+waveform = audio_source = mic_levels = None
+
+
+# -------- FHIR BUNDLE INPUT --------
+def load_session(options):
+  """Open the stores named by the command line and load the first patient of the queue."""
+  global args, terminology, store, patients, language_packs, consent_audit
+  args = options
+  # Codings that carry only a code get their display text from the local terminology store
+  terminology = TerminologyStore(args.terminology) if os.path.exists(args.terminology) else None
+  # Every saved prescription is appended here as a new version, keyed by patient ID
+  store = PrescriptionStore(args.store)
+  # Consent texts are read per language on first use; decisions are logged in the background
+  language_packs = LanguagePacks()
+  consent_audit = AuditLog(args.audit)
+
+  # Patients are loaded (streamed, terminology resolved, draft built) ahead of time
+  paths = []
+  for path in args.bundles:
+    paths.extend(find_bundles(path) if os.path.isdir(path) else [path])
+  patients = SessionQueue(paths, terminology)
+  if not advance_patient():
+    raise SystemExit("None of the given FHIR Bundles could be loaded.")
+
+
+def advance_patient():
+  """Make the next patient that loads current; Bundles that fail are reported and skipped.
+
+  Returns False (and leaves the current patient in place) when none is left.
+  """
+  while patients.has_next():
+    path = patients.next_path()
+    try:
+      session = patients.advance()
+    except Exception as e:
+      message = f"Could not load the patient Bundle\n{path}:\n{e}\n\nIt is skipped."
+      if root is None:
+        print(message.replace("\n\n", "\n"), file=sys.stderr)
+      else:
+        messagebox.showerror("Patient not loaded", message)
+      patients.skip()
+      continue
+    activate_patient(session)
+    return True
+  return False
+
+
+def activate_patient(session):
+  """Make `session` the current patient."""
+  global current_session, bundle, patient, patient_name, gender, age, patient_id_default
+  current_session = session
+  bundle = session.bundle
+  patient = session.patient
+  patient_name = patient.name
+  gender = patient.gender.capitalize()
+  age = patient.age
+  # default patient id from the provided data; will be overriden by user input
+  patient_id_default = patient.id
+# ----------------------------------------
 
 
 def build_prescription_text():
   """Return the prescription text (do not write to disk)."""
   # use the user-entered Patient ID if available (the GUI sets `patient_id_var`)
   try:
-    pid = patient_id_var.get().strip() if "patient_id_var" in globals() else patient_id_default
+    pid = patient_id_var.get().strip() if patient_id_var is not None else patient_id_default
   except Exception:
     pid = patient_id_default
+  # built now, not when the patient was prefetched, so "Generated on" is the time of the visit
+  return prescription.build_prescription_text(bundle, patient, pid)
+
+
+def export_job(pid, name, text, targets):
+  """ExportJob writing `text` to `targets` ({format: path}) that first appends it to the store.
+
+  The store gets a new version only if the text or its medications changed; a JSON target gets the
+  FHIR document for the current patient.
+  """
+  # the coded medications are saved with the text, for the FHIR bulk export
+  medications = prescription.coded_medications(bundle, patient)
 
-  text = f"""
-Patient ID    : {pid}
-Patient Name  : {patient_name}
-Age           : {age}
-Gender        : {gender}
-
----------------------------------------------
-Diagnosis:
-- {diagnosis}
-- Blood Pressure: {bp_value} {bp_unit}
-
----------------------------------------------
-Medication:
-- {med_name}
-  Instructions: {med_instruction}
-
----------------------------------------------
-Advice:
-- Monitor blood pressure regularly
-- Stay hydrated
-- Avoid sudden standing/sitting
-- Follow-up if symptoms persist
-
----------------------------------------------
-Dr. Aditya Garg
-Registration No: 123456
-Generated on: {datetime.now().strftime("%d-%m-%Y %H:%M:%S")}
----------------------------------------------
-    """
-  return text.strip()
+  def record():
+    latest = store.latest(pid)
+    if latest is None or latest.text != text or latest.medications != medications:
+      store.add(pid, prescription.DOCTOR_REG_NO, text, patient_name=name, medications=medications)
+
+  fhir = prescription.fhir_document(bundle, patient, text, pid) if "json" in targets else None
+  return ExportJob(text, targets, fhir=fhir, record=record)
+
+
+def show_pdf_error(e):
+  if isinstance(e, ImportError):
+    messagebox.showerror(
+      "ReportLab not installed",
+      "PDF export requires the 'reportlab' package.\n\n"
+      "Install it and try again:\n"
+      "pip install reportlab",
+    )
+  else:
+    messagebox.showerror("Error", f"Failed to export prescription:\n{e}")
 
 
 def open_review_window():
   """Open a window to review and edit the generated prescription, then save TXT or export PDF."""
-  # Determine initial content source
   filename_base = patient_name
-  txt_path = f"{filename_base}.txt"
-
-  # Read existing text (fallback to freshly generated content if not found)
   try:
-    with open(txt_path, "r", encoding="utf-8") as f:
-      content = f.read()
-  except FileNotFoundError:
-    # If file not found, generate content in-memory (do NOT write yet)
-    content = build_prescription_text()
+    pid = patient_id_var.get().strip()
+  except Exception:
+    pid = patient_id_default
+
+  # Always start from a fresh draft of this visit, generated in memory (do NOT save yet);
+  # the patient's last saved version stays one click away ("Load previous")
+  content = build_prescription_text()
+  saved_text = content.strip()
+  latest = store.latest(pid)
+
+  # Edits that were never saved (window closed, or the app crashed) are replayed from the patient's journal
+  recovered = draft_journal.recover(args.drafts, pid)
+  if recovered is not None and recovered.strip() != saved_text:
+    if messagebox.askyesno("Recover unsaved edits", "This prescription has unsaved edits from an earlier session.\n\nRestore them?", parent=root):
+      content = recovered
 
   # Create review window
   review = tk.Toplevel(root)
@@ -166,11 +189,43 @@ def open_review_window():
   text_widget = tk.Text(review, wrap="word", font=("Consolas", 11))
   text_widget.pack(fill="both", expand=True, padx=12, pady=8)
   text_widget.insert("1.0", content)
+  # From here on every edit is journaled in the background (see draft_autosave.py)
+  autosave = TextAutosave(text_widget, draft_journal.DraftJournal(args.drafts, pid, content))
 
   # Button bar frame
   btn_frame = tk.Frame(review)
   btn_frame.pack(fill="x", padx=12, pady=8)
 
+  # Load reportlab in the background so the first PDF export does not pay for the import
+  exporter.warm_up()
+
+  def set_busy(message):
+    """Show export progress and block re-entrant exports while one is running."""
+    if not message:
+      # an export finished: its throughput and queue wait go to the trace (TK_TRACE)
+      m = exporter.metrics()
+      tk_trace.counter("exports", {k: round(m[k], 2) for k in ("queue_depth", "jobs_done", "jobs_failed", "avg_wait_ms", "mb_per_sec")})
+    state = "disabled" if message else "normal"
+    try:
+      save_btn.config(state=state)
+      pdf_btn.config(state=state)
+      all_btn.config(state=state)
+      export_status.config(text=message)
+    except tk.TclError:
+      pass  # review window already closed
+
+  def submit_export(job, **callbacks):
+    """Queue `job` without ever blocking the UI; with the export queue full, say so instead."""
+    try:
+      exporter.submit(job, block=False, **callbacks)
+    except queue.Full:
+      set_busy("")
+      messagebox.showwarning(
+        "Exports busy",
+        f"{exporter.queue_depth()} exports are still being written.\nPlease try again in a moment.",
+        parent=review,
+      )
+
   def save_txt():
     edited = text_widget.get("1.0", "end").strip()
     # Let user choose location if desired
@@ -179,7 +234,7 @@ def open_review_window():
       pid = patient_id_var.get().strip()
     except Exception:
       pid = patient_id_default
-    default_name = f"{pid}_{filename_base}.txt" if pid else f"{filename_base}.txt"
+    default_name = prescription.default_filename(pid, filename_base, "txt")
     path = filedialog.asksaveasfilename(
       parent=review,
       title="Save Prescription as TXT",
@@ -189,13 +244,20 @@ def open_review_window():
     )
     if not path:
       return
-    try:
-      with open(path, "w", encoding="utf-8") as f:
-        f.write(edited)
-      messagebox.showinfo("Saved", f"TXT saved to:\n{path}")
-    except Exception as e:
+
+    def on_done(paths):
+      nonlocal saved_text
+      saved_text = edited
+      set_busy("")
+      messagebox.showinfo("Saved", f"TXT saved to:\n{paths['txt']}")
+
+    def on_error(e):
+      set_busy("")
       messagebox.showerror("Error", f"Failed to save TXT:\n{e}")
 
+    set_busy("Saving TXT...")
+    submit_export(export_job(pid, filename_base, edited, {"txt": path}), on_done=on_done, on_error=on_error)
+
   def generate_pdf():
     edited = text_widget.get("1.0", "end").strip()
 
@@ -204,7 +266,7 @@ def open_review_window():
       pid = patient_id_var.get().strip()
     except Exception:
       pid = patient_id_default
-    default_pdf = f"{pid}_{filename_base}.pdf" if pid else f"{filename_base}.pdf"
+    default_pdf = prescription.default_filename(pid, filename_base, "pdf")
     pdf_path = filedialog.asksaveasfilename(
       parent=review,
       title="Save Prescription as PDF",
@@ -215,87 +277,93 @@ def open_review_window():
     if not pdf_path:
       return
 
-    # Attempt to use reportlab for PDF generation
-    try:
-      from reportlab.lib.pagesizes import letter
-      from reportlab.pdfgen import canvas
-      from reportlab.lib.units import inch
-
-      c = canvas.Canvas(pdf_path, pagesize=letter)
-      width, height = letter
-
-      # Margin and basic layout
-      x_margin = 0.75 * inch
-      y_margin = 0.75 * inch
-      max_width_chars = 95  # crude wrapping for monospaced feel
-
-      def wrap_lines(text, width_chars):
-        lines = []
-        for line in text.splitlines():
-          if len(line) <= width_chars:
-            lines.append(line)
-          else:
-            # Simple hard wrap
-            start = 0
-            while start < len(line):
-              lines.append(line[start : start + width_chars])
-              start += width_chars
-        return lines
-
-      lines = wrap_lines(edited, max_width_chars)
-
-      y = height - y_margin
-      line_height = 14
-
-      for line in lines:
-        if y < y_margin + line_height:
-          c.showPage()
-          y = height - y_margin
-        c.drawString(x_margin, y, line)
-        y -= line_height
-
-      c.save()
-      messagebox.showinfo("PDF Generated", f"PDF saved to:\n{pdf_path}")
-    except ImportError:
-      messagebox.showerror(
-        "ReportLab not installed",
-        "PDF export requires the 'reportlab' package.\n\n"
-        "Install it and try again:\n"
-        "pip install reportlab",
-      )
-    except Exception as e:
-      messagebox.showerror("Error", f"Failed to generate PDF:\n{e}")
+    def on_progress(done, total):
+      set_busy(f"Generating PDF... page {done}/{total}")
 
-  # Buttons
-  save_btn = tk.Button(btn_frame, text="Save TXT", command=save_txt, font=("Segoe UI", 11))
-  pdf_btn = tk.Button(btn_frame, text="Generate PDF", command=generate_pdf, font=("Segoe UI", 11))
-  close_btn = tk.Button(btn_frame, text="Close", command=review.destroy, font=("Segoe UI", 11))
+    def on_done(paths):
+      nonlocal saved_text
+      saved_text = edited
+      set_busy("")
+      messagebox.showinfo("PDF Generated", f"PDF saved to:\n{paths['pdf']}")
 
-  save_btn.pack(side="left", padx=4)
-  pdf_btn.pack(side="left", padx=4)
-  close_btn.pack(side="right", padx=4)
+    def on_error(e):
+      set_busy("")
+      show_pdf_error(e)
+
+    # Render with reportlab on the export worker; the review window stays responsive
+    set_busy("Generating PDF...")
+    submit_export(export_job(pid, filename_base, edited, {"pdf": pdf_path}), on_done=on_done, on_error=on_error, on_progress=on_progress)
 
+  def export_all():
+    edited = text_widget.get("1.0", "end").strip()
+    try:
+      pid = patient_id_var.get().strip()
+    except Exception:
+      pid = patient_id_default
+    directory = filedialog.askdirectory(parent=review, title="Export TXT, PDF and FHIR JSON to folder")
+    if not directory:
+      return
+    targets = {ext: os.path.join(directory, prescription.default_filename(pid, filename_base, ext)) for ext in ("txt", "pdf", "json")}
+
+    def on_progress(done, total):
+      set_busy(f"Exporting... PDF page {done}/{total}")
+
+    def on_done(paths):
+      nonlocal saved_text
+      saved_text = edited
+      set_busy("")
+      messagebox.showinfo("Exported", "Prescription saved to:\n" + "\n".join(paths.values()))
+
+    def on_error(e):
+      set_busy("")
+      show_pdf_error(e)
+
+    set_busy(f"Exporting... ({exporter.queue_depth()} queued)")
+    submit_export(export_job(pid, filename_base, edited, targets), on_done=on_done, on_error=on_error, on_progress=on_progress)
+
+  def load_previous():
+    """Replace the draft with the patient's last saved version (the edit is journaled like any other)."""
+    current = text_widget.get("1.0", "end").strip()
+    if current != latest.text.strip() and not messagebox.askyesno(
+      "Load previous version",
+      f"Replace the current draft with version {latest.version} saved on "
+      f"{time.strftime('%d-%m-%Y %H:%M', time.localtime(latest.created_at))}?",
+      parent=review,
+    ):
+      return
+    text_widget.replace("1.0", "end-1c", latest.text)
 
+  def close_review():
+    # the journal is only kept while it holds something that was not saved
+    autosave.close(discard=text_widget.get("1.0", "end").strip() == saved_text)
+    review.destroy()
 
-# -------- Windows GUI App --------
-ctypes.windll.shcore.SetProcessDpiAwareness(1)
+  review.protocol("WM_DELETE_WINDOW", close_review)
 
-root = tk.Tk()
-root.title("Mic Prescription App")
-root.geometry("1920x1080")
-root.resizable(False, False)
+  # Buttons
+  save_btn = tk.Button(btn_frame, text="Save TXT", command=traced(save_txt), font=("Segoe UI", 11))
+  pdf_btn = tk.Button(btn_frame, text="Generate PDF", command=traced(generate_pdf), font=("Segoe UI", 11))
+  all_btn = tk.Button(btn_frame, text="Export All", command=traced(export_all), font=("Segoe UI", 11))
+  close_btn = tk.Button(btn_frame, text="Close", command=close_review, font=("Segoe UI", 11))
+  export_status = tk.Label(btn_frame, text="", font=("Segoe UI", 11), fg="#0078D4")
 
-# Patient ID variable (prefilled from data); center prompt shown initially
-patient_id_var = tk.StringVar(value=patient_id_default)
+  def close_and_next():
+    close_review()
+    next_patient()
 
-# Centered Patient ID prompt (shown before mic)
-id_center_frame = tk.Frame(root)
-id_center_frame.place(relx=0.5, rely=0.38, anchor="center")
+  save_btn.pack(side="left", padx=4)
+  pdf_btn.pack(side="left", padx=4)
+  all_btn.pack(side="left", padx=4)
+  if latest is not None:
+    tk.Button(
+      btn_frame, text=f"Load previous (v{latest.version})", command=traced(load_previous), font=("Segoe UI", 11),
+    ).pack(side="left", padx=4)
+  export_status.pack(side="left", padx=12)
+  close_btn.pack(side="right", padx=4)
+  if patients.has_next():
+    next_btn = tk.Button(btn_frame, text="Next Patient", command=traced(close_and_next), font=("Segoe UI", 11), bg="#0078D4", fg="white")
+    next_btn.pack(side="right", padx=4)
 
-tk.Label(id_center_frame, text="Enter Patient ID", font=("Segoe UI", 14, "bold")).pack(pady=(0,6))
-id_entry = tk.Entry(id_center_frame, textvariable=patient_id_var, font=("Segoe UI", 14), width=28)
-id_entry.pack(pady=(0,8))
-id_entry.focus_set()
 
 def confirm_patient_id(event=None):
   pid = patient_id_var.get().strip()
@@ -312,19 +380,36 @@ def confirm_patient_id(event=None):
   except Exception:
     pass
 
-confirm_btn = tk.Button(id_center_frame, text="Confirm", command=confirm_patient_id, font=("Segoe UI", 12), bg="#0078D4", fg="white")
-confirm_btn.pack()
-id_entry.bind("<Return>", confirm_patient_id)
+
+def queue_text():
+  return f"Patient {patients.position + 1} of {len(patients)}: {patient_name}" if len(patients) > 1 else ""
+
+
+def next_patient():
+  """Switch to the next patient in the queue (already loaded in the background) and ask for their ID."""
+  if not patients.has_next():
+    return
+  if not advance_patient():
+    status_label.config(text="No more patients could be loaded.", fg="#DC3545")
+    return
+  patient_id_var.set(patient_id_default)
+  queue_label.config(text=queue_text())
+  status_label.config(text="Click on the mic icon to start recording.", fg="black")
+  mic_frame.place_forget()
+  id_center_frame.place(relx=0.5, rely=0.38, anchor="center")
+  id_entry.focus_set()
+  id_entry.select_range(0, "end")
+
 
 listening = False
+term_matcher = None
+term_matcher_lock = threading.Lock()
 
 # Animation state
-mic_animating = False
-mic_anim_step = 0
 wave_canvas = None
 
 def toggle():
-  global listening, mic_animating
+  global listening
   if not listening:
     # require a patient ID before starting
     pid = patient_id_var.get().strip()
@@ -335,232 +420,207 @@ def toggle():
   else:
     listening = False
     status_label.config(text="Understood!", fg="#28A745")
-    mic_animating = False
-    mic_button.config(bg="white")
+    stop_audio()
+    stop_mic_animation()
     root.after(2000, after_understood)  # 2000 ms = 2 seconds
 # --- Confirmation Window ---
+# Built once (in the background right after startup, or on first use) and shown/hidden after that
+consent_dialog = None
+
+
+def get_consent_dialog():
+  global consent_dialog
+  if consent_dialog is None:
+    consent_dialog = ConsentDialog(root, language_packs, on_accept=consent_accepted, audit=consent_audit)
+  return consent_dialog
+
+
 def show_confirmation_window():
-  confirm = tk.Toplevel(root)
-  confirm.title("AI Consent & Rights")
-  confirm.geometry("1920x1080")
-  confirm.grab_set()
-
-
-  # English and Hindi consent text
-  consent_text_en = (
-    "I acknowledge that:\n\n"
-    "- My voice, text, or medical information may be temporarily processed by AI systems only for the purpose of clinical evaluation.\n"
-    "- My personal details will not be shared, sold, or used for commercial purposes.\n"
-    "- Only authorized medical staff will have access to the data.\n"
-    "- Reasonable safeguards are in place to protect my privacy and confidentiality.\n"
-    "- Data will be stored and handled according to hospital/clinic policy and applicable privacy laws.\n\n"
-    "I have the right to:\n\n"
-    "- Ask questions about how AI is being used.\n"
-    "- Decline the use of AI for recording/analysis.\n"
-    "- Request deletion of my AI-related data (as per hospital policy).\n"
-    "- Opt out at any time without affecting my care.\n"
-  )
+  get_consent_dialog().show(patient_id_var.get().strip())
 
-  consent_text_hi = (
-    "मैं स्वीकार करता/करती हूँ कि:\n\n"
-    "- मेरी आवाज़, पाठ, या चिकित्सा जानकारी केवल नैदानिक मूल्यांकन के उद्देश्य से अस्थायी रूप से AI सिस्टम द्वारा संसाधित की जा सकती है।\n"
-    "- मेरी व्यक्तिगत जानकारी साझा, बेची या व्यावसायिक प्रयोजनों के लिए उपयोग नहीं की जाएगी।\n"
-    "- केवल अधिकृत चिकित्सा कर्मचारी ही डेटा तक पहुँच सकते हैं।\n"
-    "- मेरी गोपनीयता और सुरक्षा के लिए उचित उपाय किए गए हैं।\n"
-    "- डेटा अस्पताल/क्लिनिक नीति और लागू गोपनीयता कानूनों के अनुसार संग्रहीत और संभाला जाएगा।\n\n"
-    "मुझे अधिकार है:\n\n"
-    "- AI के उपयोग के बारे में प्रश्न पूछने का।\n"
-    "- रिकॉर्डिंग/विश्लेषण के लिए AI के उपयोग से इनकार करने का।\n"
-    "- अपनी AI-संबंधित डेटा को हटाने का अनुरोध करने का (अस्पताल नीति के अनुसार)।\n"
-    "- किसी भी समय बाहर निकलने का, बिना देखभाल पर प्रभाव डाले।\n"
-  )
 
-  # Language state
-  lang = {"current": "en"}
-
-  # Button text for both languages
-  btn_texts = {
-    "en": {"accept": "Accept & Continue", "decline": "Decline"},
-    "hi": {"accept": "स्वीकारें और आगे बढ़ें", "decline": "अस्वीकार करें"}
-  }
-
-  # title label (will be updated to selected language)
-  title_label = tk.Label(confirm, text="Consent & Rights", font=("Segoe UI", 16, "bold"), pady=10)
-  title_label.pack()
-
-  def update_text():
-    text_widget.config(state="normal")
-    text_widget.delete("1.0", "end")
-    if lang["current"] == "en":
-      text_widget.insert("1.0", consent_text_en)
-    else:
-      text_widget.insert("1.0", consent_text_hi)
-    text_widget.config(state="disabled")
-    # Update button text
-    accept_btn.config(text=btn_texts[lang["current"]]["accept"])
-    decline_btn.config(text=btn_texts[lang["current"]]["decline"])
-    # Update header/title according to selected language
-    if lang["current"] == "en":
-      title_label.config(text="Consent & Rights")
-    else:
-      title_label.config(text="सहमति और अधिकार")
-
-  text_widget = tk.Text(confirm, wrap="word", font=("Segoe UI", 12), height=20, width=70)
-  # Put the large editable text area above, and controls in a fixed bottom bar
-  text_widget.pack(fill="both", expand=True, padx=16, pady=8)
-
-  # Bottom bar frame to ensure controls are always visible
-  bottom_bar = tk.Frame(confirm)
-  bottom_bar.pack(side="bottom", fill="x", padx=16, pady=8)
-
-  # Language dropdown (left side of bottom bar)
-  lang_options = ["English", "हिन्दी"]
-  lang_map = {"English": "en", "हिन्दी": "hi"}
-  lang_var = tk.StringVar(value=lang_options[0])
-
-  def on_lang_select(event=None):
-    lang["current"] = lang_map[lang_var.get()]
-    update_text()
-
-  lang_dropdown = tk.OptionMenu(bottom_bar, lang_var, *lang_options, command=lambda _: on_lang_select())
-  lang_dropdown.config(font=("Segoe UI", 11), bg="#F7CA18", fg="black", width=14)
-  lang_dropdown.pack(side="left", padx=(0, 12))
-
-  # Button frame (right side of bottom bar)
-  btn_frame = tk.Frame(bottom_bar)
-  btn_frame.pack(side="right")
-
-  def accept():
-    global listening, mic_animating
-    listening = True
-    status_label.config(text="Listening...", fg="#0078D4")
-    mic_animating = True
-    animate_mic()
-    confirm.destroy()
-
-  def decline():
-    confirm.destroy()
-
-  accept_btn = tk.Button(btn_frame, text=btn_texts[lang["current"]]["accept"], command=accept, font=("Segoe UI", 12), bg="#28A745", fg="white", width=18)
-  decline_btn = tk.Button(btn_frame, text=btn_texts[lang["current"]]["decline"], command=decline, font=("Segoe UI", 12), bg="#DC3545", fg="white", width=10)
-  accept_btn.pack(side="left", padx=8)
-  decline_btn.pack(side="right", padx=8)
-
-  # Now update text and button labels after packing
-  update_text()
+def consent_accepted():
+  global listening
+  listening = True
+  status_label.config(text="Listening...", fg="#0078D4")
+  start_audio()
+  if args.transcript:
+    threading.Thread(target=load_term_matcher, daemon=True).start()
+  frame_clock.add("waveform", animate_mic, waveform.target_delay_ms)
+
+
+def load_term_matcher():
+  """Compile the SNOMED term dictionary once (called off the Tk thread when recording starts)."""
+  global term_matcher
+  with term_matcher_lock:
+    if term_matcher is None and args.transcript:
+      term_matcher = TermMatcher.from_tsv(args.terms)
+  return term_matcher
+
+
+def apply_transcript():
+  """Replace the Bundle's clinical resources with the ones dictated in the transcript."""
+  global bundle
+  with open(args.transcript, "r", encoding="utf-8") as f:
+    transcript = f.read()
+  dictated = BundleIndex()
+  dictated.add(patient)
+  dictated.extend(extract_resources(transcript, load_term_matcher()))
+  if terminology is not None:
+    dictated.resolve_displays(terminology)
+  bundle = dictated
+
 
 def after_understood():
+  if args.transcript:
+    try:
+      apply_transcript()
+    except Exception as e:
+      messagebox.showerror("Error", f"Failed to read the transcript:\n{e}")
   status_label.config(text="Please review the generated prescription.", fg="#28A745")
   open_review_window()
 
 # --- Mic Waveform Animation ---
-import math
-def _draw_rounded_bar(canvas, x1, y1, x2, y2, fill):
-  """Draw a vertical pill-shaped (rounded) bar on `canvas` between (x1,y1)-(x2,y2).
+def animate_mic():
+  """Draw one frame of the animated waveform on `wave_canvas` (ticked by `frame_clock`).
 
-  This draws a center rectangle plus top/bottom ovals to create curved edges.
+  The pill-shaped bars are created once by `WaveformView` and only moved each
+  frame; the returned delay to the next frame adapts to the measured frame time.
   """
-  w = x2 - x1
-  h = y2 - y1
-  # radius limited by half width and half height
-  r = min(w / 2.0, h / 2.0)
+  return waveform.frame(mic_levels.next())
 
-  # central rectangle (may be zero-height if bar is very short)
-  cy1 = y1 + r
-  cy2 = y2 - r
-  if cy2 > cy1:
-    canvas.create_rectangle(x1, cy1, x2, cy2, fill=fill, outline=fill)
 
-  # top cap
-  canvas.create_oval(x1, y1, x1 + 2 * r, y1 + 2 * r, fill=fill, outline=fill)
-  # bottom cap
-  canvas.create_oval(x2 - 2 * r, y2 - 2 * r, x2, y2, fill=fill, outline=fill)
+def stop_mic_animation():
+  frame_clock.remove("waveform")
+  mic_button.config(bg="white")
+  waveform.clear()
 
 
-def animate_mic():
-  """Draw a simple animated waveform on `wave_canvas` while `mic_animating` is True.
+def start_audio():
+  """Start capturing audio off the Tk thread; fall back to the synthetic waveform."""
+  global audio_source, mic_levels
+  from audio_input import LevelMeter, open_source
+  from waveform import SyntheticLevels
 
-  Uses pill-shaped bars to produce curved edges instead of square rectangles.
-  """
-  global mic_anim_step, mic_prev_heights
-  # animation smoothing parameters
-  # alpha: smoothing factor for exponential smoothing (0..1). Lower => smoother/slower
-  SMOOTH_ALPHA = 0.28
-  # target frame delay to approximate 120 FPS; integer ms resolution means this is approximate
-  FPS_DELAY_MS = int(round(1000.0 / 120.0))  # ~120 FPS (≈8 ms)
-  # ensure previous heights buffer exists and matches bar count
   try:
-    if mic_prev_heights is None or len(mic_prev_heights) != 22:
-      mic_prev_heights = [0.0] * 22
-  except NameError:
-    mic_prev_heights = [0.0] * 22
-  if not mic_animating:
-    mic_button.config(bg="white")
-    try:
-      wave_canvas.delete("all")
-    except Exception:
-      pass
+    audio_source = open_source(args.audio)
+    if audio_source is not None:
+      # a device that cannot be opened comes back as a SyntheticSource carrying the error
+      audio_source = audio_source.start()
+      mic_levels = LevelMeter(audio_source, waveform.bars)
+      if audio_source.error is not None:
+        status_label.config(text=f"Microphone unavailable ({audio_source.error}); showing a placeholder.", fg="#DC3545")
+      return
+  except Exception:
+    audio_source = None
+  mic_levels = SyntheticLevels(waveform.bars)
+
+
+def stop_audio():
+  global audio_source
+  if audio_source is not None:
+    audio_source.stop()
+    audio_source = None
+
+
+# -------- Windows GUI App --------
+def _enable_dpi_awareness():
+  """Make the UI sharp on Windows (a no-op on other platforms)."""
+  if sys.platform != "win32":
     return
+  try:
+    import ctypes
+
+    ctypes.windll.shcore.SetProcessDpiAwareness(1)
+  except (AttributeError, OSError):
+    pass
+
 
-  # Canvas dimensions
+def build_gui():
+  global root, frame_clock, exporter, patient_id_var, id_center_frame, id_entry, confirm_btn, queue_label
+  global mic_frame, mic_button, wave_canvas, waveform, audio_source, mic_levels, status_label
+  # numpy comes in with the waveform, not when this module is imported
+  from waveform import SyntheticLevels, WaveformView
+
+  root = tk.Tk()
+  # one timer drives every animation; it stops when nothing animates or the window is minimized
+  frame_clock = FrameClock(root)
+  root.title("Mic Prescription App")
+  root.geometry("1920x1080")
+  root.resizable(False, False)
+
+  # Background worker for TXT/PDF exports (results come back through root.after)
+  exporter = ExportWorker(root)
+
+  # Patient ID variable (prefilled from data); center prompt shown initially
+  patient_id_var = tk.StringVar(value=patient_id_default)
+
+  # Centered Patient ID prompt (shown before mic)
+  id_center_frame = tk.Frame(root)
+  id_center_frame.place(relx=0.5, rely=0.38, anchor="center")
+
+  tk.Label(id_center_frame, text="Enter Patient ID", font=("Segoe UI", 14, "bold")).pack(pady=(0,6))
+  queue_label = tk.Label(id_center_frame, text=queue_text(), font=("Segoe UI", 12), fg="#555555")
+  queue_label.pack(pady=(0,6))
+  id_entry = tk.Entry(id_center_frame, textvariable=patient_id_var, font=("Segoe UI", 14), width=28)
+  id_entry.pack(pady=(0,8))
+  id_entry.focus_set()
+
+  confirm_btn = tk.Button(id_center_frame, text="Confirm", command=traced(confirm_patient_id), font=("Segoe UI", 12), bg="#0078D4", fg="white")
+  confirm_btn.pack()
+  id_entry.bind("<Return>", confirm_patient_id)
+
+  mic_frame = tk.Frame(root)
+
+  mic_button = tk.Button(
+    mic_frame,
+    text="🎤",
+    font=("Segoe UI Emoji", 55),
+    command=traced(toggle),
+    relief="flat",
+    bg="white",
+    activebackground="white",
+  )
+  # Pack mic button above the waveform canvas so waveform appears below mic
+  mic_button.pack(pady=6)
+
+  # Waveform canvas (created once, used by animate_mic) - placed below mic and centered
+  wave_canvas = tk.Canvas(mic_frame, width=360, height=72, highlightthickness=0)
+  wave_canvas.pack(pady=(8, 0))
+  waveform = WaveformView(wave_canvas, bars=22)
+  audio_source = None
+  mic_levels = SyntheticLevels(22)
+
+  status_label = tk.Label(
+    mic_frame,
+    text="Click on the mic icon to start recording.",
+    font=("Segoe UI", 20),
+  )
+  status_label.pack(pady=10)
+
+
+def main(argv=None, on_ready=None):
+  """Run the app; `on_ready(root)` is called once the first window is up (see bench_startup.py)."""
+  load_session(parse_args(argv))
+  _enable_dpi_awareness()
+  # opt-in callback tracing and stall detection (TK_TRACE=trace.json, see tk_trace.py)
+  tracer = tk_trace.from_env()
+  build_gui()
+  if tracer is not None:
+    tracer.watch(root)
+  if on_ready is not None:
+    root.after_idle(on_ready, root)
+  # build the consent dialog once the first window is up, so the first mic click is instant
+  root.after(500, get_consent_dialog)
   try:
-    w = wave_canvas.winfo_width()
-    h = wave_canvas.winfo_height()
-  except Exception:
-    w, h = 300, 60
-
-  wave_canvas.delete("all")
-
-  bars = 22
-  bar_w = max(2, (w / (bars * 1.8)))
-  spacing = max(2, (w - bars * bar_w) / (bars + 1))
-
-  mic_anim_step = (mic_anim_step + 1) % 100000
-
-  for i in range(bars):
-    # each bar has a phase offset so the waveform moves
-    phase = mic_anim_step * 0.12 + i * 0.45
-    amp = (math.sin(phase) + 1) / 2  # 0..1
-    # Vary amplitude slightly per bar for a natural look
-    target_height = amp * h * (0.25 + 0.75 * abs(math.sin(mic_anim_step * 0.02 + i)))
-    # smooth the height using exponential smoothing
-    prev_h = mic_prev_heights[i]
-    height = prev_h + (target_height - prev_h) * SMOOTH_ALPHA
-    mic_prev_heights[i] = height
-    x = spacing + i * (bar_w + spacing)
-    y1 = (h - height) / 2
-    y2 = y1 + height
-    # color using a fixed accent color
-    color = "#2196F3"
-    x2 = x + bar_w
-    # draw rounded (pill) bar instead of rectangle
-    _draw_rounded_bar(wave_canvas, x, y1, x2, y2, color)
-  root.after(FPS_DELAY_MS, animate_mic)
-
-
-mic_frame = tk.Frame(root)
-
-mic_button = tk.Button(
-  mic_frame,
-  text="🎤",
-  font=("Segoe UI Emoji", 55),
-  command=toggle,
-  relief="flat",
-  bg="white",
-  activebackground="white",
-)
-# Pack mic button above the waveform canvas so waveform appears below mic
-mic_button.pack(pady=6)
-
-# Waveform canvas (created once, used by animate_mic) - placed below mic and centered
-wave_canvas = tk.Canvas(mic_frame, width=360, height=72, highlightthickness=0)
-wave_canvas.pack(pady=(8, 0))
-
-status_label = tk.Label(
-  mic_frame,
-  text="Click on the mic icon to start recording.",
-  font=("Segoe UI", 20),
-)
-status_label.pack(pady=10)
-
-root.mainloop()
+    root.mainloop()
+  finally:
+    # exports already queued are still written before the process exits
+    exporter.shutdown(wait=True)
+    tk_trace.stop()
+    consent_audit.close()
+    patients.shutdown()
+
+
+if __name__ == "__main__":
+  main()
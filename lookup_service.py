@@ -0,0 +1,111 @@
+"""Bounded, coalescing, cached execution of doctor lookups.
+
+Every "Analyse" click goes through one `LookupService`:
+
+  * work runs on a fixed-size thread pool instead of a new thread per click;
+  * a request for a reg_no that is already in flight returns the same future;
+  * queued requests for other reg_nos are cancelled when a new one arrives, since
+    the UI only ever shows the latest number (unless `latest_only` is False, as
+    in the HTTP service, where every request has its own client);
+  * finished results are kept in a TTL + LRU cache keyed by reg_no, so repeat
+    lookups complete immediately;
+  * `invalidate` starts a new generation: lookups already running when it is
+    called still answer their callers, but their results are not cached and
+    new requests for the same reg_no compute afresh.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class LookupService:
+    def __init__(self, compute, max_workers=2, cache_size=256, ttl=300.0, latest_only=True):
+        self._compute = compute
+        self.latest_only = latest_only
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="lookup")
+        self._lock = threading.Lock()
+        # key -> (future, generation it was submitted in)
+        self._inflight = {}
+        self._generation = 0
+        self._cache = OrderedDict()
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.hits = self.misses = self.coalesced = self.cancelled = 0
+
+    def _cached(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry
+
+    def _store(self, key, value):
+        self._cache[key] = (time.monotonic() + self.ttl, value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def submit(self, key):
+        """Return a Future for the result of `compute(key)`."""
+        with self._lock:
+            entry = self._cached(key)
+            if entry is not None:
+                self.hits += 1
+                fut = Future()
+                fut.set_result(entry[1])
+                return fut
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self.coalesced += 1
+                return inflight[0]
+            # the UI only shows the newest lookup: drop queued work for other numbers
+            if self.latest_only:
+                for other, (other_fut, _) in list(self._inflight.items()):
+                    if other_fut.cancel():
+                        self.cancelled += 1
+                        del self._inflight[other]
+            self.misses += 1
+            fut = self._pool.submit(self._run, key, self._generation)
+            self._inflight[key] = (fut, self._generation)
+            return fut
+
+    def _finish(self, key, generation):
+        """Forget the in-flight entry of this run; False if it was invalidated meanwhile."""
+        inflight = self._inflight.get(key)
+        if inflight is None or inflight[1] != generation:
+            return False
+        del self._inflight[key]
+        return True
+
+    def _run(self, key, generation):
+        try:
+            value = self._compute(key)
+        except BaseException:
+            with self._lock:
+                self._finish(key, generation)
+            raise
+        with self._lock:
+            # computed from data that has changed since: answer the waiters, but don't cache it
+            if self._finish(key, generation):
+                self._store(key, value)
+        return value
+
+    def invalidate(self, key=None):
+        """Drop one cached result, or all of them, along with the lookups running for them."""
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._cache.clear()
+                self._inflight.clear()
+            else:
+                self._cache.pop(key, None)
+                self._inflight.pop(key, None)
+
+    def shutdown(self, wait=False):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
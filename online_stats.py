@@ -0,0 +1,412 @@
+"""Incremental (online) doctor efficiency statistics.
+
+`OnlineEfficiency` sits on top of a compacted base (a StatsStore snapshot, an
+EfficiencyEngine, or nothing) and folds new prescription/outcome events into
+running per-doctor and national counters in O(1) per event. Lookups merge the
+base with the live counters, so `analyse_doctor` is always current without a
+full recompute.
+
+Every `snapshot_every` events (or on `snapshot()`), the counters are compacted
+into a new stats_store file in a background thread and the store is reopened
+as the new base. With `log_path`, events are also appended to a journal that is
+replayed on startup and truncated after each snapshot, so nothing is lost
+between snapshots: each event reaches the OS before `append` returns (it
+survives the process crashing), and `flush(sync=True)` fsyncs it for callers
+that acknowledge events to someone else. Events are numbered, and each
+snapshot records how many it holds, so a crash at any point during compaction
+never counts one twice; a compaction that fails leaves its events in the
+counters and the journal for the next one.
+"""
+
+import itertools
+import os
+import threading
+import time
+
+import numpy as np
+
+from efficiency import EfficiencyEngine
+from stats_store import StatsStore, build_stats_store, open_stats
+
+JOURNAL_HEADER = "#seq\t"
+
+
+class _Counters:
+    """Per-doctor and national (cases, successes) deltas."""
+
+    def __init__(self):
+        self.doctors = {}
+        self.national = {}
+        self.events = 0
+
+    def add(self, reg_no, disease, outcome, cases=1):
+        doc = self.doctors.get(reg_no)
+        if doc is None:
+            doc = self.doctors[reg_no] = {}
+        c = doc.get(disease)
+        if c is None:
+            doc[disease] = [cases, outcome]
+        else:
+            c[0] += cases
+            c[1] += outcome
+        n = self.national.get(disease)
+        if n is None:
+            self.national[disease] = [cases, outcome]
+        else:
+            n[0] += cases
+            n[1] += outcome
+        self.events += 1
+
+    def merge(self, other):
+        """Add the counts of `other` to these."""
+        events = self.events + other.events
+        for reg_no, by_disease in other.doctors.items():
+            for disease, (cases, success) in by_disease.items():
+                self.add(reg_no, disease, success, cases)
+        self.events = events
+
+    def rows(self):
+        reg, dis, cases, success = [], [], [], []
+        for r, by_disease in self.doctors.items():
+            for d, (c, s) in by_disease.items():
+                reg.append(r)
+                dis.append(d)
+                cases.append(c)
+                success.append(s)
+        return reg, dis, cases, success
+
+
+class _Base:
+    """The compacted base and the number of lookups reading it right now."""
+
+    __slots__ = ("store", "readers", "retired")
+
+    def __init__(self, store):
+        self.store = store
+        self.readers = 0
+        self.retired = False
+
+
+def _close_base(store):
+    if isinstance(store, StatsStore):
+        try:
+            store.close()
+        except BufferError:
+            pass  # a caller still holds a view; the mapping is freed with it
+
+
+class OnlineEfficiency:
+    def __init__(self, base=None, snapshot_path=None, log_path=None, snapshot_every=1_000_000):
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        self._live = _Counters()
+        self._frozen = None  # counters being compacted in the background
+        self._compactor = None
+        self._log = None
+        # journal sequence number of the next event, and of the first one not in the frozen counters
+        self._seq = self._frozen_seq = 0
+        if base is None and snapshot_path and os.path.exists(snapshot_path):
+            base = open_stats(snapshot_path)
+        self._base = _Base(base)
+        self.events_total = 0
+        self.started = time.perf_counter()
+        if log_path:
+            self._replay_log()
+
+    @property
+    def base(self):
+        return self._base.store
+
+    # ----------------- Events -----------------
+    def append(self, reg_no, disease, outcome):
+        """Fold one prescription/outcome event (outcome 1 = success, 0 = not) into the counters."""
+        reg_no, outcome = str(reg_no), int(outcome)
+        with self._lock:
+            self._live.add(reg_no, disease, outcome)
+            self.events_total += 1
+            self._seq += 1
+            if self._log is not None:
+                self._log.write(f"{reg_no}\t{disease}\t{outcome}\n")
+                self._log.flush()
+            due = self.snapshot_path and self._live.events >= self.snapshot_every and self._frozen is None
+        if due:
+            self.snapshot(wait=False)
+
+    def extend(self, events):
+        for reg_no, disease, outcome in events:
+            self.append(reg_no, disease, outcome)
+
+    def events_per_second(self):
+        elapsed = time.perf_counter() - self.started
+        return self.events_total / elapsed if elapsed else 0.0
+
+    # ----------------- Journal -----------------
+    # A journal starts with "#seq<TAB>N", the sequence number of its first event, and
+    # every further line is one event. A snapshot records the sequence number up to
+    # which it counts events, so replaying a journal that a crash left behind is
+    # idempotent: events the base already holds are skipped.
+    def _open_log(self, first_seq):
+        log = open(self.log_path, "a", encoding="utf-8")
+        log.write(f"{JOURNAL_HEADER}{first_seq}\n")
+        log.flush()
+        return log
+
+    def _read_journal(self, path, upto, kept):
+        """Fold the events of `path` numbered `upto` or later into the live counters.
+
+        Each (seq, line) folded in is appended to `kept` (line is None for a torn
+        line). Returns (next seq to fold in, whether the file was intact).
+        """
+        intact = True
+        with open(path, "r", encoding="utf-8") as f:
+            first = f.readline()
+            if first.startswith(JOURNAL_HEADER):
+                seq = int(first[len(JOURNAL_HEADER):])
+                lines = f
+            else:
+                # unnumbered (an older journal): none of it is in the base yet
+                seq, intact = upto, False
+                lines = itertools.chain([first] if first else [], f)
+            for line in lines:
+                parts = line.rstrip("\n").split("\t")
+                try:
+                    event = (parts[0], parts[1], int(parts[2])) if len(parts) == 3 else None
+                except ValueError:
+                    event = None
+                if event is None and line != "#\n":
+                    intact = False  # torn by a crash mid-write
+                if seq >= upto:
+                    if event is not None:
+                        self._live.add(*event)
+                    kept.append((seq, line if event is not None else None))
+                    upto = seq + 1
+                seq += 1
+        return upto, intact
+
+    def _replay_log(self):
+        base_seq = getattr(self.base, "journal_seq", 0)
+        stale = self.log_path + ".compacting"
+        upto, intact, kept = base_seq, True, []
+        # a journal left ".compacting" by an interrupted snapshot holds the older events
+        for path in (stale, self.log_path):
+            if os.path.exists(path):
+                upto, ok = self._read_journal(path, upto, kept)
+                intact = intact and ok
+        self.events_total = self._live.events
+        self._seq = upto
+        if intact and not os.path.exists(stale) and os.path.exists(self.log_path):
+            self._log = open(self.log_path, "a", encoding="utf-8")
+            return
+        # rewrite what is not in the base as one numbered journal (torn lines keep their number)
+        tmp = self.log_path + ".tmp"
+        first = kept[0][0] if kept else upto
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(f"{JOURNAL_HEADER}{first}\n")
+            expected = first
+            for seq, line in kept:
+                f.write("#\n" * (seq - expected) + (line if line is not None else "#\n"))
+                expected = seq + 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.log_path)
+        if os.path.exists(stale):
+            os.remove(stale)
+        self._log = open(self.log_path, "a", encoding="utf-8")
+
+    # ----------------- Lookups -----------------
+    def _release(self, ref):
+        with self._lock:
+            ref.readers -= 1
+            close = ref.retired and ref.readers == 0
+        if close:
+            _close_base(ref.store)
+
+    def _counts(self, reg_no=None):
+        """(national, doctor) totals from one consistent view of the base and the counters.
+
+        The base, the frozen counters and a copy of the live ones are taken under
+        one lock hold; the base is then read outside it, pinned so a finishing
+        compaction cannot close it underneath. `doctor` is None without `reg_no`.
+        """
+        with self._lock:
+            ref = self._base
+            ref.readers += 1
+            layers = [self._frozen] if self._frozen is not None else []
+            live = _Counters()
+            live.national = {d: list(c) for d, c in self._live.national.items()}
+            if reg_no is not None:
+                live.doctors[reg_no] = {d: list(c) for d, c in self._live.doctors.get(reg_no, {}).items()}
+            layers.append(live)
+        try:
+            base = ref.store
+            national = dict(base.national_counts()) if base is not None else {}
+            doctor = None
+            if reg_no is not None:
+                doctor = {d: (c, s) for d, c, s in base.doctor_counts(reg_no)} if base is not None else {}
+        finally:
+            self._release(ref)
+        for layer in layers:
+            for d, (c, s) in layer.national.items():
+                bc, bs = national.get(d, (0, 0))
+                national[d] = (bc + c, bs + s)
+            if reg_no is not None:
+                for d, (c, s) in layer.doctors.get(reg_no, {}).items():
+                    bc, bs = doctor.get(d, (0, 0))
+                    doctor[d] = (bc + c, bs + s)
+        return national, doctor
+
+    def national_counts(self):
+        return self._counts()[0]
+
+    def doctor_counts(self, reg_no):
+        doctor = self._counts(str(reg_no))[1]
+        return sorted((d, c, s) for d, (c, s) in doctor.items())
+
+    def doctor_rows(self, reg_no):
+        """Same rows as EfficiencyEngine.doctor_rows, including events not yet compacted."""
+        national, doctor = self._counts(str(reg_no))
+        rows = []
+        for d, (cases, success) in sorted(doctor.items()):
+            nc, ns = national.get(d, (0, 0))
+            rows.append((d, ns / max(nc, 1), success / cases, cases))
+        return rows
+
+    # ----------------- Compaction -----------------
+    def snapshot(self, wait=True):
+        """Compact base + counters into `snapshot_path` and reopen it as the new base."""
+        if not self.snapshot_path:
+            raise ValueError("no snapshot_path configured")
+        with self._lock:
+            if self._frozen is None:
+                self._frozen, self._live = self._live, _Counters()
+                self._frozen_seq = self._seq
+                if self._log is not None:
+                    # events from here on go to a fresh journal; the old one dies with the snapshot
+                    self._log.close()
+                    os.replace(self.log_path, self.log_path + ".compacting")
+                    self._log = self._open_log(self._seq)
+                self._compactor = threading.Thread(target=self._compact, name="stats-compactor", daemon=True)
+                self._compactor.error = None
+                self._compactor.start()
+            compactor = self._compactor
+        if wait and compactor is not None:
+            compactor.join()
+            if compactor.error is not None:
+                raise compactor.error
+
+    def _compact(self):
+        try:
+            self._build_snapshot()
+        except BaseException as e:
+            threading.current_thread().error = e
+            self._restore_frozen()
+            raise
+
+    def _restore_frozen(self):
+        """Undo a failed compaction: its events go back to the live counters and the journal."""
+        tmp = self.snapshot_path + ".new"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        with self._lock:
+            if self._frozen is None:
+                return  # failed after the new base was in place: nothing to undo
+            self._frozen.merge(self._live)
+            self._live, self._frozen, self._compactor = self._frozen, None, None
+            stale = self.log_path + ".compacting" if self.log_path else None
+            if stale is None or not os.path.exists(stale):
+                return
+            # the frozen events (in the stale journal) come right before the current journal's
+            self._log.close()
+            with open(stale, "a", encoding="utf-8") as out, open(self.log_path, "r", encoding="utf-8") as f:
+                f.readline()  # its header: the stale journal's numbering carries on
+                for line in f:
+                    out.write(line)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(stale, self.log_path)
+            self._log = open(self.log_path, "a", encoding="utf-8")
+
+    def _build_snapshot(self):
+        # the base only changes here, and this is the only compactor
+        reg, dis, cases, success = self._frozen.rows()
+        if self.base is not None:
+            b_reg, b_dis, b_cases, b_success = self.base.aggregate_rows()
+            reg = np.concatenate([b_reg.astype(str), np.asarray(reg, dtype=str)])
+            dis = np.concatenate([b_dis.astype(str), np.asarray(dis, dtype=str)])
+            cases = np.concatenate([b_cases, np.asarray(cases, dtype=np.int64)])
+            success = np.concatenate([b_success, np.asarray(success, dtype=np.int64)])
+        engine = EfficiencyEngine(np.asarray(reg, dtype=str), np.asarray(dis, dtype=str), success, cases=cases)
+        tmp = self.snapshot_path + ".new"
+        build_stats_store(engine, tmp, journal_seq=self._frozen_seq)
+        new_base = StatsStore(tmp)
+        with self._lock:
+            old = self._base
+            # the mapping of a replaced file stays valid, so swapping the path is safe
+            os.replace(tmp, self.snapshot_path)
+            self._base = _Base(new_base)
+            self._frozen = None
+            self._compactor = None
+            # the snapshot records which events it holds, so a crash before this
+            # removal only makes the next start skip them in the stale journal
+            if self.log_path and os.path.exists(self.log_path + ".compacting"):
+                os.remove(self.log_path + ".compacting")
+            # lookups still reading the old base close it when they finish
+            old.retired = True
+            close = old.readers == 0
+        if close:
+            _close_base(old.store)
+
+    def flush(self, sync=False):
+        """Write out the journal; with `sync`, also wait until it is on disk."""
+        with self._lock:
+            if self._log is not None:
+                self._log.flush()
+                if sync:
+                    os.fsync(self._log.fileno())
+
+    def close(self):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+
+def open_online(dataset_path, log_path=None, snapshot_every=1_000_000):
+    """OnlineEfficiency over the outcome data at `dataset_path`, journaling to `log_path`.
+
+    Snapshots are compacted next to the journal (`log_path` + ".stats"). Once one
+    exists it already holds the dataset and the earlier events, so it is opened
+    in place of `dataset_path`.
+    """
+    if not log_path:
+        return OnlineEfficiency(base=open_stats(dataset_path))
+    snapshot_path = log_path + ".stats"
+    base = None if os.path.exists(snapshot_path) else open_stats(dataset_path)
+    return OnlineEfficiency(base, snapshot_path, log_path, snapshot_every)
+
+
+if __name__ == "__main__":
+    import sys
+
+    from efficiency import DISEASES
+
+    # throughput check: python online_stats.py N_EVENTS [SNAPSHOT.stats]
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    stats = OnlineEfficiency(snapshot_path=sys.argv[2] if len(sys.argv) > 2 else None)
+    t0 = time.perf_counter()
+    for i in range(n):
+        stats.append(100000 + i % 1000, DISEASES[i % len(DISEASES)], i & 1)
+    elapsed = time.perf_counter() - t0
+    print(f"{n} events in {elapsed:.2f}s ({n / elapsed:,.0f} events/s)")
+    t0 = time.perf_counter()
+    stats.doctor_rows(100000)
+    print(f"lookup {(time.perf_counter() - t0) * 1000:.2f} ms")
+    if stats.snapshot_path:
+        t0 = time.perf_counter()
+        stats.snapshot()
+        print(f"snapshot {time.perf_counter() - t0:.2f}s")
@@ -0,0 +1,114 @@
+"""Queue of patients for one clinic session, loaded ahead of the doctor.
+
+While the current patient is being dictated and reviewed, a background thread
+already streams the next patients' Bundles and resolves their code-only
+codings, so moving on to the next patient only swaps in a finished
+`PatientSession`. The prescription text itself is cheap and is built when the
+patient is shown, so its "Generated on" time is the time of the visit.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fhir_model import BundleIndex
+from fhir_stream import iter_bundle_resources
+
+
+class PatientSession:
+  """One patient's Bundle, ready for review."""
+
+  __slots__ = ("path", "bundle", "patient")
+
+  def __init__(self, path, bundle, patient):
+    self.path = path
+    self.bundle = bundle
+    self.patient = patient
+
+
+def load_patient(path, terminology=None):
+  """Stream `path` into a PatientSession (the work the queue does in the background)."""
+  bundle = BundleIndex.from_resources(iter_bundle_resources(path, full_urls=True))
+  if terminology is not None:
+    bundle.resolve_displays(terminology)
+  return PatientSession(path, bundle, bundle.patient())
+
+
+class SessionQueue:
+  def __init__(self, paths, terminology=None, prefetch=2):
+    self.paths = list(paths)
+    self.terminology = terminology
+    self.prefetch = prefetch
+    self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+    self._futures = {}
+    self._lock = threading.Lock()
+    self.position = -1
+
+  def _load(self, i):
+    return load_patient(self.paths[i], self.terminology)
+
+  def _future(self, i):
+    with self._lock:
+      fut = self._futures.get(i)
+      if fut is None:
+        fut = self._futures[i] = self._pool.submit(self._load, i)
+      return fut
+
+  def _prefetch_after(self, i):
+    for j in range(i + 1, min(i + 1 + self.prefetch, len(self.paths))):
+      self._future(j)
+
+  def __len__(self):
+    return len(self.paths)
+
+  def has_next(self):
+    return self.position + 1 < len(self.paths)
+
+  def next_ready(self):
+    """True if the next patient has already been loaded in the background."""
+    if not self.has_next():
+      return False
+    fut = self._futures.get(self.position + 1)
+    return fut is not None and fut.done()
+
+  def advance(self):
+    """Move to the next patient and return their session (waits only if not prefetched yet).
+
+    If the next Bundle cannot be loaded its error is raised and the position
+    does not move: call `advance` again to retry, or `skip` to pass over it.
+    """
+    if not self.has_next():
+      raise IndexError("no more patients in the queue")
+    i = self.position + 1
+    fut = self._future(i)
+    self._prefetch_after(i)
+    try:
+      session = fut.result()
+    except Exception:
+      with self._lock:
+        # a retry loads the file again
+        if self._futures.get(i) is fut:
+          del self._futures[i]
+      raise
+    self.position = i
+    self._forget_before(i)
+    return session
+
+  def skip(self):
+    """Pass over the next patient without loading them (e.g. after `advance` failed)."""
+    if not self.has_next():
+      raise IndexError("no more patients in the queue")
+    self.position += 1
+    self._forget_before(self.position + 1)
+    self._prefetch_after(self.position)
+
+  def next_path(self):
+    return self.paths[self.position + 1] if self.has_next() else None
+
+  def _forget_before(self, i):
+    with self._lock:
+      # sessions already passed are not needed again
+      for j in [j for j in self._futures if j < i]:
+        del self._futures[j]
+
+  def shutdown(self):
+    self._pool.shutdown(wait=False, cancel_futures=True)
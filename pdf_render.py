@@ -0,0 +1,174 @@
+"""Reusable PDF rendering engine for prescriptions.
+
+`PrescriptionRenderer` imports reportlab, resolves fonts and page geometry once,
+and then renders any number of prescriptions: one PDF per prescription, or many
+prescriptions as consecutive pages of a single PDF. Lines are wrapped on word
+boundaries using the real string-width metrics of the chosen font, and each page
+is emitted as a single text object instead of one `drawString` per line.
+"""
+
+import os
+
+_rl = None
+
+
+def _reportlab():
+  """Import the reportlab pieces we need once per process (raises ImportError if missing)."""
+  global _rl
+  if _rl is None:
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfgen import canvas
+
+    _rl = {"letter": letter, "inch": inch, "pdfmetrics": pdfmetrics, "canvas": canvas}
+  return _rl
+
+
+def wrap_lines(text, max_width, width_of):
+  """Wrap `text` so no line is wider than `max_width` points.
+
+  `width_of(s)` returns the rendered width of `s`. Lines break at spaces where
+  possible; single words wider than the line are split by characters. Leading
+  indentation is kept.
+  """
+  lines = []
+  space_w = width_of(" ")
+  for line in text.splitlines():
+    if width_of(line) <= max_width:
+      lines.append(line)
+      continue
+    stripped = line.lstrip(" ")
+    indent = line[: len(line) - len(stripped)]
+    current, current_w = indent, width_of(indent)
+    for word in stripped.split(" "):
+      if not word:
+        continue
+      word_w = width_of(word)
+      sep_w = space_w if current.strip() else 0.0
+      if current_w + sep_w + word_w <= max_width:
+        current = f"{current} {word}" if current.strip() else current + word
+        current_w += sep_w + word_w
+        continue
+      if current.strip():
+        lines.append(current)
+        current, current_w = indent, width_of(indent)
+      # hard-split words that do not fit on a line of their own
+      while current_w + word_w > max_width and len(word) > 1:
+        cut, w = 0, current_w
+        for ch in word:
+          ch_w = width_of(ch)
+          if cut and w + ch_w > max_width:
+            break
+          w += ch_w
+          cut += 1
+        lines.append(current + word[:cut])
+        word = word[cut:]
+        word_w = width_of(word)
+        current, current_w = indent, width_of(indent)
+      current += word
+      current_w += word_w
+    lines.append(current)
+  return lines
+
+
+class PrescriptionRenderer:
+  """Render prescription text to PDF with fonts and page layout set up once.
+
+  `font` is a standard PDF font name, or a path to a .ttf file which is
+  registered with reportlab the first time it is used.
+  """
+
+  def __init__(self, font="Helvetica", font_size=12, line_height=14, pagesize=None, margin=None, page_compression=0):
+    rl = _reportlab()
+    self._canvas_mod = rl["canvas"]
+    pdfmetrics = rl["pdfmetrics"]
+    if font.lower().endswith(".ttf"):
+      from reportlab.pdfbase.ttfonts import TTFont
+
+      name = os.path.splitext(os.path.basename(font))[0]
+      if name not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(name, font))
+      font = name
+    self.font = font
+    self.font_size = font_size
+    self.line_height = line_height
+    self.pagesize = pagesize or rl["letter"]
+    self.margin = 0.75 * rl["inch"] if margin is None else margin
+    self.page_compression = page_compression
+
+    width, height = self.pagesize
+    self.text_width = width - 2 * self.margin
+    self.top = height - self.margin
+    self.lines_per_page = max(1, int((height - 2 * self.margin - line_height) // line_height) + 1)
+
+    string_width = pdfmetrics.stringWidth
+    self._widths = {}
+
+    def width_of(s, _cache=self._widths, _font=font, _size=font_size):
+      w = _cache.get(s)
+      if w is None:
+        w = string_width(s, _font, _size)
+        if len(_cache) < 100000:
+          _cache[s] = w
+      return w
+
+    self.width_of = width_of
+
+  def wrap(self, text):
+    return wrap_lines(text, self.text_width, self.width_of)
+
+  def paginate(self, text):
+    """Split `text` into pages of wrapped lines."""
+    lines = self.wrap(text) or [""]
+    n = self.lines_per_page
+    return [lines[i : i + n] for i in range(0, len(lines), n)]
+
+  def _new_canvas(self, path):
+    return self._canvas_mod.Canvas(path, pagesize=self.pagesize, pageCompression=self.page_compression)
+
+  def _draw_pages(self, c, pages, progress=None):
+    total = len(pages)
+    for i, page in enumerate(pages, 1):
+      t = c.beginText(self.margin, self.top)
+      t.setFont(self.font, self.font_size, self.line_height)
+      t.textLines(page, trim=0)
+      c.drawText(t)
+      c.showPage()
+      if progress is not None:
+        progress(i, total)
+    return total
+
+  def render(self, text, path, progress=None):
+    """Write one prescription to its own PDF; returns the page count.
+
+    `progress(pages_done, total_pages)` is called after each page if given.
+    """
+    c = self._new_canvas(path)
+    n = self._draw_pages(c, self.paginate(text), progress)
+    c.save()
+    return n
+
+  def render_many(self, texts, path):
+    """Write every prescription in `texts` into one PDF, each starting on a new page."""
+    c = self._new_canvas(path)
+    n = 0
+    for text in texts:
+      n += self._draw_pages(c, self.paginate(text))
+    c.save()
+    return n
+
+  def render_each(self, items):
+    """Write each (text, path) pair to its own PDF in one pass; returns total pages."""
+    return sum(self.render(text, path) for text, path in items)
+
+
+_default = None
+
+
+def default_renderer():
+  """Shared renderer with the app's default layout (created on first use)."""
+  global _default
+  if _default is None:
+    _default = PrescriptionRenderer()
+  return _default
@@ -0,0 +1,132 @@
+"""Prescription text and file output, without any GUI dependency.
+
+Used by the Tk app in hack.py and by the headless batch generator in batch.py.
+reportlab is only imported when a PDF is actually written (see pdf_render.py).
+"""
+
+import base64
+from datetime import datetime, timezone
+
+from fhir_model import to_fhir
+
+DOCTOR_NAME = "Dr. Aditya Garg"
+DOCTOR_REG_NO = "123456"
+
+ADVICE = (
+  "- Monitor blood pressure regularly\n"
+  "- Stay hydrated\n"
+  "- Avoid sudden standing/sitting\n"
+  "- Follow-up if symptoms persist"
+)
+
+
+def build_prescription_text(bundle, patient, patient_id=None, doctor_name=DOCTOR_NAME, reg_no=DOCTOR_REG_NO, now=None):
+  """Return the prescription text for `patient` (a fhir_model.Patient in `bundle`).
+
+  `patient_id` overrides the id carried in the Bundle (the GUI passes the ID the
+  doctor typed in).
+  """
+  pid = patient.id if patient_id is None else patient_id
+  now = now or datetime.now()
+
+  diagnosis_lines = [f"- {c.display}" for c in bundle.active_conditions(patient.patient_ref)]
+  diagnosis_lines += [f"- {o.display}: {o.value} {o.unit}".rstrip() for o in bundle.observations(patient.patient_ref)]
+  medication_lines = []
+  for m in bundle.active_medications(patient.patient_ref):
+    medication_lines.append(f"- {m.display}")
+    if m.instruction:
+      medication_lines.append(f"  Instructions: {m.instruction}")
+  diagnosis_block = "\n".join(diagnosis_lines) or "- None recorded"
+  medication_block = "\n".join(medication_lines) or "- None prescribed"
+
+  text = f"""
+Patient ID    : {pid}
+Patient Name  : {patient.name}
+Age           : {patient.age}
+Gender        : {patient.gender.capitalize()}
+
+---------------------------------------------
+Diagnosis:
+{diagnosis_block}
+
+---------------------------------------------
+Medication:
+{medication_block}
+
+---------------------------------------------
+Advice:
+{ADVICE}
+
+---------------------------------------------
+{doctor_name}
+Registration No: {reg_no}
+Generated on: {now.strftime("%d-%m-%Y %H:%M:%S")}
+---------------------------------------------
+    """
+  return text.strip()
+
+
+def default_filename(patient_id, patient_name, ext):
+  """File name the GUI proposes for a prescription: `<id>_<name>.<ext>` or `<name>.<ext>`."""
+  return f"{patient_id}_{patient_name}.{ext}" if patient_id else f"{patient_name}.{ext}"
+
+
+def fhir_document(bundle, patient, text, patient_id=None, doctor_name=DOCTOR_NAME, reg_no=DOCTOR_REG_NO, now=None):
+  """FHIR JSON copy of a prescription: a collection Bundle with the patient, the active
+  resources the text was built from and a DocumentReference carrying the final text."""
+  pid = patient.id if patient_id is None else patient_id
+  now = now or datetime.now(timezone.utc)
+  ref = patient.patient_ref
+  patient_res = to_fhir(patient)
+  if pid:
+    patient_res = {"resourceType": "Patient", "id": pid, **{k: v for k, v in patient_res.items() if k != "id"}}
+  resources = [patient_res]
+  resources += [to_fhir(c) for c in bundle.active_conditions(ref)]
+  resources += [to_fhir(o) for o in bundle.observations(ref)]
+  resources += [to_fhir(m) for m in bundle.active_medications(ref)]
+  subject = {"reference": f"Patient/{pid}"} if pid else {"display": patient.name}
+  for res in resources[1:]:
+    res["subject"] = subject
+  resources.append(document_reference(text, subject, now.isoformat(), doctor_name, reg_no))
+  return {"resourceType": "Bundle", "type": "collection", "entry": [{"resource": r} for r in resources]}
+
+
+def coded_medications(bundle, patient):
+  """The patient's active medications as MedicationRequest elements (status, intent,
+  medicationCodeableConcept, dosageInstruction), as kept with each saved prescription."""
+  meds = []
+  for m in bundle.active_medications(patient.patient_ref):
+    res = to_fhir(m)
+    meds.append({k: res[k] for k in ("status", "intent", "medicationCodeableConcept", "dosageInstruction") if k in res})
+  return meds
+
+
+def document_reference(text, subject, date, doctor_name=DOCTOR_NAME, reg_no=DOCTOR_REG_NO):
+  """DocumentReference carrying the final prescription text as a plain-text attachment."""
+  author = {"identifier": {"value": reg_no}}
+  if doctor_name:
+    author["display"] = doctor_name
+  return {
+    "resourceType": "DocumentReference",
+    "status": "current",
+    "type": {"text": "Prescription"},
+    "subject": subject,
+    "date": date,
+    "author": [author],
+    "content": [{"attachment": {
+      "contentType": "text/plain; charset=utf-8",
+      "data": base64.b64encode(text.encode("utf-8")).decode("ascii"),
+    }}],
+  }
+
+
+def write_txt(text, path):
+  with open(path, "w", encoding="utf-8") as f:
+    f.write(text)
+
+
+def write_pdf(text, path):
+  """Render `text` to a letter-size PDF at `path`. Raises ImportError without reportlab."""
+  from pdf_render import default_renderer
+
+  default_renderer().render(text, path)
@@ -0,0 +1,173 @@
+"""Append-only, indexed history of every saved prescription.
+
+Each save adds a new version row keyed by patient ID, with the doctor's
+registration number, a timestamp and the coded medications the text was built
+from (a JSON list of MedicationRequest elements); rows are never updated or deleted
+(triggers reject it). The store is one SQLite file in WAL mode, so a reader
+(the review window) never waits on a writer, and two indexes keep lookups to a
+single B-tree descent however many records there are:
+
+  (patient_id, version)           latest / full history of a patient
+  (doctor_reg_no, created_at)     a doctor's prescriptions by time
+
+  python prescription_store.py STORE.db PATIENT_ID     print a patient's history
+"""
+
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prescription (
+  id            INTEGER PRIMARY KEY,
+  patient_id    TEXT    NOT NULL,
+  version       INTEGER NOT NULL,
+  doctor_reg_no TEXT    NOT NULL,
+  created_at    REAL    NOT NULL,
+  patient_name  TEXT,
+  text          TEXT    NOT NULL,
+  medications   TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS prescription_patient ON prescription (patient_id, version);
+CREATE INDEX IF NOT EXISTS prescription_doctor ON prescription (doctor_reg_no, created_at);
+CREATE TRIGGER IF NOT EXISTS prescription_no_update BEFORE UPDATE ON prescription
+BEGIN SELECT RAISE(ABORT, 'prescriptions are append-only'); END;
+CREATE TRIGGER IF NOT EXISTS prescription_no_delete BEFORE DELETE ON prescription
+BEGIN SELECT RAISE(ABORT, 'prescriptions are append-only'); END;
+"""
+
+_COLUMNS = "id, patient_id, version, doctor_reg_no, created_at, patient_name, text, medications"
+
+# `medications` is None for rows saved before medications were recorded
+PrescriptionRecord = namedtuple("PrescriptionRecord", _COLUMNS.replace(",", ""), defaults=(None,))
+
+
+def _record(row):
+  medications = row[-1]
+  return PrescriptionRecord(*row[:-1], json.loads(medications) if medications is not None else None)
+
+
+class PrescriptionStore:
+  def __init__(self, path):
+    self.path = path
+    self._lock = threading.Lock()
+    # the GUI reads on the Tk thread and writes from the export worker
+    self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    self._conn.execute("PRAGMA journal_mode=WAL")
+    self._conn.execute("PRAGMA synchronous=NORMAL")
+    self._conn.executescript(_SCHEMA)
+    # stores created before the medications column get it added (older rows stay NULL)
+    if "medications" not in {r[1] for r in self._conn.execute("PRAGMA table_info(prescription)")}:
+      self._conn.execute("ALTER TABLE prescription ADD COLUMN medications TEXT")
+
+  def add(self, patient_id, doctor_reg_no, text, patient_name=None, created_at=None, medications=None):
+    """Record a new version of `patient_id`'s prescription and return it.
+
+    `medications` is the list of coded MedicationRequest elements the text was
+    built from (see prescription.coded_medications).
+    """
+    return self.add_many([(patient_id, doctor_reg_no, text, patient_name, created_at, medications)])[0]
+
+  def add_many(self, rows):
+    """Append (patient_id, doctor_reg_no, text[, patient_name[, created_at[, medications]]]) rows in one transaction."""
+    added = []
+    with self._lock:
+      cur = self._conn.cursor()
+      cur.execute("BEGIN IMMEDIATE")
+      try:
+        next_version = {}
+        for row in rows:
+          patient_id, doctor_reg_no, text = str(row[0]), str(row[1]), row[2]
+          patient_name = row[3] if len(row) > 3 else None
+          created_at = row[4] if len(row) > 4 and row[4] is not None else time.time()
+          medications = row[5] if len(row) > 5 else None
+          version = next_version.get(patient_id)
+          if version is None:
+            version = cur.execute(
+              "SELECT COALESCE(MAX(version), 0) + 1 FROM prescription WHERE patient_id = ?", (patient_id,)
+            ).fetchone()[0]
+          next_version[patient_id] = version + 1
+          cur.execute(
+            "INSERT INTO prescription (patient_id, version, doctor_reg_no, created_at, patient_name, text, medications)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (patient_id, version, doctor_reg_no, created_at, patient_name, text,
+             None if medications is None else json.dumps(medications, ensure_ascii=False, separators=(",", ":"))),
+          )
+          added.append(PrescriptionRecord(
+            cur.lastrowid, patient_id, version, doctor_reg_no, created_at, patient_name, text, medications
+          ))
+        cur.execute("COMMIT")
+      except BaseException:
+        cur.execute("ROLLBACK")
+        raise
+    return added
+
+  def _query(self, sql, params):
+    with self._lock:
+      return [_record(r) for r in self._conn.execute(sql, params).fetchall()]
+
+  def latest(self, patient_id):
+    """Return the newest version for `patient_id`, or None if nothing was saved yet."""
+    rows = self._query(
+      f"SELECT {_COLUMNS} FROM prescription WHERE patient_id = ? ORDER BY version DESC LIMIT 1", (str(patient_id),)
+    )
+    return rows[0] if rows else None
+
+  def history(self, patient_id, limit=None):
+    """Return every version for `patient_id`, newest first."""
+    return self._query(
+      f"SELECT {_COLUMNS} FROM prescription WHERE patient_id = ? ORDER BY version DESC LIMIT ?",
+      (str(patient_id), -1 if limit is None else limit),
+    )
+
+  def for_doctor(self, doctor_reg_no, since=None, until=None, limit=None):
+    """Return prescriptions written by `doctor_reg_no` in [since, until), newest first."""
+    return self._query(
+      f"SELECT {_COLUMNS} FROM prescription WHERE doctor_reg_no = ? AND created_at >= ? AND created_at < ?"
+      " ORDER BY created_at DESC LIMIT ?",
+      (str(doctor_reg_no), since or 0.0, until or float("inf"), -1 if limit is None else limit),
+    )
+
+  def iter_records(self, since=None, latest_only=False, batch_size=1000):
+    """Yield records created at or after `since` in insertion order, `batch_size` rows at a time.
+
+    Reads through a separate read-only connection, so a long export sees one
+    consistent snapshot and never holds up saves from the review window.
+    """
+    where = "created_at >= ?"
+    if latest_only:
+      where += " AND version = (SELECT MAX(version) FROM prescription AS newer WHERE newer.patient_id = prescription.patient_id)"
+    conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+    try:
+      cur = conn.execute(f"SELECT {_COLUMNS} FROM prescription WHERE {where} ORDER BY id", (since or 0.0,))
+      while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+          return
+        for r in rows:
+          yield _record(r)
+    finally:
+      conn.close()
+
+  def __len__(self):
+    with self._lock:
+      return self._conn.execute("SELECT COUNT(*) FROM prescription").fetchone()[0]
+
+  def close(self):
+    with self._lock:
+      self._conn.close()
+
+
+if __name__ == "__main__":
+  if len(sys.argv) != 3:
+    print("usage: python prescription_store.py STORE.db PATIENT_ID", file=sys.stderr)
+    sys.exit(2)
+  store = PrescriptionStore(sys.argv[1])
+  for rec in store.history(sys.argv[2]):
+    stamp = time.strftime("%d-%m-%Y %H:%M:%S", time.localtime(rec.created_at))
+    print(f"--- version {rec.version}  {stamp}  Reg No {rec.doctor_reg_no}")
+    print(rec.text)
+  store.close()
@@ -0,0 +1,225 @@
+"""Virtualized, sortable results table for the Tk doctor efficiency view.
+
+Only the rows that fit in the viewport exist as canvas items: a fixed pool of
+row slots is created once and, while scrolling, the whole pool is shifted with a
+single `canvas.move` and slots whose row changed get new text. Rows are kept as
+raw tuples and formatted lazily, only when they scroll into view, so a result
+set of any size costs the same to display. Sorting and filtering reorder an
+index list over the rows and never rebuild the widget.
+"""
+
+import math
+import tkinter as tk
+
+HEADER_BG = "#E8E8E8"
+STRIPE_BG = "#F7F9FC"
+ROW_BG = "#FFFFFF"
+
+
+def _sort_key(value):
+    # missing values sort first, numbers numerically, everything else as text
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    return (2, str(value).lower())
+
+
+class Column:
+    def __init__(self, heading, width, fmt=None, anchor="w"):
+        self.heading = heading
+        self.width = width
+        self.fmt = fmt
+        self.anchor = anchor
+
+    def format(self, value):
+        if value is None:
+            return ""
+        return self.fmt(value) if self.fmt is not None else str(value)
+
+
+class ResultsTable(tk.Frame):
+    def __init__(self, parent, columns, height=400, row_height=28, font=("Consolas", 12), **kw):
+        super().__init__(parent, **kw)
+        self.columns = list(columns)
+        self.row_height = row_height
+        self.font = font
+        width = sum(c.width for c in self.columns)
+        self.canvas = tk.Canvas(self, width=width, height=height, bg=ROW_BG, highlightthickness=0)
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self._rows = []
+        self._view = []  # indices into _rows, in display order
+        self._text = {}  # lazily formatted rows by index
+        self._sort_col = None
+        self._sort_reverse = False
+        self._filter = ("", None)
+        self._offset = 0
+        self._shift = 0
+        self._slots = []
+        self._slot_keys = []
+        self._redraw_job = None
+
+        self._build_header()
+        self.canvas.bind("<Configure>", self._on_resize)
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", lambda e: self.scroll_pixels(-3 * self.row_height))
+        self.canvas.bind("<Button-5>", lambda e: self.scroll_pixels(3 * self.row_height))
+
+    # ----------------- Items -----------------
+    def _build_header(self):
+        c, h = self.canvas, self.row_height
+        c.create_rectangle(0, 0, sum(col.width for col in self.columns), h, fill=HEADER_BG, outline="", tags="header")
+        self._headings = []
+        x = 0
+        for i, col in enumerate(self.columns):
+            item = c.create_text(self._text_x(x, col), h / 2, text=col.heading, anchor=col.anchor,
+                                 font=(self.font[0], self.font[1], "bold"), tags="header")
+            c.tag_bind(item, "<Button-1>", lambda e, i=i: self.sort_by(i))
+            self._headings.append(item)
+            x += col.width
+
+    def _text_x(self, x, col):
+        pad = 8
+        return x + col.width - pad if col.anchor == "e" else x + pad
+
+    def _build_pool(self):
+        c, h = self.canvas, self.row_height
+        c.delete("body")
+        total = sum(col.width for col in self.columns)
+        n = int(math.ceil(max(c.winfo_height() - h, h) / h)) + 1
+        self._slots, self._slot_keys, self._shift = [], [None] * n, 0
+        for k in range(n):
+            y = h * (k + 1)
+            bg = c.create_rectangle(0, y, total, y + h, fill=ROW_BG, outline="", tags="body")
+            texts, x = [], 0
+            for col in self.columns:
+                texts.append(c.create_text(self._text_x(x, col), y + h / 2, text="", anchor=col.anchor,
+                                           font=self.font, tags="body"))
+                x += col.width
+            self._slots.append((bg, texts))
+        c.tag_raise("header")
+
+    # ----------------- Data -----------------
+    def set_rows(self, rows):
+        """Replace the result set; rows are tuples with one raw value per column."""
+        self._rows = list(rows)
+        self._text.clear()
+        self._slot_keys = [None] * len(self._slots)
+        self._apply_view()
+        self._offset = 0
+        self._refresh()
+
+    def sort_by(self, col, reverse=None):
+        """Sort on column `col`; clicking the same heading again reverses the order."""
+        if reverse is None:
+            reverse = not self._sort_reverse if col == self._sort_col else False
+        self._sort_col, self._sort_reverse = col, reverse
+        for i, item in enumerate(self._headings):
+            mark = (" ▼" if reverse else " ▲") if i == col else ""
+            self.canvas.itemconfigure(item, text=self.columns[i].heading + mark)
+        self._apply_view()
+        self._slot_keys = [None] * len(self._slots)
+        self._refresh()
+
+    def set_filter(self, text, col=None):
+        """Show only rows whose column `col` (any column if None) contains `text`."""
+        self._filter = (text.strip().lower(), col)
+        self._apply_view()
+        self._slot_keys = [None] * len(self._slots)
+        self._offset = 0
+        self._refresh()
+
+    def _apply_view(self):
+        rows = self._rows
+        needle, col = self._filter
+        if needle:
+            cols = range(len(self.columns)) if col is None else (col,)
+            view = [i for i, r in enumerate(rows) if any(needle in str(r[c]).lower() for c in cols)]
+        else:
+            view = list(range(len(rows)))
+        if self._sort_col is not None:
+            c = self._sort_col
+            view.sort(key=lambda i: _sort_key(rows[i][c]), reverse=self._sort_reverse)
+        self._view = view
+
+    def _row_text(self, i):
+        text = self._text.get(i)
+        if text is None:
+            row = self._rows[i]
+            text = self._text[i] = [col.format(v) for col, v in zip(self.columns, row)]
+        return text
+
+    def __len__(self):
+        return len(self._view)
+
+    # ----------------- Scrolling -----------------
+    def _max_offset(self):
+        body = max(self.canvas.winfo_height() - self.row_height, 0)
+        return max(len(self._view) * self.row_height - body, 0)
+
+    def scroll_pixels(self, dy):
+        self._offset = min(max(self._offset + dy, 0), self._max_offset())
+        self._schedule()
+
+    def yview(self, *args):
+        """Scrollbar protocol: ("moveto", fraction) or ("scroll", n, "units"|"pages")."""
+        total = max(len(self._view) * self.row_height, 1)
+        if args[0] == "moveto":
+            self._offset = min(max(int(float(args[1]) * total), 0), self._max_offset())
+            self._schedule()
+        elif args[0] == "scroll":
+            step = self.row_height if args[2] == "units" else self.canvas.winfo_height() - self.row_height
+            self.scroll_pixels(int(args[1]) * step)
+
+    def _on_wheel(self, event):
+        # Windows reports multiples of 120 per notch; macOS reports small deltas
+        # (often +-1), which int(delta / 120) would round down to no scroll at all
+        delta = event.delta
+        if delta == 0:
+            return
+        notches = delta / 120 if abs(delta) >= 120 else (1 if delta > 0 else -1)
+        self.scroll_pixels(-int(notches) * 3 * self.row_height)
+
+    def _on_resize(self, event):
+        self._build_pool()
+        self._offset = min(self._offset, self._max_offset())
+        self._refresh()
+
+    def _schedule(self):
+        # coalesce bursts of wheel/scrollbar events into one redraw per idle cycle
+        if self._redraw_job is None:
+            self._redraw_job = self.after_idle(self._refresh)
+
+    def _refresh(self):
+        self._redraw_job = None
+        if not self._slots:
+            return
+        c, h = self.canvas, self.row_height
+        first, sub = divmod(self._offset, h)
+        if -sub != self._shift:
+            c.move("body", 0, -sub - self._shift)
+            self._shift = -sub
+        for k, (bg, texts) in enumerate(self._slots):
+            pos = first + k
+            row = self._view[pos] if pos < len(self._view) else None
+            if self._slot_keys[k] == (pos, row):
+                continue
+            self._slot_keys[k] = (pos, row)
+            if row is None:
+                c.itemconfigure(bg, fill=ROW_BG)
+                for t in texts:
+                    c.itemconfigure(t, text="")
+                continue
+            c.itemconfigure(bg, fill=STRIPE_BG if pos % 2 else ROW_BG)
+            for t, text in zip(texts, self._row_text(row)):
+                c.itemconfigure(t, text=text)
+        total = len(self._view) * h
+        body = max(c.winfo_height() - h, 1)
+        if total <= body:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self._offset / total, (self._offset + body) / total)
+
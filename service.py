@@ -0,0 +1,379 @@
+"""HTTP service mode: doctor-efficiency lookups and prescription generation for a whole clinic.
+
+One process on the clinic's LAN holds the outcome statistics, the lookup cache
+and the terminology store; every terminal asks it instead of loading its own
+copy. The server is plain asyncio (no extra dependencies) speaking HTTP/1.1
+with keep-alive, so a terminal reuses one connection for all its requests.
+
+  GET  /health                           "ok"
+  GET  /metrics                          request counts, rates and cache hits (JSON)
+  GET  /diseases                         national cases and successes per disease (JSON)
+  GET  /doctors/{reg_no}/efficiency      the rows doc.py shows, as JSON
+  POST /doctors/{reg_no}/outcomes        {"disease": ..., "outcome": 0|1}; folded in online
+  POST /prescriptions?format=txt|pdf|json[&patient_id=...&doctor_name=...&reg_no=...]
+                                         body: a FHIR Bundle; returns the prescription
+
+Efficiency lookups go through the same coalescing TTL/LRU LookupService as the
+desktop app, shared by every client; parsed Bundles are cached by content, so
+a terminal re-requesting its patient (e.g. TXT, then PDF) parses it once.
+CPU-heavy work (Bundle parsing, PDF rendering, cache misses) runs on worker
+threads so the event loop keeps serving other connections.
+
+  python service.py [--stats OUTCOMES.stats] [--events EVENTS.log] [--terminology terminology.db]
+                    [--host 127.0.0.1] [--port 8765]
+
+doc.py started with the service URL (python doc.py http://HOST:8765) looks doctors
+up and records outcomes here, see service_client.py. See bench_service.py for a
+localhost load test.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import prescription
+from fhir_model import BundleIndex
+from fhir_stream import BundleFormatError, iter_entries
+from lookup_service import LookupService
+
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_BODY = 16 * 1024 * 1024
+IDLE_TIMEOUT = 30.0
+BUNDLE_CACHE = 256
+
+REASONS = {
+    200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+    501: "Not Implemented", 503: "Service Unavailable",
+}
+# what the prescription code raises on valid JSON that has the wrong FHIR shape
+# (e.g. "resource": 5, or a string where a list of HumanNames belongs)
+SHAPE_ERRORS = (AttributeError, TypeError, KeyError, IndexError, ValueError)
+CONTENT_TYPES = {
+    "txt": "text/plain; charset=utf-8",
+    "pdf": "application/pdf",
+    "json": "application/fhir+json",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or REASONS.get(status, ""))
+        self.status = status
+
+
+class Request:
+    __slots__ = ("method", "path", "query", "headers", "body")
+
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+
+def _json(value, status=200):
+    return status, "application/json", json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+# ----------------- Application -----------------
+class ClinicService:
+    """The shared state behind the HTTP API (usable without the server, e.g. in tests)."""
+
+    def __init__(self, engine=None, terminology=None, lookup_workers=4, bundle_cache=BUNDLE_CACHE):
+        # OnlineEfficiency / StatsStore / EfficiencyEngine, or None when no outcome data was given
+        self.engine = engine
+        self.terminology = terminology
+        self.lookups = LookupService(self._doctor_rows, max_workers=lookup_workers, latest_only=False)
+        self.bundle_cache = bundle_cache
+        self._bundles = OrderedDict()
+        self._bundle_lock = threading.Lock()
+        self.bundle_hits = self.bundle_misses = 0
+        self.started = time.monotonic()
+        self.requests = self.errors = 0
+
+    def _doctor_rows(self, reg_no):
+        return [
+            {"disease": d, "national_rate": nat, "doctor_rate": doc, "cases": cases}
+            for d, nat, doc, cases in self.engine.doctor_rows(reg_no)
+        ]
+
+    # -------- Handlers --------
+    async def efficiency(self, reg_no):
+        if self.engine is None:
+            raise HttpError(503, "no outcome data loaded (start the service with --stats)")
+        future = self.lookups.submit(reg_no)
+        # cached results are already done: answer without a trip through the pool
+        rows = future.result() if future.done() else await asyncio.wrap_future(future)
+        return _json({"reg_no": reg_no, "rows": rows})
+
+    def diseases(self):
+        if self.engine is None:
+            raise HttpError(503, "no outcome data loaded (start the service with --stats)")
+        counts = self.engine.national_counts()
+        return _json({"diseases": {d: [cases, success] for d, (cases, success) in sorted(counts.items())}})
+
+    async def record_outcome(self, reg_no, body):
+        if self.engine is None or not hasattr(self.engine, "append"):
+            raise HttpError(503, "outcome events need --stats")
+        try:
+            event = json.loads(body)
+            disease, outcome = str(event["disease"]), event["outcome"]
+        except (ValueError, KeyError, TypeError):
+            outcome = None
+        if type(outcome) is not int or outcome not in (0, 1):
+            raise HttpError(400, 'expected {"disease": ..., "outcome": 0 or 1}')
+        # acknowledged only once the event is in the journal on disk (the fsync runs off the event loop)
+        await asyncio.get_running_loop().run_in_executor(None, self._append, reg_no, disease, outcome)
+        # national rates moved too, so every cached result is stale
+        self.lookups.invalidate()
+        return 204, "text/plain", b""
+
+    def _append(self, reg_no, disease, outcome):
+        self.engine.append(reg_no, disease, outcome)
+        if hasattr(self.engine, "flush"):
+            self.engine.flush(sync=True)
+
+    def _bundle(self, body):
+        """Parsed BundleIndex for `body`, cached by content hash."""
+        key = hashlib.blake2b(body, digest_size=16).digest()
+        with self._bundle_lock:
+            bundle = self._bundles.get(key)
+            if bundle is not None:
+                self._bundles.move_to_end(key)
+                self.bundle_hits += 1
+                return bundle
+        try:
+            bundle = BundleIndex.from_resources(iter_entries(io.StringIO(body.decode("utf-8")), full_urls=True))
+        except (BundleFormatError, UnicodeDecodeError) as e:
+            raise HttpError(400, f"not a FHIR Bundle: {e}")
+        except SHAPE_ERRORS as e:
+            raise HttpError(400, f"malformed FHIR resource: {type(e).__name__}: {e}")
+        if self.terminology is not None:
+            bundle.resolve_displays(self.terminology)
+        with self._bundle_lock:
+            self.bundle_misses += 1
+            self._bundles[key] = bundle
+            while len(self._bundles) > self.bundle_cache:
+                self._bundles.popitem(last=False)
+        return bundle
+
+    def _prescription(self, body, query):
+        fmt = query.get("format", "txt")
+        if fmt not in CONTENT_TYPES:
+            raise HttpError(400, f"unknown format {fmt!r} (txt, pdf or json)")
+        bundle = self._bundle(body)
+        if not bundle.patients():
+            raise HttpError(400, "the Bundle has no Patient")
+        patient = bundle.patient()
+        pid = query.get("patient_id") or None
+        doctor_name = query.get("doctor_name", prescription.DOCTOR_NAME)
+        reg_no = query.get("reg_no", prescription.DOCTOR_REG_NO)
+        try:
+            text = prescription.build_prescription_text(bundle, patient, pid, doctor_name=doctor_name, reg_no=reg_no)
+            if fmt == "json":
+                doc = prescription.fhir_document(bundle, patient, text, pid, doctor_name=doctor_name, reg_no=reg_no)
+        except SHAPE_ERRORS as e:
+            raise HttpError(400, f"malformed FHIR resource: {type(e).__name__}: {e}")
+        if fmt == "txt":
+            data = text.encode("utf-8")
+        elif fmt == "json":
+            data = json.dumps(doc, ensure_ascii=False).encode("utf-8")
+        else:
+            from pdf_render import default_renderer
+
+            out = io.BytesIO()
+            try:
+                default_renderer().render(text, out)
+            except ImportError:
+                raise HttpError(501, "PDF output needs the 'reportlab' package")
+            data = out.getvalue()
+        return 200, CONTENT_TYPES[fmt], data
+
+    async def prescription(self, body, query):
+        if not body:
+            raise HttpError(400, "POST a FHIR Bundle as the request body")
+        return await asyncio.get_running_loop().run_in_executor(None, self._prescription, body, query)
+
+    def metrics(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        lookups = self.lookups
+        return _json({
+            "requests": self.requests,
+            "errors": self.errors,
+            "uptime_s": round(elapsed, 1),
+            "requests_per_sec": round(self.requests / elapsed, 1),
+            "lookup_hits": lookups.hits,
+            "lookup_misses": lookups.misses,
+            "lookup_coalesced": lookups.coalesced,
+            "bundle_hits": self.bundle_hits,
+            "bundle_misses": self.bundle_misses,
+        })
+
+    # -------- Routing --------
+    async def dispatch(self, req):
+        parts = [unquote(p) for p in req.path.strip("/").split("/")]
+        if parts == ["health"] and req.method == "GET":
+            return 200, "text/plain; charset=utf-8", b"ok"
+        if parts == ["metrics"] and req.method == "GET":
+            return self.metrics()
+        if parts == ["diseases"] and req.method == "GET":
+            return self.diseases()
+        if parts == ["prescriptions"]:
+            if req.method != "POST":
+                raise HttpError(405)
+            return await self.prescription(req.body, req.query)
+        if len(parts) == 3 and parts[0] == "doctors":
+            if parts[2] == "efficiency" and req.method == "GET":
+                return await self.efficiency(parts[1])
+            if parts[2] == "outcomes" and req.method == "POST":
+                return await self.record_outcome(parts[1], req.body)
+            if parts[2] in ("efficiency", "outcomes"):
+                raise HttpError(405)
+        raise HttpError(404)
+
+    def close(self):
+        self.lookups.shutdown()
+        if self.engine is not None and hasattr(self.engine, "close"):
+            self.engine.close()
+
+
+# ----------------- HTTP/1.1 -----------------
+async def _read_request(reader):
+    """Read one request; returns None when the client closed the connection between requests."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial.strip():
+            return None
+        raise HttpError(400, "incomplete request")
+    except asyncio.LimitOverrunError:
+        raise HttpError(400, "request head too large")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HttpError(411, "send a Content-Length instead of a chunked body")
+    length = headers.get("content-length") or "0"
+    # digits only: int() would also take "-5", "+5", " 5" or "1_000"
+    if not (length.isascii() and length.isdigit()):
+        raise HttpError(400, "invalid Content-Length")
+    length = int(length)
+    if length > MAX_BODY:
+        raise HttpError(413, f"request body over {MAX_BODY} bytes")
+    try:
+        body = await reader.readexactly(length) if length else b""
+    except asyncio.IncompleteReadError:
+        raise HttpError(400, "incomplete request body")
+    url = urlsplit(target)
+    req = Request(method, url.path, dict(parse_qsl(url.query)), headers, body)
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+    return req, keep_alive
+
+
+def _response(status, content_type, body, keep_alive):
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+async def serve(service, host=HOST, port=PORT, ready=None):
+    """Serve `service` until cancelled; `ready(port)` is called once listening (port 0 picks one)."""
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                try:
+                    parsed = await asyncio.wait_for(_read_request(reader), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                except HttpError as e:
+                    service.errors += 1
+                    writer.write(_response(e.status, "text/plain; charset=utf-8", str(e).encode("utf-8"), False))
+                    break
+                if parsed is None:
+                    break
+                req, keep_alive = parsed
+                service.requests += 1
+                try:
+                    status, content_type, body = await service.dispatch(req)
+                except HttpError as e:
+                    service.errors += 1
+                    status, content_type, body = e.status, "text/plain; charset=utf-8", str(e).encode("utf-8")
+                except Exception as e:
+                    service.errors += 1
+                    status, content_type, body = 500, "text/plain; charset=utf-8", f"{type(e).__name__}: {e}".encode("utf-8")
+                writer.write(_response(status, content_type, body, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port, limit=64 * 1024)
+    if ready is not None:
+        ready(server.sockets[0].getsockname()[1])
+    async with server:
+        await server.serve_forever()
+
+
+def load_service(stats=None, events=None, terminology=None):
+    engine = None
+    if stats:
+        from online_stats import open_online
+
+        engine = open_online(stats, events)
+    store = None
+    if terminology and os.path.exists(terminology):
+        from terminology import TerminologyStore
+
+        store = TerminologyStore(terminology)
+    return ClinicService(engine, store)
+
+
+def main(argv=None):
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Clinic HTTP service for efficiency lookups and prescriptions.")
+    parser.add_argument("--stats", default=None, help="outcome data (.stats store, CSV, Parquet or .npz) for efficiency lookups")
+    parser.add_argument("--events", default=None, help="journal of outcome events posted to the service")
+    parser.add_argument("--terminology", default=os.path.join(here, "terminology.db"), help="SQLite terminology store for code-only codings")
+    parser.add_argument("--host", default=HOST, help=f"address to listen on (default {HOST}; use 0.0.0.0 for the clinic LAN)")
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args(argv)
+
+    service = load_service(args.stats, args.events, args.terminology)
+    try:
+        asyncio.run(serve(service, args.host, args.port, ready=lambda port: print(f"listening on http://{args.host}:{port}", flush=True)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
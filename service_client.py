@@ -0,0 +1,116 @@
+"""Client for the clinic HTTP service (service.py), used by doc.py in client mode.
+
+`ServiceClient` answers the same calls doc.py makes on a local outcome engine
+(`doctor_rows`, `national_counts`, `append`, `close`), so a terminal started with the service URL
+instead of a dataset shares the service's statistics and lookup cache. Each
+calling thread keeps one keep-alive connection and reuses it for all of its
+requests; a connection the service closed while idle is reopened once.
+
+  python service_client.py URL REG_NO        print a doctor's rows as doc.py shows them
+"""
+
+import http.client
+import json
+import sys
+import threading
+from urllib.parse import quote, urlsplit
+
+TIMEOUT = 10.0
+
+
+class ServiceError(RuntimeError):
+    """The service answered with an error status."""
+
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}" if message else str(status))
+        self.status = status
+
+
+class ServiceClient:
+    def __init__(self, url, timeout=TIMEOUT):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"not an http(s) URL: {url!r}")
+        self.url = url
+        self._connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._netloc = parts.netloc
+        self._prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    # -------- Connections --------
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connection_class(self._netloc, timeout=self.timeout)
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _request(self, method, path, body=None):
+        """(status, body bytes) of one request on this thread's connection."""
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in (0, 1):
+            conn = self._connection()
+            # the service drops idle connections; a reused one may already be closed
+            reused = conn.sock is not None
+            try:
+                conn.request(method, self._prefix + path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            return response.status, data
+
+    # -------- Engine interface --------
+    def doctor_rows(self, reg_no):
+        """[(disease, national rate, doctor rate, cases)] for `reg_no`, like EfficiencyEngine.doctor_rows."""
+        status, data = self._request("GET", f"/doctors/{quote(str(reg_no), safe='')}/efficiency")
+        if status != 200:
+            raise ServiceError(status, data.decode("utf-8", "replace"))
+        rows = json.loads(data)["rows"]
+        return [(r["disease"], r["national_rate"], r["doctor_rate"], r["cases"]) for r in rows]
+
+    def national_counts(self):
+        """{disease: (cases, successes)} over all doctors, like EfficiencyEngine.national_counts."""
+        status, data = self._request("GET", "/diseases")
+        if status != 200:
+            raise ServiceError(status, data.decode("utf-8", "replace"))
+        return {d: tuple(counts) for d, counts in json.loads(data)["diseases"].items()}
+
+    def append(self, reg_no, disease, outcome):
+        """Send one outcome event (1 = success, 0 = failure) to the service."""
+        body = json.dumps({"disease": disease, "outcome": int(outcome)}).encode("utf-8")
+        status, data = self._request("POST", f"/doctors/{quote(str(reg_no), safe='')}/outcomes", body)
+        if status != 204:
+            raise ServiceError(status, data.decode("utf-8", "replace"))
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python service_client.py URL REG_NO", file=sys.stderr)
+        sys.exit(2)
+    from efficiency import format_rows
+
+    client = ServiceClient(sys.argv[1])
+    try:
+        for row in format_rows(client.doctor_rows(sys.argv[2])):
+            print("\t".join(row))
+    finally:
+        client.close()
@@ -0,0 +1,201 @@
+"""Turn a dictation transcript into FHIR resources by matching SNOMED terms.
+
+The term dictionary is compiled into an Aho-Corasick automaton over word tokens,
+so a transcript is scanned once, left to right, regardless of how many terms the
+dictionary holds. Overlapping hits are resolved leftmost-longest, negated
+findings ("no fever", "denies cough") are dropped, and each hit becomes a
+Condition, Observation or MedicationRequest shaped like the entries in
+sample_bundle.json.
+
+Dictionary files are tab-separated, one term per line:
+
+  code<TAB>resourceType<TAB>term[<TAB>unit]
+
+resourceType is Condition, Observation or MedicationRequest. A code may appear on
+several lines (synonyms); the first term seen is used as the display text.
+Lines starting with '#' are ignored.
+"""
+
+import re
+
+from fhir_model import SNOMED
+
+RESOURCE_TYPES = ("Condition", "Observation", "MedicationRequest")
+
+# numbers and letters are separate tokens so "5mg" and "5 mg" match the same term
+_TOKEN = re.compile(r"\d+(?:\.\d+)?|[^\W\d_]+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?$")
+_SENTENCE_END = re.compile(r"\.(?!\d)|[;\n]")
+NEGATIONS = frozenset(("no", "not", "denies", "denied", "without", "negative"))
+NEGATION_WINDOW = 3
+
+
+def tokenize(text):
+  """Return (token, start, end) for every word/number token of `text`, lower-cased."""
+  return [(m.group().lower(), m.start(), m.end()) for m in _TOKEN.finditer(text)]
+
+
+class TermMatcher:
+  """Aho-Corasick automaton over word tokens.
+
+  Nodes are integers; `_goto[n]` maps a token to the child node, `_fail[n]` is the
+  failure link, `_term[n]` the id of the term ending at `n` (or -1) and
+  `_out_link[n]` the nearest node on the failure chain that ends a term.
+  """
+
+  def __init__(self):
+    self._goto = [{}]
+    self._fail = [0]
+    self._term = [-1]
+    self._depth = [0]
+    self._out_link = [0]
+    self._built = True
+    # per-term data, indexed by term id
+    self.codes = []
+    self.types = []
+    self.units = []
+    self.displays = {}
+
+  def __len__(self):
+    return len(self.codes)
+
+  def add(self, code, resource_type, term, unit=""):
+    tokens = [t for t, _, _ in tokenize(term)]
+    if not tokens:
+      return
+    node = 0
+    goto = self._goto
+    for tok in tokens:
+      nxt = goto[node].get(tok)
+      if nxt is None:
+        nxt = len(goto)
+        goto[node][tok] = nxt
+        goto.append({})
+        self._fail.append(0)
+        self._term.append(-1)
+        self._depth.append(self._depth[node] + 1)
+        self._out_link.append(0)
+      node = nxt
+    if self._term[node] == -1:
+      self._term[node] = len(self.codes)
+      self.codes.append(code)
+      self.types.append(resource_type)
+      self.units.append(unit)
+    self.displays.setdefault(code, term)
+    self._built = False
+
+  def build(self):
+    """Compute failure and output links (breadth-first)."""
+    goto, fail, term, out_link = self._goto, self._fail, self._term, self._out_link
+    queue = []
+    for child in goto[0].values():
+      fail[child] = 0
+      out_link[child] = 0
+      queue.append(child)
+    i = 0
+    while i < len(queue):
+      node = queue[i]
+      i += 1
+      for tok, child in goto[node].items():
+        queue.append(child)
+        f = fail[node]
+        while f and tok not in goto[f]:
+          f = fail[f]
+        f = goto[f].get(tok, 0)
+        fail[child] = f
+        out_link[child] = f if term[f] != -1 else out_link[f]
+    self._built = True
+    return self
+
+  @classmethod
+  def from_tsv(cls, path):
+    matcher = cls()
+    with open(path, "r", encoding="utf-8") as f:
+      for line in f:
+        if not line.strip() or line.startswith("#"):
+          continue
+        parts = line.rstrip("\n").split("\t")
+        if len(parts) < 3 or parts[1] not in RESOURCE_TYPES:
+          continue
+        matcher.add(parts[0], parts[1], parts[2], parts[3] if len(parts) > 3 else "")
+    return matcher.build()
+
+  def find_all(self, tokens):
+    """Yield (start_token, end_token, term_id) for every dictionary hit in `tokens`."""
+    if not self._built:
+      self.build()
+    goto, fail, term, depth, out_link = self._goto, self._fail, self._term, self._depth, self._out_link
+    node = 0
+    for i, tok in enumerate(tokens):
+      while node and tok not in goto[node]:
+        node = fail[node]
+      node = goto[node].get(tok, 0)
+      hit = node if term[node] != -1 else out_link[node]
+      while hit:
+        yield i + 1 - depth[hit], i + 1, term[hit]
+        hit = out_link[hit]
+
+  def match(self, text):
+    """Return non-overlapping hits as (start_token, end_token, term_id), leftmost-longest."""
+    tokens = tokenize(text)
+    hits = sorted(self.find_all([t for t, _, _ in tokens]), key=lambda h: (h[0], -h[1]))
+    chosen = []
+    last_end = 0
+    for start, end, tid in hits:
+      if start >= last_end:
+        chosen.append((start, end, tid))
+        last_end = end
+    return tokens, chosen
+
+
+def _coding(matcher, tid):
+  code = matcher.codes[tid]
+  return {"coding": [{"system": SNOMED, "code": code, "display": matcher.displays[code]}]}
+
+
+def extract_resources(text, matcher):
+  """Return FHIR resource dicts for the conditions, observations and medications in `text`."""
+  tokens, hits = matcher.match(text)
+  resources = []
+  seen = set()
+  for n, (start, end, tid) in enumerate(hits):
+    rtype = matcher.types[tid]
+    code = matcher.codes[tid]
+    if rtype == "Condition":
+      # negation cues only count within the same sentence
+      lo = max(0, start - NEGATION_WINDOW)
+      while lo < start and _SENTENCE_END.search(text, tokens[lo][2], tokens[start][1]):
+        lo += 1
+      if any(t in NEGATIONS for t, _, _ in tokens[lo:start]):
+        continue
+    next_start = hits[n + 1][0] if n + 1 < len(hits) else len(tokens)
+    if rtype == "Observation":
+      value = next((t for t, _, _ in tokens[end : min(end + 4, next_start)] if _NUMBER.match(t)), None)
+      if value is None:
+        continue
+      resources.append({
+        "resourceType": "Observation",
+        "code": _coding(matcher, tid),
+        "valueQuantity": {"value": float(value) if "." in value else int(value), "unit": matcher.units[tid]},
+      })
+    elif (rtype, code) in seen:
+      continue
+    elif rtype == "Condition":
+      resources.append({"resourceType": "Condition", "code": _coding(matcher, tid), "clinicalStatus": "active"})
+    else:
+      # instructions: the rest of the clause after the drug name, up to the next hit
+      clause_end = tokens[next_start][1] if next_start < len(tokens) else len(text)
+      tail = text[tokens[end - 1][2] : clause_end]
+      stop = _SENTENCE_END.search(tail)
+      instruction = (tail[: stop.start()] if stop else tail).strip(" ,")
+      resource = {
+        "resourceType": "MedicationRequest",
+        "status": "active",
+        "intent": "order",
+        "medicationCodeableConcept": _coding(matcher, tid),
+      }
+      if instruction:
+        resource["dosageInstruction"] = [{"text": instruction}]
+      resources.append(resource)
+    seen.add((rtype, code))
+  return resources
@@ -0,0 +1,196 @@
+"""Precomputed per-doctor statistics in a compact, sorted, memory-mapped file.
+
+An offline build step aggregates the raw outcome records once (via
+efficiency.EfficiencyEngine) and writes:
+
+    header      magic, version, section counts and offsets, journal sequence
+    diseases    national cases/successes per disease + names
+    doctor keys registration numbers as fixed-width bytes, sorted
+    doctor rows [start, end) into the aggregate table for each doctor
+    aggregates  (disease index, cases, successes) per doctor and disease
+
+Opening the store only maps the file and reads the header, and a lookup is a
+binary search over the mapped key column that touches O(log n) pages, so a
+doctor's figures come back in well under a millisecond without loading anything.
+
+  python stats_store.py RECORDS.(csv|parquet|npz) OUT.stats
+"""
+
+import mmap
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"DOCSTAT1"
+VERSION = 2
+KEY_WIDTH = 16
+
+# magic, version, n_doctors, n_diseases, n_aggregates, then 4 section offsets;
+# version 2 adds the number of journaled events the file includes (see online_stats)
+_HEADER_V1 = struct.Struct("<8sIIIQQQQQ")
+_HEADER = struct.Struct("<8sIIIQQQQQQ")
+_DISEASE = np.dtype([("cases", "<u8"), ("success", "<u8"), ("name", "S64")])
+_RANGE = np.dtype([("start", "<u8"), ("end", "<u8")])
+_AGG = np.dtype([("disease", "<u4"), ("cases", "<u4"), ("success", "<u4")])
+
+
+def _key(reg_no):
+    key = str(reg_no).encode("utf-8")
+    if len(key) > KEY_WIDTH:
+        raise ValueError(f"registration number longer than {KEY_WIDTH} bytes: {reg_no!r}")
+    return key
+
+
+def _align(n, to=8):
+    return (n + to - 1) // to * to
+
+
+def build_stats_store(engine, path, journal_seq=0):
+    """Write the aggregates of an EfficiencyEngine to `path` (atomically).
+
+    `journal_seq` records how many journaled outcome events are already counted in it.
+    """
+    n_dis = len(engine.diseases)
+    keys = np.array([_key(r) for r in engine.doctors.tolist()], dtype=f"S{KEY_WIDTH}")
+    # engine rows are grouped by doctor index; doctor order in the file is byte order
+    order = np.argsort(keys, kind="stable")
+    rank = np.empty(len(keys), dtype=np.int64)
+    rank[order] = np.arange(len(keys))
+    doc_of_row = engine.keys // n_dis
+    rows = np.argsort(rank[doc_of_row], kind="stable")
+
+    counts = np.bincount(rank[doc_of_row], minlength=len(keys))
+    ranges = np.zeros(len(keys), dtype=_RANGE)
+    ranges["end"] = np.cumsum(counts)
+    ranges["start"] = ranges["end"] - counts
+
+    agg = np.zeros(len(rows), dtype=_AGG)
+    agg["disease"] = engine.keys[rows] - doc_of_row[rows] * n_dis
+    agg["cases"] = engine.cases[rows]
+    agg["success"] = engine.success[rows]
+
+    dis = np.zeros(n_dis, dtype=_DISEASE)
+    dis["cases"] = engine.national_cases
+    dis["success"] = engine.national_success
+    dis["name"] = [str(d).encode("utf-8")[:64] for d in engine.diseases.tolist()]
+
+    sections = [dis.tobytes(), keys[order].tobytes(), ranges.tobytes(), agg.tobytes()]
+    offsets, off = [], _align(_HEADER.size)
+    for blob in sections:
+        offsets.append(off)
+        off = _align(off + len(blob))
+    header = _HEADER.pack(MAGIC, VERSION, len(keys), n_dis, len(agg), *offsets, journal_seq)
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for blob, start in zip(sections, offsets):
+            f.write(b"\0" * (start - f.tell()))
+            f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class StatsStore:
+    """Read-only view of a stats file; exposes the same lookups as EfficiencyEngine."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = struct.unpack_from("<8sI", self._mm, 0)
+        if magic != MAGIC or version not in (1, VERSION):
+            self._mm.close()
+            raise ValueError(f"{path} is not a doctor statistics store")
+        if version == 1:
+            fields = _HEADER_V1.unpack_from(self._mm, 0) + (0,)
+        else:
+            fields = _HEADER.unpack_from(self._mm, 0)
+        n_doc, n_dis, n_agg, dis_off, key_off, range_off, agg_off, self.journal_seq = fields[2:]
+        self._diseases = np.frombuffer(self._mm, dtype=_DISEASE, count=n_dis, offset=dis_off)
+        self._keys = np.frombuffer(self._mm, dtype=f"S{KEY_WIDTH}", count=n_doc, offset=key_off)
+        self._ranges = np.frombuffer(self._mm, dtype=_RANGE, count=n_doc, offset=range_off)
+        self._agg = np.frombuffer(self._mm, dtype=_AGG, count=n_agg, offset=agg_off)
+        self._names = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    @property
+    def disease_names(self):
+        if self._names is None:
+            self._names = [n.decode("utf-8") for n in self._diseases["name"].tolist()]
+        return self._names
+
+    def national_rates(self):
+        rates = self._diseases["success"] / np.maximum(self._diseases["cases"], 1)
+        return dict(zip(self.disease_names, rates.tolist()))
+
+    def national_counts(self):
+        """Return {disease: (cases, successes)}."""
+        return dict(zip(self.disease_names, zip(self._diseases["cases"].tolist(), self._diseases["success"].tolist())))
+
+    def aggregate_rows(self):
+        """Return (reg_no, disease, cases, successes) columns, one row per doctor and disease."""
+        per_doctor = (self._ranges["end"] - self._ranges["start"]).astype(np.int64)
+        reg = np.repeat(np.char.decode(self._keys, "utf-8"), per_doctor)
+        dis = np.asarray(self.disease_names)[self._agg["disease"]] if len(self._agg) else np.array([], dtype=str)
+        return reg, dis, self._agg["cases"].astype(np.int64), self._agg["success"].astype(np.int64)
+
+    def _agg_range(self, reg_no):
+        try:
+            key = _key(reg_no)
+        except ValueError:
+            return None
+        i = int(np.searchsorted(self._keys, key))
+        if i >= len(self._keys) or self._keys[i] != key:
+            return None
+        return self._ranges[i].tolist()
+
+    def doctor_counts(self, reg_no):
+        """Return [(disease, cases, successes)] for every disease `reg_no` treated."""
+        span = self._agg_range(reg_no)
+        if span is None:
+            return []
+        names = self.disease_names
+        return [(names[dis], cases, success) for dis, cases, success in self._agg[span[0] : span[1]].tolist()]
+
+    def doctor_rows(self, reg_no):
+        """Return [(disease, national_rate, doctor_rate, cases)] for every disease `reg_no` treated."""
+        span = self._agg_range(reg_no)
+        if span is None:
+            return []
+        names = self.disease_names
+        rows = []
+        for dis, cases, success in self._agg[span[0] : span[1]].tolist():
+            nat = self._diseases[dis]
+            rows.append((names[dis], int(nat["success"]) / max(int(nat["cases"]), 1), success / cases, cases))
+        return rows
+
+    def close(self):
+        self._diseases = self._keys = self._ranges = self._agg = None
+        self._mm.close()
+
+
+def open_stats(path):
+    """Open a stats store, or build an EfficiencyEngine for raw record files."""
+    with open(path, "rb") as f:
+        is_store = f.read(len(MAGIC)) == MAGIC
+    if is_store:
+        return StatsStore(path)
+    from efficiency import EfficiencyEngine
+
+    return EfficiencyEngine.from_file(path)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("usage: python stats_store.py RECORDS.(csv|parquet|npz) OUT.stats", file=sys.stderr)
+        sys.exit(2)
+    from efficiency import EfficiencyEngine
+
+    build_stats_store(EfficiencyEngine.from_file(sys.argv[1]), sys.argv[2])
@@ -0,0 +1,131 @@
+"""Local terminology store for resolving (system, code) pairs to display names.
+
+Concepts live in a small SQLite file (one WITHOUT ROWID table keyed by system
+and code) that is opened read-only on first use, so importing this module or
+creating a store costs nothing at startup. Lookups go through an in-process
+LRU cache (unknown codes are cached too); `resolve_many` answers a whole Bundle
+with one query per chunk of cache misses.
+
+Build a store from a term dictionary in the snomed_match TSV format:
+
+  python terminology.py snomed_terms.tsv terminology.db
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+
+from fhir_model import SNOMED
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS concept (
+  system  TEXT NOT NULL,
+  code    TEXT NOT NULL,
+  display TEXT NOT NULL,
+  PRIMARY KEY (system, code)
+) WITHOUT ROWID
+"""
+
+_CHUNK = 500  # stay well under SQLite's host-parameter limit
+
+
+class TerminologyStore:
+  def __init__(self, path, cache_size=65536):
+    self.path = path
+    self.cache_size = cache_size
+    self._cache = OrderedDict()
+    self._conn = None
+    self._lock = threading.Lock()
+
+  def _connection(self):
+    if self._conn is None:
+      uri = f"file:{os.path.abspath(self.path)}?mode=ro"
+      self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    return self._conn
+
+  def _remember(self, key, display):
+    self._cache[key] = display
+    if len(self._cache) > self.cache_size:
+      self._cache.popitem(last=False)
+
+  def display(self, system, code):
+    """Return the display for (system, code), or None if the concept is unknown."""
+    key = (system, code)
+    with self._lock:
+      try:
+        self._cache.move_to_end(key)
+        return self._cache[key]
+      except KeyError:
+        pass
+      row = self._connection().execute(
+        "SELECT display FROM concept WHERE system = ? AND code = ?", key
+      ).fetchone()
+      display = row[0] if row else None
+      self._remember(key, display)
+    return display
+
+  def resolve_many(self, pairs):
+    """Return {(system, code): display} for every known pair in `pairs`."""
+    found = {}
+    missing = {}
+    with self._lock:
+      for key in set(pairs):
+        if key in self._cache:
+          self._cache.move_to_end(key)
+          if self._cache[key] is not None:
+            found[key] = self._cache[key]
+        else:
+          missing.setdefault(key[0], []).append(key[1])
+      for system, codes in missing.items():
+        for i in range(0, len(codes), _CHUNK):
+          chunk = codes[i : i + _CHUNK]
+          marks = ",".join("?" * len(chunk))
+          rows = dict(self._connection().execute(
+            f"SELECT code, display FROM concept WHERE system = ? AND code IN ({marks})", (system, *chunk)
+          ).fetchall())
+          for code in chunk:
+            display = rows.get(code)
+            self._remember((system, code), display)
+            if display is not None:
+              found[(system, code)] = display
+    return found
+
+  def close(self):
+    with self._lock:
+      if self._conn is not None:
+        self._conn.close()
+        self._conn = None
+
+
+def build_store(db_path, rows):
+  """Create or update the store at `db_path` from (system, code, display) rows."""
+  conn = sqlite3.connect(db_path)
+  try:
+    conn.execute(_SCHEMA)
+    conn.executemany("INSERT OR REPLACE INTO concept (system, code, display) VALUES (?, ?, ?)", rows)
+    conn.commit()
+  finally:
+    conn.close()
+
+
+def rows_from_tsv(path, system=SNOMED):
+  """Yield (system, code, display) from a snomed_match term dictionary (first term per code)."""
+  seen = set()
+  with open(path, "r", encoding="utf-8") as f:
+    for line in f:
+      if not line.strip() or line.startswith("#"):
+        continue
+      parts = line.rstrip("\n").split("\t")
+      if len(parts) < 3 or parts[0] in seen:
+        continue
+      seen.add(parts[0])
+      yield system, parts[0], parts[2]
+
+
+if __name__ == "__main__":
+  if len(sys.argv) != 3:
+    print("usage: python terminology.py TERMS.tsv STORE.db", file=sys.stderr)
+    sys.exit(2)
+  build_store(sys.argv[2], rows_from_tsv(sys.argv[1]))
@@ -0,0 +1,71 @@
+import time
+
+import numpy as np
+import pytest
+
+from audio_input import AudioSource, DeviceSource, LevelMeter, RingBuffer, SyntheticSource
+
+
+def test_ring_pads_before_any_audio():
+    ring = RingBuffer(8)
+    assert ring.latest(4).tolist() == [0, 0, 0, 0]
+    ring.write([1, 2])
+    assert ring.latest(4).tolist() == [0, 0, 1, 2]
+
+
+def test_ring_wraps_around():
+    ring = RingBuffer(5)
+    for chunk in ([1, 2, 3], [4, 5, 6], [7]):
+        ring.write(chunk)
+    assert ring.write_pos == 7
+    assert ring.latest(5).tolist() == [3, 4, 5, 6, 7]
+    assert ring.latest(2).tolist() == [6, 7]
+    # asking for more than the capacity returns the capacity
+    assert len(ring.latest(50)) == 5
+
+
+def test_ring_keeps_the_tail_of_an_oversized_write():
+    ring = RingBuffer(4)
+    ring.write([1])
+    ring.write(np.arange(10, 20))
+    assert ring.write_pos == 11
+    assert ring.latest(4).tolist() == [16, 17, 18, 19]
+    ring.write([20, 21])
+    assert ring.latest(4).tolist() == [18, 19, 20, 21]
+
+
+def test_ring_matches_a_naive_buffer():
+    rng = np.random.default_rng(3)
+    ring, history = RingBuffer(37), []
+    for _ in range(200):
+        chunk = rng.standard_normal(int(rng.integers(0, 60))).astype(np.float32)
+        ring.write(chunk)
+        history.extend(chunk.tolist())
+        n = int(rng.integers(1, 40))
+        expected = ([0.0] * n + history)[-min(n, 37):]
+        assert ring.latest(n).tolist() == pytest.approx(expected)
+
+
+def test_audio_source_is_abstract():
+    with pytest.raises(TypeError):
+        AudioSource()
+
+
+def test_device_source_falls_back_to_synthetic():
+    try:
+        import sounddevice  # noqa: F401
+        pytest.skip("sounddevice is installed; the fallback needs a missing backend")
+    except ImportError:
+        pass
+    source = DeviceSource(device=0).start()
+    try:
+        assert isinstance(source, SyntheticSource)
+        assert isinstance(source.error, ImportError)
+        deadline = time.monotonic() + 2.0
+        while source.ring.write_pos == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert source.ring.write_pos > 0
+        assert LevelMeter(source, bars=8).next().shape == (8,)
+    finally:
+        source.stop()
+    assert not source.running
@@ -0,0 +1,36 @@
+import json
+import os
+
+from batch import process_bundle
+
+
+def _write_bundle(path, *patient_ids):
+    entries = []
+    for pid in patient_ids:
+        entries.append({"resource": {"resourceType": "Patient", "id": pid, "name": [{"text": f"Patient {pid}"}]}})
+        entries.append({"resource": {
+            "resourceType": "Condition",
+            "subject": {"reference": f"Patient/{pid}"},
+            "code": {"coding": [{"system": "http://snomed.info/sct", "code": "44054006", "display": "Diabetes"}]},
+        }})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"resourceType": "Bundle", "type": "collection", "entry": entries}, f)
+    return str(path)
+
+
+def test_patient_ids_cannot_leave_the_output_directory(tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    path = _write_bundle(tmp_path / "clinic.json", "../x", "a/b", "ok-1")
+    _, written, _, error, _ = process_bundle(path, str(out), formats=("txt",))
+    assert error is None
+    assert sorted(os.listdir(out)) == ["clinic_..%2Fx.txt", "clinic_a%2Fb.txt", "clinic_ok-1.txt"]
+    assert all(os.path.dirname(p) == str(out) for p in written)
+    assert not (tmp_path / "x.txt").exists()
+
+
+def test_bundle_without_patient_is_an_error(tmp_path):
+    path = _write_bundle(tmp_path / "empty.json")
+    _, written, _, error, _ = process_bundle(path, str(tmp_path), formats=("txt",))
+    assert written == []
+    assert error == "ValueError: the Bundle has no Patient"
@@ -0,0 +1,160 @@
+import gzip
+import json
+import os
+import sqlite3
+import time
+
+import pytest
+
+import prescription
+from bulk_export import bulk_export
+from fhir_model import BundleIndex
+from prescription_store import PrescriptionStore
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_bundle.json")
+
+# FHIR R4 elements with cardinality 1..1 / 1..* (and their required code sets) for the exported types
+REQUIRED = {
+    "MedicationRequest": ("status", "intent", "medication[x]", "subject"),
+    "Bundle": ("type",),
+    "DocumentReference": ("status", "content"),
+    "Patient": (),
+    "OperationOutcome": ("issue",),
+}
+CODES = {
+    ("MedicationRequest", "status"): {"active", "on-hold", "cancelled", "completed", "entered-in-error", "stopped", "draft", "unknown"},
+    ("MedicationRequest", "intent"): {"proposal", "plan", "order", "original-order", "reflex-order", "filler-order", "instance-order", "option"},
+    ("Bundle", "type"): {"document", "message", "transaction", "transaction-response", "batch", "batch-response",
+                         "history", "searchset", "collection"},
+    ("DocumentReference", "status"): {"current", "superseded", "entered-in-error"},
+}
+
+
+def r4_errors(resource):
+    """Missing required elements of `resource` (and of the resources in a Bundle)."""
+    rtype = resource.get("resourceType")
+    if rtype not in REQUIRED:
+        return [f"unexpected resourceType {rtype!r}"]
+    errors = []
+    for element in REQUIRED[rtype]:
+        if element.endswith("[x]"):
+            stem = element[:-3]
+            present = [k for k in resource if k.startswith(stem) and k[len(stem):][:1].isupper()]
+            if len(present) != 1:
+                errors.append(f"{rtype}.{element} must be present exactly once")
+        elif resource.get(element) in (None, "", [], {}):
+            errors.append(f"{rtype}.{element} is required")
+        elif (rtype, element) in CODES and resource[element] not in CODES[rtype, element]:
+            errors.append(f"{rtype}.{element}: {resource[element]!r} is not a valid code")
+    if rtype == "MedicationRequest" and "medicationCodeableConcept" in resource:
+        codings = resource["medicationCodeableConcept"].get("coding") or []
+        if not any(c.get("system") and c.get("code") for c in codings):
+            errors.append("MedicationRequest.medicationCodeableConcept has no coding")
+    if rtype == "DocumentReference":
+        if not all(c.get("attachment") for c in resource.get("content", [])):
+            errors.append("DocumentReference.content.attachment is required")
+    if rtype == "OperationOutcome":
+        for issue in resource.get("issue", []):
+            if not issue.get("severity") or not issue.get("code"):
+                errors.append("OperationOutcome.issue needs severity and code")
+    if rtype == "Bundle":
+        for entry in resource.get("entry", []):
+            errors += r4_errors(entry["resource"])
+    return errors
+
+
+def _read(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def store(tmp_path):
+    with open(SAMPLE, encoding="utf-8") as f:
+        entries = json.load(f)["entry"]
+    bundle = BundleIndex.from_resources((e.get("fullUrl", ""), e["resource"]) for e in entries)
+    patient = bundle.patient()
+    medications = prescription.coded_medications(bundle, patient)
+    assert medications
+    store = PrescriptionStore(str(tmp_path / "rx.db"))
+    text = prescription.build_prescription_text(bundle, patient)
+    store.add("P1", "123456", text, patient_name="Asha", medications=medications)
+    store.add("P2", "123456", text, patient_name="Ravi", medications=medications + medications)
+    # saved before medications were recorded
+    store.add("P3", "654321", text)
+    yield store, medications
+    store.close()
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_export_is_valid_r4(store, tmp_path, compress):
+    store, medications = store
+    out = str(tmp_path / "out")
+    manifest = bulk_export(store, out, compress=compress)
+    counts = {o["type"]: o["count"] for o in manifest["output"]}
+    assert counts == {"MedicationRequest": 3 * len(medications), "Bundle": 3}
+    assert [(e["type"], e["count"]) for e in manifest["error"]] == [("OperationOutcome", 1)]
+
+    for item in manifest["output"] + manifest["error"]:
+        for resource in _read(os.path.join(out, item["url"])):
+            assert resource["resourceType"] == item["type"]
+            assert r4_errors(resource) == []
+
+
+def test_one_request_per_medication(store, tmp_path):
+    store, medications = store
+    out = str(tmp_path / "out")
+    bulk_export(store, out)
+    requests = _read(os.path.join(out, "MedicationRequest.ndjson"))
+    by_group = {}
+    for r in requests:
+        by_group.setdefault(r["groupIdentifier"]["value"], []).append(r["medicationCodeableConcept"])
+    assert by_group == {
+        "P1/1": [m["medicationCodeableConcept"] for m in medications],
+        "P2/1": [m["medicationCodeableConcept"] for m in medications] * 2,
+    }
+    assert len({r["id"] for r in requests}) == len(requests)
+    bundles = {b["id"]: b for b in _read(os.path.join(out, "Bundle.ndjson"))}
+    legacy = [b for b in bundles.values() if b["entry"][0]["resource"]["id"] == "P3"][0]
+    assert [e["resource"]["resourceType"] for e in legacy["entry"]] == ["Patient", "DocumentReference"]
+
+
+def test_store_written_before_medications_were_kept(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "CREATE TABLE prescription (id INTEGER PRIMARY KEY, patient_id TEXT NOT NULL, version INTEGER NOT NULL,"
+        " doctor_reg_no TEXT NOT NULL, created_at REAL NOT NULL, patient_name TEXT, text TEXT NOT NULL);"
+        "INSERT INTO prescription VALUES (1, 'P9', 1, '123456', 1700000000.0, 'Old', 'old text');"
+    )
+    conn.commit()
+    conn.close()
+    store = PrescriptionStore(path)
+    try:
+        assert store.latest("P9").medications is None
+        rec = store.add("P9", "123456", "new text", medications=[{"medicationCodeableConcept": {"text": "x"}}])
+        assert rec.version == 2
+        assert store.latest("P9").medications == [{"medicationCodeableConcept": {"text": "x"}}]
+    finally:
+        store.close()
+
+
+def test_unknown_type_is_rejected(store, tmp_path):
+    store, _ = store
+    out = tmp_path / "out"
+    with pytest.raises(ValueError, match="Observation"):
+        bulk_export(store, str(out), types=("MedicationRequest", "Observation"))
+    assert not out.exists()
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_clean_rerun_removes_old_errors(store, tmp_path, compress):
+    store, _ = store
+    out = str(tmp_path / "out")
+    bulk_export(store, out, compress=compress)
+    assert any(name.startswith("OperationOutcome.") for name in os.listdir(out))
+    # nothing saved since: no records, so no errors
+    manifest = bulk_export(store, out, since=time.time() + 60, compress=not compress)
+    assert manifest["error"] == []
+    assert not any(name.startswith("OperationOutcome.") for name in os.listdir(out))
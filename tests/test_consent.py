@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+from consent import DEFAULT_LANGUAGE, AuditLog, LanguagePacks
+
+
+def test_audit_log_appends_decisions(tmp_path):
+    path = str(tmp_path / "audit.jsonl")
+    log = AuditLog(path)
+    log.record("accepted", "P-1", "hi")
+    log.record("declined", "P-2", "en", reason="closed")
+    log.close()
+    entries = [json.loads(line) for line in open(path, encoding="utf-8")]
+    assert [(e["decision"], e["patient_id"], e["language"]) for e in entries] == [("accepted", "P-1", "hi"), ("declined", "P-2", "en")]
+    assert entries[1]["reason"] == "closed"
+
+
+def test_audit_log_open_error_reaches_the_caller(tmp_path):
+    with pytest.raises(OSError):
+        AuditLog(str(tmp_path / "missing" / "audit.jsonl"))
+
+
+def test_language_packs():
+    packs = LanguagePacks()
+    codes = [code for code, _ in packs.languages()]
+    assert DEFAULT_LANGUAGE in codes
+    for code in codes:
+        assert {"title", "consent", "accept", "decline"} <= set(packs.get(code))
@@ -0,0 +1,36 @@
+import threading
+
+import doc
+from efficiency import DISEASES, EfficiencyEngine, synthetic_records
+
+MORE_DISEASES = DISEASES + ("Asthma", "Malaria", "Typhoid")
+
+
+class FakeRoot:
+    def __init__(self):
+        self.calls = []
+
+    def after(self, ms, func, *args):
+        self.calls.append((func, args))
+
+
+def test_outcome_menu_lists_the_loaded_diseases(monkeypatch):
+    ready = threading.Event()
+    ready.set()
+    root = FakeRoot()
+    monkeypatch.setattr(doc, "engine_ready", ready)
+    monkeypatch.setattr(doc, "engine", EfficiencyEngine.from_columns(synthetic_records(2000, n_doctors=5, diseases=MORE_DISEASES)))
+    monkeypatch.setattr(doc, "root", root)
+    doc._load_diseases()
+    assert root.calls == [(doc._set_diseases, (sorted(MORE_DISEASES),))]
+
+
+def test_outcome_menu_keeps_the_builtin_diseases_without_data(monkeypatch):
+    ready = threading.Event()
+    ready.set()
+    root = FakeRoot()
+    monkeypatch.setattr(doc, "engine_ready", ready)
+    monkeypatch.setattr(doc, "engine", None)
+    monkeypatch.setattr(doc, "root", root)
+    doc._load_diseases()
+    assert root.calls == []
@@ -0,0 +1,106 @@
+import re
+import tkinter
+
+import pytest
+
+from draft_autosave import TextAutosave
+from draft_journal import DraftJournal, recover
+
+
+class FakeText:
+    """Just enough of a Tk Text widget (a Tcl command plus after/bind) to run TextAutosave without a display.
+
+    Like Tk, the buffer always ends in a newline that cannot be deleted, and
+    "end" is the position just after it.
+    """
+
+    def __init__(self):
+        self.tk = tkinter.Tcl().tk
+        self._w = ".text"
+        self._s = "\n"
+        self.tk.createcommand(self._w, self._command)
+
+    def _offset(self, index):
+        m = re.match(r"\s*(end|(\d+)\.(\d+))", index)
+        lines = self._s.split("\n")
+        if m.group(1) == "end" or int(m.group(2)) > len(lines) - 1:
+            off = len(self._s)
+        else:
+            line = int(m.group(2))
+            off = sum(len(l) + 1 for l in lines[:line - 1]) + min(int(m.group(3)), len(lines[line - 1]))
+        for sign, count in re.findall(r"\s*([+-])\s*(\d+)\s*c", index[m.end():]):
+            off += int(count) if sign == "+" else -int(count)
+        return max(0, min(off, len(self._s)))
+
+    def _index(self, off):
+        before = self._s[:off]
+        return f"{before.count(chr(10)) + 1}.{len(before) - before.rfind(chr(10)) - 1}"
+
+    def _edit(self, i1, i2, chars):
+        # nothing goes after (or removes) the final newline
+        o1 = min(self._offset(i1), len(self._s) - 1)
+        o2 = max(o1, min(self._offset(i2), len(self._s) - 1))
+        self._s = self._s[:o1] + chars + self._s[o2:]
+
+    def _command(self, cmd, *args):
+        if cmd == "index":
+            return self._index(self._offset(args[0]))
+        if cmd == "get":
+            return self._s[self._offset(args[0]):self._offset(args[1])]
+        if cmd == "insert":
+            self._edit(args[0], args[0], "".join(args[1::2]))
+        elif cmd == "delete":
+            for i in range(len(args) - 2 if len(args) % 2 == 0 else len(args) - 1, -1, -2):
+                end = args[i + 1] if i + 1 < len(args) else f"{args[i]} +1c"
+                self._edit(args[i], end, "")
+        elif cmd == "replace":
+            self._edit(args[0], args[1], "".join(args[2::2]))
+        return ""
+
+    def get(self, i1, i2):
+        return self.tk.call(self._w, "get", i1, i2)
+
+    def bind(self, sequence, func, add=None):
+        pass
+
+    def after(self, ms, func):
+        return "after#0"
+
+    def after_cancel(self, after_id):
+        pass
+
+
+@pytest.fixture(params=["tk", "fake"])
+def widget(request):
+    if request.param == "fake":
+        yield FakeText()
+        return
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError:
+        pytest.skip("no display")
+    root.withdraw()
+    yield tkinter.Text(root)
+    root.destroy()
+
+
+def test_journal_replays_to_the_widget_text(widget, tmp_path):
+    call = lambda *args: widget.tk.call((widget._w,) + args)
+    call("insert", "1.0", "Rx\nparacetamol 500 mg\n")
+    autosave = TextAutosave(widget, DraftJournal(str(tmp_path), "P1", widget.get("1.0", "end-1c")))
+
+    for ch in "twice daily":  # typing at the end
+        call("insert", "end", ch)
+    call("delete", "end-2c")  # backspace
+    call("delete", "end-2c")
+    call("insert", "end-1c", "ly\n")
+    call("insert", "1.2", " for", "", " fever", "bold")  # several chars/tag pairs
+    call("delete", "2.0", "2.4")
+    call("delete", "1.0", "1.1", "1.2")  # several ranges in one command
+    call("replace", "2.0", "2.7", "ibuprofen", "", " 400", "bold")
+    call("replace", "3.0", "3.5", "once\nat night")
+    call("replace", "1.0", "1.0", "")
+    autosave.close()
+
+    assert recover(str(tmp_path), "P1") == widget.get("1.0", "end-1c")
+    assert "ibuprofen 400" in widget.get("1.0", "end-1c")
@@ -0,0 +1,69 @@
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from efficiency import EfficiencyEngine, format_rows, load_columns, save_csv, save_npz, synthetic_records
+
+
+def _naive(cols):
+    """Per-doctor and national (cases, successes) per disease, one record at a time."""
+    labels = cols["disease_labels"].tolist()
+    doctor = defaultdict(lambda: [0, 0])
+    national = defaultdict(lambda: [0, 0])
+    for reg_no, dis, outcome in zip(cols["reg_no"].tolist(), cols["disease"].tolist(), cols["outcome"].tolist()):
+        for counts in (doctor[reg_no, labels[dis]], national[labels[dis]]):
+            counts[0] += 1
+            counts[1] += outcome
+    return doctor, national
+
+
+def _naive_rows(doctor, national, reg_no):
+    rows = []
+    for (doc, disease), (cases, success) in doctor.items():
+        if doc == reg_no:
+            nat_cases, nat_success = national[disease]
+            rows.append((disease, nat_success / nat_cases, success / cases, cases))
+    return sorted(rows)
+
+
+@pytest.fixture(scope="module")
+def records():
+    return synthetic_records(20000, n_doctors=60, seed=7)
+
+
+def test_doctor_rows_match_naive_aggregation(records):
+    engine = EfficiencyEngine.from_columns(records)
+    doctor, national = _naive(records)
+    assert engine.n_records == 20000
+    for reg_no in sorted({doc for doc, _ in doctor}):
+        rows = engine.doctor_rows(reg_no)
+        expected = _naive_rows(doctor, national, reg_no)
+        assert [r[0] for r in rows] == [r[0] for r in expected]
+        assert [r[3] for r in rows] == [r[3] for r in expected]
+        assert [r[1:3] for r in rows] == [pytest.approx(r[1:3]) for r in expected]
+    assert engine.national_counts() == {d: tuple(c) for d, c in national.items()}
+
+
+def test_unknown_doctor(records):
+    engine = EfficiencyEngine.from_columns(records)
+    assert engine.doctor_rows(1) == []
+    assert engine.doctor_rows("not a number") == []
+
+
+def test_aggregated_rows_give_the_same_rates(records):
+    engine = EfficiencyEngine.from_columns(records)
+    reg, dis, cases, success = engine.aggregate_rows()
+    regrouped = EfficiencyEngine(reg.astype(np.int64), dis, success, cases=cases)
+    for reg_no in (100000, 100031, 100059):
+        assert regrouped.doctor_rows(reg_no) == pytest.approx(engine.doctor_rows(reg_no))
+
+
+@pytest.mark.parametrize("ext", [".npz", ".csv"])
+def test_file_round_trip(records, tmp_path, ext):
+    path = str(tmp_path / f"records{ext}")
+    (save_npz if ext == ".npz" else save_csv)(path, records)
+    engine = EfficiencyEngine.from_file(path)
+    expected = EfficiencyEngine.from_columns(records)
+    assert format_rows(engine.doctor_rows(100005)) == format_rows(expected.doctor_rows(100005))
+    assert "year" in load_columns(path)
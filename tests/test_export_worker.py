@@ -0,0 +1,90 @@
+import json
+import os
+import queue
+import threading
+
+import pytest
+
+from export_worker import ExportJob, ExportWorker, _temp_path
+
+
+class Results:
+    def __init__(self):
+        self.done, self.errors = [], []
+        self._finished = threading.Semaphore(0)
+
+    def callbacks(self, name):
+        def on_done(paths):
+            self.done.append(name)
+            self._finished.release()
+
+        def on_error(e):
+            self.errors.append((name, e))
+            self._finished.release()
+
+        return {"on_done": on_done, "on_error": on_error}
+
+    def wait(self, n):
+        for _ in range(n):
+            assert self._finished.acquire(timeout=10)
+
+
+def _paused(worker):
+    """Hold the worker on a job so the following submits are taken as one batch."""
+    gate = threading.Event()
+    worker.submit(ExportJob("gate", {}, record=gate.wait))
+    return gate
+
+
+def test_temp_paths_are_unique(tmp_path):
+    target = str(tmp_path / "rx.txt")
+    assert len({_temp_path(target) for _ in range(100)}) == 100
+
+
+def test_jobs_in_one_batch_succeed_and_fail_on_their_own(tmp_path):
+    worker = ExportWorker(durable=True)
+    results = Results()
+    gate = _paused(worker)
+    # renaming over a directory fails for that job only
+    os.mkdir(tmp_path / "taken.txt")
+    worker.submit(ExportJob("one", {"txt": str(tmp_path / "one.txt")}), **results.callbacks("one"))
+    worker.submit(ExportJob("bad", {"txt": str(tmp_path / "taken.txt")}), **results.callbacks("bad"))
+    worker.submit(ExportJob("two", {"txt": str(tmp_path / "two.txt"), "json": str(tmp_path / "two.json")}, fhir={"id": 2}),
+                  **results.callbacks("two"))
+    gate.set()
+    results.wait(3)
+    worker.shutdown(wait=True)
+    assert sorted(results.done) == ["one", "two"]
+    assert [name for name, _ in results.errors] == ["bad"]
+    assert open(tmp_path / "one.txt", encoding="utf-8").read().strip() == "one"
+    assert json.load(open(tmp_path / "two.json", encoding="utf-8")) == {"id": 2}
+    # no temp file is left behind
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
+    assert worker.metrics()["jobs_done"] == 3 and worker.metrics()["jobs_failed"] == 1
+
+
+def test_same_target_twice_in_one_batch(tmp_path):
+    worker = ExportWorker(durable=False)
+    results = Results()
+    gate = _paused(worker)
+    target = str(tmp_path / "rx.txt")
+    for text in ("first", "second"):
+        worker.submit(ExportJob(text, {"txt": target}), **results.callbacks(text))
+    gate.set()
+    results.wait(2)
+    worker.shutdown(wait=True)
+    assert results.errors == []
+    assert open(target, encoding="utf-8").read().strip() == "second"
+
+
+def test_full_queue_does_not_block(tmp_path):
+    worker = ExportWorker(max_pending=1)
+    gate = _paused(worker)
+    try:
+        # the gate job is being worked on; one more fits in the queue
+        worker.submit(ExportJob("a", {"txt": str(tmp_path / "a.txt")}), block=True, timeout=5)
+        with pytest.raises(queue.Full):
+            worker.submit(ExportJob("b", {"txt": str(tmp_path / "b.txt")}), block=False)
+    finally:
+        gate.set()
+        worker.shutdown(wait=True)
@@ -0,0 +1,108 @@
+import json
+import os
+
+import prescription
+from fhir_model import AGE_EXTENSION, CONDITION_CLINICAL, BundleIndex, from_fhir
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_bundle.json")
+
+
+def _entries():
+    patient = {"resourceType": "Patient", "id": "p1", "name": [{"text": "Asha Rao"}]}
+    condition = {
+        "resourceType": "Condition",
+        "subject": {"reference": "urn:uuid:1234"},
+        "code": {"coding": [{"system": "http://snomed.info/sct", "code": "44054006"}]},
+    }
+    medication = {
+        "resourceType": "MedicationRequest",
+        "status": "active",
+        "subject": {"reference": "urn:uuid:1234"},
+        "medicationCodeableConcept": {"coding": [{"system": "http://snomed.info/sct", "code": "325278007"}]},
+    }
+    return [("urn:uuid:1234", patient), ("", condition), ("", medication)]
+
+
+def test_alias_resolves_when_patient_comes_first():
+    index = BundleIndex.from_resources(_entries())
+    assert [c.code for c in index.active_conditions("Patient/p1")] == ["44054006"]
+    assert len(index.active_medications("urn:uuid:1234")) == 1
+
+
+def test_alias_resolves_when_patient_comes_last():
+    patient, *rest = _entries()
+    index = BundleIndex.from_resources(rest + [patient])
+    assert [c.code for c in index.active_conditions("Patient/p1")] == ["44054006"]
+    assert index.active_medications("Patient/p1")[0].patient_ref == "Patient/p1"
+    assert "urn:uuid:1234" not in index.by_patient
+    assert index.patient("urn:uuid:1234").name == "Asha Rao"
+
+
+def test_sample_bundle():
+    with open(SAMPLE, encoding="utf-8") as f:
+        bundle = json.load(f)
+    index = BundleIndex.from_resources((e.get("fullUrl", ""), e["resource"]) for e in bundle["entry"])
+    patient = index.patient()
+    assert patient.name
+    assert len(index.for_patient(patient.patient_ref)) == len(bundle["entry"])
+
+
+def _without_subject(entries):
+    return [(url, {k: v for k, v in res.items() if k != "subject"}) for url, res in entries]
+
+
+def test_subjectless_resources_bind_in_any_order():
+    patient, *rest = _without_subject(_entries())
+    for order in ([patient] + rest, rest + [patient], [rest[0], patient, rest[1]]):
+        index = BundleIndex.from_resources(order)
+        assert [c.code for c in index.active_conditions("Patient/p1")] == ["44054006"]
+        assert len(index.active_medications("Patient/p1")) == 1
+        assert "" not in index.by_patient
+
+
+def test_subjectless_resources_with_several_patients():
+    patient, condition, medication = _without_subject(_entries())
+    other = ("", {"resourceType": "Patient", "id": "p2"})
+    index = BundleIndex.from_resources([condition, patient, medication, other])
+    # before any Patient of a multi-patient Bundle: not attributed to either
+    assert index.active_conditions("Patient/p1") == index.active_conditions("Patient/p2") == []
+    assert len(index.active_medications("Patient/p1")) == 1
+
+
+def test_later_bundle_without_patient_uses_the_last_one():
+    patient, condition, medication = _without_subject(_entries())
+    index = BundleIndex.from_resources([patient])
+    index.extend([condition, medication])
+    assert len(index.for_patient("Patient/p1")) == 3
+
+
+def _sample_document():
+    with open(SAMPLE, encoding="utf-8") as f:
+        bundle = json.load(f)
+    index = BundleIndex.from_resources((e.get("fullUrl", ""), e["resource"]) for e in bundle["entry"])
+    patient = index.patient()
+    doc = prescription.fhir_document(index, patient, "text", "P-7")
+    return {e["resource"]["resourceType"]: e["resource"] for e in doc["entry"]}
+
+
+def test_emitted_resources_are_r4_shaped():
+    resources = _sample_document()
+    patient = resources["Patient"]
+    assert "age" not in patient
+    assert patient["extension"] == [{"url": AGE_EXTENSION, "valueAge": {"value": 65, "unit": "a", "system": "http://unitsofmeasure.org", "code": "a"}}]
+    assert resources["Condition"]["clinicalStatus"] == {"coding": [{"system": CONDITION_CLINICAL, "code": "active"}]}
+    assert resources["Observation"]["status"] == "final"
+    med = resources["MedicationRequest"]
+    assert (med["status"], med["intent"]) == ("active", "order")
+    assert med["dosageInstruction"][0]["timing"] == {"code": {"text": "OD"}}
+    for res in resources.values():
+        for concept in (res.get("code"), res.get("medicationCodeableConcept")):
+            if concept is not None:
+                assert all(v for coding in concept["coding"] for v in coding.values())
+
+
+def test_emitted_resources_read_back():
+    resources = _sample_document()
+    assert from_fhir(resources["Patient"]).age == 65
+    assert from_fhir(resources["Condition"]).clinical_status == "active"
+    assert from_fhir(resources["MedicationRequest"]).timing == "OD"
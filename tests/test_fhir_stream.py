@@ -0,0 +1,61 @@
+import io
+import json
+import os
+
+import pytest
+
+from fhir_stream import BundleFormatError, iter_entries
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAMPLE = os.path.join(os.path.dirname(HERE), "sample_bundle.json")
+
+
+class CountingReader(io.StringIO):
+    """StringIO that remembers how many characters were read from it."""
+
+    consumed = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.consumed += len(data)
+        return data
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 16])
+def test_entries_match_json_load(chunk_size):
+    with open(SAMPLE, encoding="utf-8") as f:
+        text = f.read()
+    expected = [e["resource"] for e in json.loads(text)["entry"]]
+    header = {}
+    assert list(iter_entries(io.StringIO(text), chunk_size, header=header)) == expected
+    assert header["resourceType"] == "Bundle"
+
+
+def test_tokens_split_across_chunks():
+    text = json.dumps({"resourceType": "Bundle", "entry": [
+        {"resource": {"resourceType": "Observation", "valueQuantity": {"value": -12.5e3}, "flag": True, "note": None}},
+        {"resource": {"resourceType": "Patient", "name": [{"text": "Raé \\u00e9"}]}},
+    ]}, ensure_ascii=True)
+    for chunk_size in range(1, 12):
+        assert len(list(iter_entries(io.StringIO(text), chunk_size))) == 2
+
+
+def test_invalid_entry_fails_before_reading_the_rest():
+    entry = json.dumps({"resource": {"resourceType": "Observation", "id": "x" * 100}})
+    text = '{"resourceType": "Bundle", "entry": [' + entry + ', {"resource": {"id": oops}}, ' + ", ".join([entry] * 2000) + "]}"
+    fp = CountingReader(text)
+    with pytest.raises(BundleFormatError, match="invalid JSON"):
+        list(iter_entries(fp, chunk_size=1024))
+    assert fp.consumed < 4096
+
+
+def test_oversized_entry_is_rejected():
+    text = '{"resourceType": "Bundle", "entry": [{"resource": {"note": "' + "a" * 10000 + '"}}]}'
+    with pytest.raises(BundleFormatError, match="longer than"):
+        list(iter_entries(io.StringIO(text), chunk_size=256, max_value=1000))
+    assert len(list(iter_entries(io.StringIO(text), chunk_size=256, max_value=20000))) == 1
+
+
+def test_not_a_bundle():
+    with pytest.raises(BundleFormatError):
+        list(iter_entries(io.StringIO('{"resourceType": "Patient", "entry": []}')))
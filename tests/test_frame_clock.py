@@ -0,0 +1,65 @@
+import pytest
+
+import frame_clock
+from frame_clock import FrameClock
+
+
+class FakeRoot:
+    """The part of a Tk root FrameClock uses, with timers run by hand."""
+
+    def __init__(self):
+        self.pending = {}
+        self._ids = 0
+
+    def bind(self, sequence, func, add=None):
+        pass
+
+    def after(self, ms, func):
+        self._ids += 1
+        self.pending[self._ids] = func
+        return self._ids
+
+    def after_cancel(self, after_id):
+        del self.pending[after_id]
+
+    def report_callback_exception(self, *exc_info):
+        raise exc_info[1]
+
+    def run_pending(self):
+        (after_id, func), = self.pending.items()
+        del self.pending[after_id]
+        func()
+
+
+@pytest.fixture
+def now(monkeypatch):
+    t = [100.0]
+    monkeypatch.setattr(frame_clock.time, "perf_counter", lambda: t[0])
+    return t
+
+
+def test_late_frames_are_dropped_and_counted_once(now):
+    root = FakeRoot()
+    clock = FrameClock(root)
+    calls = []
+    clock.add("wave", lambda: calls.append(now[0]), 10)
+    root.run_pending()
+    now[0] += 0.055  # frames due at +10 ms ... +50 ms: one runs late, four are missed
+    root.run_pending()
+    assert len(calls) == 2
+    stats = clock.stats()["wave"]
+    assert (stats["frames"], stats["dropped"]) == (2, 4)
+    assert stats["fps"] == pytest.approx(1 / 0.055, rel=1e-3)
+
+    now[0] += 0.010
+    root.run_pending()
+    assert clock.stats()["wave"]["dropped"] == 4
+
+
+def test_no_timer_without_animations(now):
+    root = FakeRoot()
+    clock = FrameClock(root)
+    clock.add("spinner", lambda: None, 150)
+    assert len(root.pending) == 1
+    clock.remove("spinner")
+    assert root.pending == {}
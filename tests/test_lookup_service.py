@@ -0,0 +1,53 @@
+import threading
+
+from lookup_service import LookupService
+
+
+def test_result_computed_before_invalidate_is_not_cached():
+    version = [1]
+    started, release = threading.Event(), threading.Event()
+
+    def compute(key):
+        seen = version[0]
+        started.set()
+        release.wait(5)
+        return (key, seen)
+
+    lookups = LookupService(compute, max_workers=2, latest_only=False)
+    try:
+        stale = lookups.submit("A")
+        assert started.wait(5)
+        # new data arrives while the lookup is running
+        version[0] = 2
+        lookups.invalidate()
+        fresh = lookups.submit("A")
+        assert fresh is not stale
+        release.set()
+        assert stale.result(5) == ("A", 1)
+        assert fresh.result(5) == ("A", 2)
+        assert lookups.submit("A").result(0) == ("A", 2)
+        assert lookups.hits == 1
+    finally:
+        lookups.shutdown()
+
+
+def test_repeat_lookups_coalesce_and_cache():
+    calls = []
+    release = threading.Event()
+
+    def compute(key):
+        calls.append(key)
+        release.wait(5)
+        return key * 2
+
+    lookups = LookupService(compute, max_workers=1, latest_only=False)
+    try:
+        first = lookups.submit(3)
+        assert lookups.submit(3) is first
+        release.set()
+        assert first.result(5) == 6
+        assert lookups.submit(3).done()
+        assert calls == [3]
+        assert (lookups.misses, lookups.coalesced, lookups.hits) == (1, 1, 1)
+    finally:
+        lookups.shutdown()
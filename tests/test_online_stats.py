@@ -0,0 +1,212 @@
+import os
+import random
+import shutil
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import online_stats
+from efficiency import DISEASES, EfficiencyEngine
+from online_stats import OnlineEfficiency, open_online
+from stats_store import StatsStore, build_stats_store
+
+
+def _events(n, seed=0):
+    rng = random.Random(seed)
+    return [(str(100000 + rng.randrange(20)), rng.choice(DISEASES), rng.randrange(2)) for _ in range(n)]
+
+
+def _expected(events, reg_no):
+    reg, dis, out = zip(*events)
+    return EfficiencyEngine(list(reg), list(dis), list(out)).doctor_rows(reg_no)
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    events = _events(3000, seed=1)
+    reg, dis, out = zip(*events)
+    path = str(tmp_path / "base.stats")
+    build_stats_store(EfficiencyEngine(list(reg), list(dis), list(out)), path)
+    return path, events
+
+
+def test_lookups_merge_base_and_counters(dataset, tmp_path):
+    path, base_events = dataset
+    stats = open_online(path, str(tmp_path / "events.log"), snapshot_every=500)
+    new = _events(1234, seed=2)
+    stats.extend(new)
+    stats.close()
+    for reg_no in ("100000", "100007", "100019"):
+        assert stats.doctor_rows(reg_no) == pytest.approx(_expected(base_events + new, reg_no))
+    assert os.path.exists(str(tmp_path / "events.log.stats"))
+
+
+def test_restart_after_snapshots_counts_every_event_once(dataset, tmp_path):
+    path, base_events = dataset
+    log = str(tmp_path / "events.log")
+    first, second = _events(700, seed=3), _events(300, seed=4)
+    stats = open_online(path, log, snapshot_every=250)
+    stats.extend(first)
+    stats.close()
+    # the snapshot next to the journal is opened instead of the dataset
+    stats = open_online(path, log, snapshot_every=250)
+    assert isinstance(stats.base, StatsStore) and stats.base.path == log + ".stats"
+    stats.extend(second)
+    stats.close()
+    stats = open_online(path, log)
+    assert stats.doctor_rows("100003") == pytest.approx(_expected(base_events + first + second, "100003"))
+
+
+def test_crash_before_the_stale_journal_is_removed(dataset, tmp_path):
+    path, base_events = dataset
+    log = str(tmp_path / "events.log")
+    frozen, later = _events(400, seed=5), _events(50, seed=6)
+    stats = open_online(path, log)
+    stats.extend(frozen)
+    stats.flush()
+    shutil.copy(log, str(tmp_path / "frozen.log"))
+    stats.snapshot()
+    stats.extend(later)
+    stats.close()
+    # as if the process died between replacing the snapshot and removing ".compacting"
+    shutil.copy(str(tmp_path / "frozen.log"), log + ".compacting")
+    stats = open_online(path, log)
+    assert stats.doctor_rows("100011") == pytest.approx(_expected(base_events + frozen + later, "100011"))
+    assert not os.path.exists(log + ".compacting")
+    stats.close()
+    # and the rewritten journal replays the same way again
+    stats = open_online(path, log)
+    assert stats.doctor_rows("100011") == pytest.approx(_expected(base_events + frozen + later, "100011"))
+
+
+def test_crash_before_the_snapshot_is_replaced(dataset, tmp_path):
+    path, base_events = dataset
+    log = str(tmp_path / "events.log")
+    frozen = _events(400, seed=7)
+    stats = open_online(path, log)
+    stats.extend(frozen)
+    stats.close()
+    # the journal was moved aside for compaction, but no snapshot was written
+    os.replace(log, log + ".compacting")
+    stats = open_online(path, log)
+    stats.append("100001", DISEASES[0], 1)
+    stats.close()
+    stats = open_online(path, log)
+    assert stats.doctor_rows("100001") == pytest.approx(_expected(base_events + frozen + [("100001", DISEASES[0], 1)], "100001"))
+
+
+def test_torn_journal_line_is_skipped(dataset, tmp_path):
+    path, base_events = dataset
+    log = str(tmp_path / "events.log")
+    events = _events(100, seed=8)
+    stats = open_online(path, log)
+    stats.extend(events)
+    stats.close()
+    with open(log, "a", encoding="utf-8") as f:
+        f.write("100002\tCOP")
+    stats = open_online(path, log)
+    stats.append("100002", "COPD", 1)
+    stats.close()
+    stats = open_online(path, log)
+    assert stats.doctor_rows("100002") == pytest.approx(_expected(base_events + events + [("100002", "COPD", 1)], "100002"))
+
+
+def test_events_survive_a_process_crash(dataset, tmp_path):
+    path, base_events = dataset
+    log = str(tmp_path / "events.log")
+    events = _events(50, seed=10)
+    script = (
+        "import os, sys\n"
+        "from online_stats import open_online\n"
+        "stats = open_online(sys.argv[1], sys.argv[2])\n"
+        f"stats.extend({events!r})\n"
+        "os._exit(0)\n"
+    )
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", script, path, log], cwd=here, check=True)
+    stats = open_online(path, log)
+    assert stats.doctor_rows("100003") == pytest.approx(_expected(base_events + events, "100003"))
+    stats.close()
+
+
+# the compactor thread re-raises the error for threading.excepthook
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_failed_compaction_keeps_its_events(dataset, tmp_path, monkeypatch):
+    path, base_events = dataset
+    log = str(tmp_path / "events.log")
+    stats = open_online(path, log)
+    first, second = _events(100, seed=11), _events(100, seed=12)
+    stats.extend(first)
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(online_stats, "build_stats_store", fail)
+    with pytest.raises(OSError):
+        stats.snapshot()
+    stats.extend(second)
+    expected = _expected(base_events + first + second, "100001")
+    assert stats.doctor_rows("100001") == pytest.approx(expected)
+    assert not os.path.exists(log + ".compacting")
+
+    # the next compaction runs, and a restart finds every event exactly once
+    monkeypatch.undo()
+    stats.snapshot()
+    stats.append("100001", DISEASES[0], 1)
+    stats.close()
+    stats = open_online(path, log)
+    assert stats.doctor_rows("100001") == pytest.approx(_expected(base_events + first + second + [("100001", DISEASES[0], 1)], "100001"))
+    stats.close()
+
+
+# the compactor thread re-raises the error for threading.excepthook
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_failed_compaction_replays_from_the_journal(dataset, tmp_path, monkeypatch):
+    path, base_events = dataset
+    log = str(tmp_path / "events.log")
+    stats = open_online(path, log)
+    first, second = _events(100, seed=13), _events(100, seed=14)
+    stats.extend(first)
+    monkeypatch.setattr(online_stats, "build_stats_store", lambda *a, **k: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        stats.snapshot()
+    stats.extend(second)
+    stats.close()
+    stats = open_online(path, log)
+    assert stats.doctor_rows("100002") == pytest.approx(_expected(base_events + first + second, "100002"))
+    stats.close()
+
+
+def test_lookups_during_compaction(dataset, tmp_path):
+    path, _ = dataset
+    stats = open_online(path, str(tmp_path / "events.log"), snapshot_every=200)
+    errors, done = [], threading.Event()
+
+    def read():
+        while not done.is_set():
+            try:
+                national = stats.national_counts()
+                rows = stats.doctor_rows("100004")
+                assert sum(c for c, _ in national.values()) >= sum(r[3] for r in rows)
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+                return
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for t in readers:
+        t.start()
+    stats.extend(_events(3000, seed=9))
+    stats.close()
+    done.set()
+    for t in readers:
+        t.join()
+    assert errors == []
+
+
+def test_without_journal(dataset):
+    path, base_events = dataset
+    stats = OnlineEfficiency(base=StatsStore(path))
+    stats.append("100005", DISEASES[1], 0)
+    assert stats.doctor_rows("100005") == pytest.approx(_expected(base_events + [("100005", DISEASES[1], 0)], "100005"))
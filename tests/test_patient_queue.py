@@ -0,0 +1,69 @@
+import os
+import shutil
+
+import pytest
+
+from patient_queue import SessionQueue
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_bundle.json")
+
+
+@pytest.fixture
+def paths(tmp_path):
+    good = [str(tmp_path / f"p{i}.json") for i in range(3)]
+    for path in good:
+        shutil.copy(SAMPLE, path)
+    bad = str(tmp_path / "bad.json")
+    with open(bad, "w", encoding="utf-8") as f:
+        f.write('{"resourceType": "Bundle", "entry": [oops]}')
+    return good[:1] + [bad] + good[1:], bad
+
+
+def test_advance_through_the_queue(paths):
+    good = [p for p in paths[0] if p != paths[1]]
+    queue = SessionQueue(good)
+    try:
+        seen = []
+        while queue.has_next():
+            seen.append(queue.advance().path)
+        assert seen == good
+        assert queue.position == len(good) - 1
+        with pytest.raises(IndexError):
+            queue.advance()
+    finally:
+        queue.shutdown()
+
+
+def test_failed_load_does_not_move_the_position(paths):
+    all_paths, bad = paths
+    queue = SessionQueue(all_paths)
+    try:
+        assert queue.advance().path == all_paths[0]
+        assert queue.next_path() == bad
+        with pytest.raises(Exception):
+            queue.advance()
+        assert queue.position == 0
+        # a retry loads the file again, and fails again
+        with pytest.raises(Exception):
+            queue.advance()
+        queue.skip()
+        assert queue.position == 1
+        assert queue.advance().path == all_paths[2]
+        assert queue.advance().path == all_paths[3]
+        assert not queue.has_next()
+    finally:
+        queue.shutdown()
+
+
+def test_retry_after_the_file_is_fixed(paths):
+    all_paths, bad = paths
+    queue = SessionQueue([bad])
+    try:
+        with pytest.raises(Exception):
+            queue.advance()
+        shutil.copy(SAMPLE, bad)
+        session = queue.advance()
+        assert session.patient.name
+        assert queue.position == 0
+    finally:
+        queue.shutdown()
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import os
+import selectors
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from efficiency import EfficiencyEngine, synthetic_records
+from online_stats import open_online
+from service import MAX_BODY, ClinicService, serve
+from service_client import ServiceClient, ServiceError
+from stats_store import build_stats_store
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE = os.path.join(HERE, "sample_bundle.json")
+
+
+@pytest.fixture
+def server(tmp_path):
+    """(port, service) of a ClinicService served on a free localhost port by a background event loop."""
+    stats = str(tmp_path / "outcomes.stats")
+    build_stats_store(EfficiencyEngine.from_columns(synthetic_records(5000, n_doctors=20)), stats)
+    service = ClinicService(open_online(stats, str(tmp_path / "events.log")))
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    port = []
+
+    def listening(p):
+        port.append(p)
+        ready.set()
+
+    task = loop.create_task(serve(service, "127.0.0.1", 0, ready=listening))
+    thread = threading.Thread(target=lambda: loop.run_until_complete(asyncio.gather(task, return_exceptions=True)), daemon=True)
+    thread.start()
+    assert ready.wait(5)
+    yield port[0], service
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join(5)
+    loop.close()
+    service.close()
+
+
+def _raw(port, data):
+    """Send `data` as-is and return (status, body) of the response."""
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+        sock.sendall(data)
+        sock.shutdown(socket.SHUT_WR)
+        response = b""
+        while chunk := sock.recv(65536):
+            response += chunk
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ", 2)[1]), body
+
+
+def _post(port, path, body, content_length=None):
+    length = len(body) if content_length is None else content_length
+    return _raw(port, f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {length}\r\nConnection: close\r\n\r\n".encode() + body)
+
+
+def test_efficiency_json(server):
+    port, service = server
+    client = ServiceClient(f"http://127.0.0.1:{port}")
+    try:
+        rows = client.doctor_rows(100003)
+        assert rows == [tuple(r) for r in service.engine.doctor_rows("100003")]
+        assert rows and all(0.0 <= nat <= 1.0 and 0.0 <= doc <= 1.0 and cases > 0 for _, nat, doc, cases in rows)
+        assert client.doctor_rows(100003) == rows
+        # both lookups went over one keep-alive connection, the second one from the cache
+        assert service.lookups.hits == 1
+        status, body = _raw(port, b"GET /doctors/100003/efficiency HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n")
+        assert status == 200 and json.loads(body)["reg_no"] == "100003"
+        assert client.national_counts() == service.engine.national_counts()
+    finally:
+        client.close()
+
+
+def test_outcome_post_updates_the_next_lookup(server):
+    port, service = server
+    client = ServiceClient(f"http://127.0.0.1:{port}")
+    try:
+        before = {d: cases for d, _, _, cases in client.doctor_rows(100004)}
+        disease = next(iter(before))
+        client.append(100004, disease, 1)
+        after = {d: cases for d, _, _, cases in client.doctor_rows(100004)}
+        assert after[disease] == before[disease] + 1
+        with pytest.raises(ServiceError) as err:
+            client.append(100004, disease, 2)
+        assert err.value.status == 400
+    finally:
+        client.close()
+
+
+def test_prescription_pdf(server):
+    pytest.importorskip("reportlab")
+    port, _ = server
+    with open(SAMPLE, "rb") as f:
+        bundle = f.read()
+    status, body = _post(port, "/prescriptions?format=pdf&patient_id=P-1", bundle)
+    assert status == 200
+    assert body.startswith(b"%PDF")
+    status, body = _post(port, "/prescriptions?format=txt&patient_id=P-1", bundle)
+    assert status == 200 and b"P-1" in body
+
+
+@pytest.mark.parametrize("request_bytes, status", [
+    (b"GET /health HTTP/1.1\r\nContent-Length: abc\r\n\r\n", 400),
+    (b"GET /health HTTP/1.1\r\nContent-Length: -5\r\n\r\n", 400),
+    (b"GET /health HTTP/1.1\r\nContent-Length: +5\r\n\r\n", 400),
+    (f"POST /prescriptions HTTP/1.1\r\nContent-Length: {MAX_BODY + 1}\r\n\r\n".encode(), 413),
+    (b"POST /prescriptions HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n", 411),
+    (b"GARBAGE\r\n\r\n", 400),
+    (b"GET /nowhere HTTP/1.1\r\nConnection: close\r\n\r\n", 404),
+    (b"GET /prescriptions HTTP/1.1\r\nConnection: close\r\n\r\n", 405),
+])
+def test_malformed_requests(server, request_bytes, status):
+    port, _ = server
+    assert _raw(port, request_bytes)[0] == status
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/prescriptions?format=txt", b""),
+    ("/prescriptions?format=txt", b"{not json"),
+    ("/prescriptions?format=docx", b"{}"),
+    ("/doctors/100001/outcomes", b'{"disease": "Asthma"}'),
+    ("/doctors/100001/outcomes", b"[1, 2]"),
+    ("/doctors/100001/outcomes", b'{"disease": "Asthma", "outcome": true}'),
+    ("/doctors/100001/outcomes", b'{"disease": "Asthma", "outcome": 0.5}'),
+])
+def test_bad_bodies(server, path, body):
+    port, service = server
+    status, message = _post(port, path, body)
+    assert status == 400 and message
+    assert service.errors >= 1
+
+
+def _bundle(*resources):
+    return json.dumps({"resourceType": "Bundle", "type": "collection", "entry": [{"resource": r} for r in resources]}).encode()
+
+
+PATIENT = {"resourceType": "Patient", "id": "p"}
+SUBJECT = {"reference": "Patient/p"}
+
+
+@pytest.mark.parametrize("fmt", ["txt", "json"])
+@pytest.mark.parametrize("body", [
+    _bundle(PATIENT, 5),
+    _bundle({"resourceType": "Patient", "id": "p", "name": "Asha"}),
+    _bundle({"resourceType": "Patient", "id": "p", "name": ["Asha"]}),
+    _bundle({"resourceType": ["Patient"], "id": "p"}),
+    _bundle(PATIENT, {"resourceType": "Observation", "valueQuantity": 7, "subject": SUBJECT}),
+    _bundle(PATIENT, {"resourceType": "MedicationRequest", "dosageInstruction": 3, "subject": SUBJECT}),
+])
+def test_malformed_resources(server, body, fmt):
+    port, _ = server
+    status, message = _post(port, f"/prescriptions?format={fmt}", body)
+    assert status == 400, message
+    assert message.startswith(b"malformed FHIR resource")
+
+
+def test_short_body_is_not_served(server):
+    port, service = server
+    status, _ = _post(port, "/doctors/100001/outcomes", b'{"disease"', content_length=100)
+    assert status == 400
+    assert service.requests == 0
+
+
+def test_service_announces_its_port_through_a_pipe():
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONUNBUFFERED"}
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, "service.py"), "--port", "0", "--terminology", ""],
+                            stdout=subprocess.PIPE, text=True, cwd=HERE, env=env)
+    try:
+        with selectors.DefaultSelector() as sel:
+            sel.register(proc.stdout, selectors.EVENT_READ)
+            assert sel.select(timeout=20), "no output from service.py"
+        assert proc.stdout.readline().startswith("listening on http://")
+    finally:
+        proc.terminate()
+        proc.wait()
+        proc.stdout.close()
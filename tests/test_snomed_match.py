@@ -0,0 +1,114 @@
+import os
+
+import pytest
+
+from snomed_match import TermMatcher, extract_resources, tokenize
+
+TERMS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "snomed_terms.tsv")
+
+# dictations of the kind the mic flow produces, with the (type, code) pairs they should yield
+SAMPLE_TRANSCRIPTS = [
+    (
+        "Patient complains of headache and giddiness for two days. BP 150/90, pulse 88. "
+        "Start amlodipine 5 mg once daily.",
+        [("Condition", "25064002"), ("Condition", "404640003"), ("Observation", "75367002"),
+         ("Observation", "364075005"), ("MedicationRequest", "386864001")],
+    ),
+    (
+        "Known case of type 2 diabetes mellitus with high blood pressure. Weight 82 kg. "
+        "Continue Metformin after meals; paracetamol if needed.",
+        [("Condition", "44054006"), ("Condition", "38341003"), ("Observation", "27113001"),
+         ("MedicationRequest", "372567009"), ("MedicationRequest", "387517004")],
+    ),
+    (
+        "No fever. Denies cough. Feeling dizzy since morning.",
+        [("Condition", "404640003")],
+    ),
+]
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return TermMatcher.from_tsv(TERMS)
+
+
+def _terms(matcher, text):
+    tokens, hits = matcher.match(text)
+    return [" ".join(t for t, _, _ in tokens[start:end]) for start, end, _ in hits]
+
+
+def _naive_find_all(matcher, tokens):
+    """Every (start, end, term_id) by trying each dictionary term at each position."""
+    terms = {}
+    for node_terms in _walk(matcher):
+        terms.update(node_terms)
+    hits = set()
+    for start in range(len(tokens)):
+        for end in range(start + 1, len(tokens) + 1):
+            tid = terms.get(tuple(tokens[start:end]))
+            if tid is not None:
+                hits.add((start, end, tid))
+    return hits
+
+
+def _walk(matcher, node=0, path=()):
+    tid = matcher._term[node]
+    yield {path: tid} if tid != -1 else {}
+    for tok, child in matcher._goto[node].items():
+        yield from _walk(matcher, child, path + (tok,))
+
+
+@pytest.mark.parametrize("text, expected", SAMPLE_TRANSCRIPTS)
+def test_sample_transcripts(matcher, text, expected):
+    found = [(r["resourceType"], (r.get("code") or r["medicationCodeableConcept"])["coding"][0]["code"])
+             for r in extract_resources(text, matcher)]
+    assert found == expected
+
+
+@pytest.mark.parametrize("text, _", SAMPLE_TRANSCRIPTS)
+def test_find_all_matches_naive_scan(matcher, text, _):
+    tokens = [t for t, _, _ in tokenize(text)]
+    assert set(matcher.find_all(tokens)) == _naive_find_all(matcher, tokens)
+
+
+def test_overlapping_synonyms_take_the_longest(matcher):
+    assert _terms(matcher, "amlodipine 5 mg tablet") == ["amlodipine 5 mg tablet"]
+    assert _terms(matcher, "amlodipine 5mg") == ["amlodipine 5 mg"]
+    assert _terms(matcher, "amlodipine twice") == ["amlodipine"]
+    assert _terms(matcher, "type 2 diabetes mellitus") == ["type 2 diabetes mellitus"]
+    # "blood pressure" (an observation) sits inside "high blood pressure"
+    assert _terms(matcher, "has high blood pressure 150") == ["high blood pressure"]
+    assert _terms(matcher, "systolic blood pressure 140") == ["systolic blood pressure"]
+    # every overlapping hit is still reported by the automaton itself
+    tokens = [t for t, _, _ in tokenize("high blood pressure")]
+    assert {(s, e) for s, e, _ in matcher.find_all(tokens)} == {(0, 3), (1, 3)}
+
+
+def test_adjacent_terms_are_all_kept(matcher):
+    assert _terms(matcher, "pulse weight") == ["pulse", "weight"]
+    assert _terms(matcher, "heart rate heart rate") == ["heart rate", "heart rate"]
+
+
+def test_word_boundaries(matcher):
+    assert _terms(matcher, "coughing feverish headaches") == []
+    assert _terms(matcher, "BPH noted") == []
+    assert _terms(matcher, "cough, fever; headache.") == ["cough", "fever", "headache"]
+    # digits and letters split, so "5mg" and "5 mg" are the same tokens
+    assert _terms(matcher, "Amlodipine 5mg Tablet") == _terms(matcher, "amlodipine 5 mg tablet")
+    assert _terms(matcher, "metformin500") == ["metformin"]
+
+
+def test_case_folding(matcher):
+    assert _terms(matcher, "HEADACHE and Fever") == ["headache", "fever"]
+    assert _terms(matcher, "bp 120") == _terms(matcher, "BP 120") == ["bp"]
+    assert _terms(matcher, "TYPE 2 Diabetes") == ["type 2 diabetes"]
+
+
+def test_terms_added_after_build_are_found():
+    m = TermMatcher()
+    m.add("1", "Condition", "chest pain")
+    m.build()
+    assert m.match("chest pain")[1]
+    m.add("2", "Condition", "pain")
+    tokens = [t for t, _, _ in tokenize("severe pain")]
+    assert [m.codes[tid] for _, _, tid in m.find_all(tokens)] == ["2"]
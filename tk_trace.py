@@ -0,0 +1,253 @@
+"""Opt-in tracing of Tk event-loop callbacks, with stall detection.
+
+Set TK_TRACE=PATH before starting hack.py or doc.py to enable it:
+
+  * every `after` / `after_idle` callback (on any widget) and every button
+    command wrapped with `traced` is timed, together with its scheduling lag
+    (how late it ran compared to when it was due);
+  * a heartbeat on the loop catches stalls caused by anything else, e.g. a
+    modal file dialog or a slow event binding;
+  * callbacks or heartbeats over TK_TRACE_STALL_MS (default 50) are flagged
+    as "stall" events and counted.
+
+Events are written in Chrome's trace event format (open the file in
+chrome://tracing or Perfetto) by a background thread. The file rolls over at
+TK_TRACE_MAX_MB (default 20) and keeps two older files (PATH.1, PATH.2).
+
+When TK_TRACE is not set nothing is patched and `traced` returns the function
+it was given, so there is no cost at all.
+"""
+
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+STALL_MS = 50.0
+MAX_BYTES = 20 * 1024 * 1024
+BACKUPS = 2
+
+_active = None
+_STOP = object()
+
+
+def _name(func):
+    name = getattr(func, "__qualname__", None) or getattr(func, "__name__", None)
+    return name or repr(func)
+
+
+class Tracer:
+    def __init__(self, path, stall_ms=STALL_MS, max_bytes=MAX_BYTES, backups=BACKUPS, on_stall=None):
+        self.path = path
+        self.stall_ms = stall_ms
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.on_stall = on_stall
+        self.stalls = 0
+        # name -> [calls, total ms, max ms, max lag ms]
+        self.stats = {}
+        self._pid = os.getpid()
+        self._t0 = time.perf_counter()
+        self._queue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_loop, name="tk-trace", daemon=True)
+        self._writer.start()
+        self._restore = None
+        self._orig_after = None
+
+    # ----------------- Recording -----------------
+    def _us(self, t):
+        return round((t - self._t0) * 1e6, 1)
+
+    def record(self, name, start, end, lag_ms=None, cat="callback"):
+        """Record one callback that ran from `start` to `end` (perf_counter seconds)."""
+        dur_ms = (end - start) * 1000.0
+        s = self.stats.get(name)
+        if s is None:
+            s = self.stats[name] = [0, 0.0, 0.0, 0.0]
+        s[0] += 1
+        s[1] += dur_ms
+        s[2] = max(s[2], dur_ms)
+        tid = threading.get_ident()
+        event = {"name": name, "cat": cat, "ph": "X", "ts": self._us(start), "dur": round(dur_ms * 1000.0, 1), "pid": self._pid, "tid": tid}
+        if lag_ms is not None:
+            s[3] = max(s[3], lag_ms)
+            event["args"] = {"lag_ms": round(lag_ms, 3)}
+        self._queue.put(event)
+        if dur_ms >= self.stall_ms or (lag_ms or 0.0) >= self.stall_ms:
+            self._stall(name, end, dur_ms, lag_ms, tid)
+
+    def _stall(self, name, at, dur_ms, lag_ms, tid):
+        self.stalls += 1
+        self._queue.put({
+            "name": f"stall: {name}", "cat": "stall", "ph": "i", "s": "g", "ts": self._us(at),
+            "pid": self._pid, "tid": tid, "args": {"dur_ms": round(dur_ms, 3), "lag_ms": round(lag_ms or 0.0, 3)},
+        })
+        if self.on_stall is not None:
+            self.on_stall(name, dur_ms, lag_ms)
+
+    def counter(self, name, values):
+        """Record counter values (e.g. {"waveform": 59.8}); shown as a graph in the trace viewer."""
+        self._queue.put({"name": name, "cat": "counter", "ph": "C", "ts": self._us(time.perf_counter()), "pid": self._pid, "args": values})
+
+    def wrap(self, func, name=None, due=None):
+        """Return `func` timed under `name`; `due` (perf_counter) is when it should have run."""
+        name = name or _name(func)
+
+        def traced_call(*args, **kw):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kw)
+            finally:
+                lag = None if due is None else max(0.0, (start - due) * 1000.0)
+                self.record(name, start, time.perf_counter(), lag)
+
+        traced_call.__wrapped__ = func
+        return traced_call
+
+    # ----------------- Tk hooks -----------------
+    def install(self):
+        """Time every after/after_idle callback scheduled from now on, on any widget."""
+        import tkinter as tk
+
+        orig_after, orig_idle = tk.Misc.after, tk.Misc.after_idle
+        tracer = self
+
+        def after(widget, ms, func=None, *args):
+            if func is None:
+                return orig_after(widget, ms)
+            try:
+                due = time.perf_counter() + float(ms) / 1000.0
+            except (TypeError, ValueError):
+                due = time.perf_counter()  # "idle"
+            return orig_after(widget, ms, tracer.wrap(func, due=due), *args)
+
+        def after_idle(widget, func, *args):
+            return orig_idle(widget, tracer.wrap(func, due=time.perf_counter()), *args)
+
+        tk.Misc.after, tk.Misc.after_idle = after, after_idle
+        self._orig_after = orig_after
+
+        def restore():
+            tk.Misc.after, tk.Misc.after_idle = orig_after, orig_idle
+            self._orig_after = None
+
+        self._restore = restore
+        return self
+
+    def watch(self, root, interval_ms=20):
+        """Heartbeat on `root`'s loop: a tick that runs late means the loop was blocked."""
+        import tkinter as tk
+
+        # schedule through the unpatched method so the heartbeat does not trace itself
+        schedule = self._orig_after or tk.Misc.after
+        state = {"due": 0.0}
+
+        def tick():
+            now = time.perf_counter()
+            if (now - state["due"]) * 1000.0 >= self.stall_ms:
+                self.record("event loop blocked", state["due"], now, cat="heartbeat")
+            state["due"] = now + interval_ms / 1000.0
+            try:
+                schedule(root, interval_ms, tick)
+            except tk.TclError:
+                pass  # window destroyed
+
+        state["due"] = time.perf_counter() + interval_ms / 1000.0
+        schedule(root, interval_ms, tick)
+        return self
+
+    # ----------------- Output -----------------
+    def _open(self):
+        f = open(self.path, "w", encoding="utf-8")
+        # JSON array format: a crash leaves no closing bracket, which trace viewers accept
+        f.write("[\n")
+        return f
+
+    def _rotate(self, f):
+        f.write("{}]\n")
+        f.close()
+        for i in range(self.backups, 0, -1):
+            src = self.path if i == 1 else f"{self.path}.{i - 1}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i}")
+        return self._open()
+
+    def _write_loop(self):
+        f = self._open()
+        written = 2
+        try:
+            while True:
+                event = self._queue.get()
+                while event is not _STOP:
+                    line = json.dumps(event, separators=(",", ":")) + ",\n"
+                    f.write(line)
+                    written += len(line)
+                    if written >= self.max_bytes:
+                        f = self._rotate(f)
+                        written = 2
+                    try:
+                        event = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if event is _STOP:
+                    return
+                f.flush()
+        finally:
+            f.write("{}]\n")
+            f.close()
+
+    def summary(self):
+        """Return [(name, calls, avg ms, max ms, max lag ms)], slowest first."""
+        rows = [(n, c, total / c, mx, lag) for n, (c, total, mx, lag) in self.stats.items()]
+        return sorted(rows, key=lambda r: r[3], reverse=True)
+
+    def close(self):
+        if self._restore is not None:
+            self._restore()
+            self._restore = None
+        self._queue.put(_STOP)
+        self._writer.join(timeout=5)
+
+
+# ----------------- App hooks -----------------
+def from_env(environ=None):
+    """Start tracing if TK_TRACE is set; returns the active Tracer or None."""
+    global _active
+    env = os.environ if environ is None else environ
+    path = env.get("TK_TRACE")
+    if not path:
+        return None
+
+    def report(name, dur_ms, lag_ms):
+        print(f"[tk_trace] stall in {name}: ran {dur_ms:.1f} ms, lag {lag_ms or 0.0:.1f} ms", file=sys.stderr)
+
+    _active = Tracer(
+        path,
+        stall_ms=float(env.get("TK_TRACE_STALL_MS", STALL_MS)),
+        max_bytes=int(float(env.get("TK_TRACE_MAX_MB", MAX_BYTES / 1024 / 1024)) * 1024 * 1024),
+        on_stall=report,
+    ).install()
+    return _active
+
+
+def traced(func):
+    """Wrap a widget command for tracing; returns `func` itself when tracing is off."""
+    if _active is None:
+        return func
+    return _active.wrap(func)
+
+
+def counter(name, values):
+    """Record counter values in the active trace (no-op when tracing is off)."""
+    if _active is not None:
+        _active.counter(name, values)
+
+
+def stop():
+    """Flush and close the active tracer (if any)."""
+    global _active
+    if _active is not None:
+        _active.close()
+        _active = None
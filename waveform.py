@@ -0,0 +1,159 @@
+"""Retained-mode mic waveform for the Tk canvas.
+
+The pill-shaped bars (a rectangle plus two oval caps each) are created once and
+then only moved with `canvas.coords`, instead of deleting and recreating every
+item on each frame. Bar heights and coordinates for all bars are computed in one
+NumPy step. `FrameStats` tracks frame cost, and the frame delay backs off when
+frames get expensive so the animation never eats a core (achieved FPS and
+dropped frames are counted by the frame clock, see frame_clock.py).
+"""
+
+import math
+import time
+
+import numpy as np
+
+BAR_COLOR = "#2196F3"
+
+
+class FrameStats:
+  """Time spent drawing each frame (FPS and dropped frames are frame_clock.py's)."""
+
+  def __init__(self):
+    self.frames = 0
+    self.last_ms = 0.0
+    self.avg_ms = 0.0
+    self.max_ms = 0.0
+
+  def begin(self):
+    return time.perf_counter()
+
+  def end(self, started):
+    ms = (time.perf_counter() - started) * 1000.0
+    self.frames += 1
+    self.last_ms = ms
+    self.avg_ms = ms if self.frames == 1 else self.avg_ms + (ms - self.avg_ms) * 0.1
+    self.max_ms = max(self.max_ms, ms)
+
+  def as_dict(self):
+    return {
+      "frames": self.frames,
+      "last_ms": round(self.last_ms, 3),
+      "avg_ms": round(self.avg_ms, 3),
+      "max_ms": round(self.max_ms, 3),
+    }
+
+
+class SyntheticLevels:
+  """The original sine-based placeholder signal, as 0..1 levels per bar."""
+
+  def __init__(self, bars):
+    self.step = 0
+    self._idx = np.arange(bars, dtype=np.float64)
+    self._phase_offsets = self._idx * 0.45
+
+  def next(self):
+    self.step = (self.step + 1) % 100000
+    amp = (np.sin(self.step * 0.12 + self._phase_offsets) + 1.0) / 2.0
+    # Vary amplitude slightly per bar for a natural look
+    return amp * (0.25 + 0.75 * np.abs(np.sin(self.step * 0.02 + self._idx)))
+
+
+class WaveformView:
+  """Pill-shaped bars on `canvas`, created once and updated in place."""
+
+  def __init__(self, canvas, bars=22, color=BAR_COLOR, smooth_alpha=0.28, fps=120, min_fps=30, frame_budget=0.25):
+    self.canvas = canvas
+    self.bars = bars
+    self.color = color
+    # alpha: smoothing factor for exponential smoothing (0..1). Lower => smoother/slower
+    self.smooth_alpha = smooth_alpha
+    self.target_delay_ms = max(1, int(round(1000.0 / fps)))
+    self.max_delay_ms = int(round(1000.0 / min_fps))
+    # fraction of wall time the animation may spend drawing before the frame rate backs off
+    self.frame_budget = frame_budget
+    self.delay_ms = self.target_delay_ms
+    self.stats = FrameStats()
+    self.heights = np.zeros(bars)
+    self._items = None
+    self._size = None
+    self._xs = None
+    self._visible = False
+
+  def _ensure_items(self):
+    if self._items is not None:
+      return
+    kw = {"fill": self.color, "outline": self.color, "state": "hidden"}
+    self._items = [
+      (
+        self.canvas.create_rectangle(0, 0, 0, 0, **kw),
+        self.canvas.create_oval(0, 0, 0, 0, **kw),
+        self.canvas.create_oval(0, 0, 0, 0, **kw),
+      )
+      for _ in range(self.bars)
+    ]
+
+  def _layout(self, w):
+    bar_w = max(2, (w / (self.bars * 1.8)))
+    spacing = max(2, (w - self.bars * bar_w) / (self.bars + 1))
+    x1 = spacing + np.arange(self.bars) * (bar_w + spacing)
+    self._xs = (x1, x1 + bar_w, bar_w)
+
+  def _canvas_size(self):
+    try:
+      return self.canvas.winfo_width(), self.canvas.winfo_height()
+    except Exception:
+      return 300, 60
+
+  def draw(self, levels):
+    """Smooth toward `levels` (0..1 per bar) and move the bars."""
+    self._ensure_items()
+    w, h = self._canvas_size()
+    if self._size != (w, h):
+      self._size = (w, h)
+      self._layout(w)
+    x1, x2, bar_w = self._xs
+
+    target = np.clip(np.asarray(levels, dtype=np.float64), 0.0, 1.0) * h
+    self.heights += (target - self.heights) * self.smooth_alpha
+    y1 = (h - self.heights) / 2.0
+    y2 = y1 + self.heights
+    # radius limited by half width and half height
+    r = np.minimum(bar_w / 2.0, self.heights / 2.0)
+    cy1 = y1 + r
+    cy2 = np.maximum(y2 - r, cy1)
+    d = 2.0 * r
+    rows = np.column_stack((x1, y1, x2, y2, cy1, cy2, x1 + d, y1 + d, x2 - d, y2 - d)).tolist()
+
+    coords = self.canvas.coords
+    for (rect, top, bottom), (bx1, by1, bx2, by2, c1, c2, tx2, ty2, bx1c, by1c) in zip(self._items, rows):
+      coords(rect, bx1, c1, bx2, c2)
+      coords(top, bx1, by1, tx2, ty2)
+      coords(bottom, bx1c, by1c, bx2, by2)
+    if not self._visible:
+      self._set_state("normal")
+
+  def _set_state(self, state):
+    for triple in self._items:
+      for item in triple:
+        self.canvas.itemconfigure(item, state=state)
+    self._visible = state == "normal"
+
+  def frame(self, levels):
+    """Draw one frame, update the counters and return the delay until the next one."""
+    started = self.stats.begin()
+    self.draw(levels)
+    self.stats.end(started)
+    # back off (down to min_fps) when drawing takes more than `frame_budget` of the frame
+    wanted = self.stats.avg_ms / self.frame_budget
+    self.delay_ms = int(min(self.max_delay_ms, max(self.target_delay_ms, math.ceil(wanted))))
+    return self.delay_ms
+
+  def clear(self):
+    """Hide the bars and reset smoothing (items are kept for the next start)."""
+    self.heights[:] = 0.0
+    if self._items is not None:
+      try:
+        self._set_state("hidden")
+      except Exception:
+        pass